@@ -0,0 +1,132 @@
+"""
+Benchmarks for the Harvard Reference Validator
+Run: python bench.py [-n COUNT]
+     python bench.py --verify [--sizes 10,100,1000] [-w WORKERS] [--latency MS] [--error-rate P]
+The --verify run checks synthetic bibliographies against mock_api.py, so its
+numbers depend on the code and the options, never on the network.
+"""
+import argparse
+import json
+import time
+
+import ctr_validator
+import mock_api
+
+# A mix of the reference shapes seen in student bibliographies, including
+# lines that match no pattern (those used to be the slowest to reject).
+SAMPLE_REFERENCES = [
+    "Browne, T.B., Carlson, T.B. and Hastie, P.A., (2004) 'A comparison of rugby seasons presented in traditional and sport education formats', European Physical Education Review, 10(2), pp.199-214.",
+    "Smith, J.A., (2020) 'The Future of AI', Journal of Advanced Robotics, 15(2), pp. 123-145. doi:10.1000/j.ar.2020.02.001.",
+    "Sommerville, I., (2011) Software engineering. America: Pearson Education Inc. ISBN 0137035151",
+    "Jones, A., (2019) Understanding Climate Change. London: Green Press.",
+    "Brown, C. (2021) Digital Transformation. Available at: https://www.example.com/digital-transformation-report (Accessed: 15 July 2025).",
+    "Pressman, R.S., and Maxim, B. (2009) Software engineering: a practitioner's approach. 7th ed. New York: McGraw-Hill. ISBN 9780073375977",
+    "Carter, Q. (2020) 'Virtual Reality in Education', Educational Technology Journal, 4(1), pages 25-35.",
+    "NHS (2023) Understanding mental health conditions. Available at: www.nhs.uk/mental-health/conditions/ (Accessed: 18 July 2025).",
+]
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:,.0f}/s" if seconds > 0 else "inf"
+
+def bench_parse(count: int) -> None:
+    refs = [SAMPLE_REFERENCES[i % len(SAMPLE_REFERENCES)] for i in range(count)]
+    start = time.perf_counter()
+    parsed = [ctr_validator.parse_reference(ref) for ref in refs]
+    parse_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for p in parsed:
+        ctr_validator.validate_ctr_format(p)
+    validate_seconds = time.perf_counter() - start
+    print(f"parse_reference:     {count} refs in {parse_seconds:.3f}s ({_rate(count, parse_seconds)})")
+    print(f"validate_ctr_format: {count} refs in {validate_seconds:.3f}s ({_rate(count, validate_seconds)})")
+
+def _percentile(ordered, q: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def bench_verify_size(api, server, size: int, args) -> dict:
+    refs = mock_api.synthetic_references(api, server.base('web'), size, seed=args.seed, duplicates=args.duplicates)
+    ctr_validator.set_metadata_cache(ctr_validator.MetadataCache(':memory:') if args.cache else None)
+    api.reset_counts()
+    ctr_validator.set_metrics(ctr_validator.Metrics() if args.profile else None)
+    # Per-reference latency runs from the moment the pipeline reads the line
+    # to the moment its outcome comes out, so queueing counts too
+    read_at = {}
+
+    def feed():
+        for idx, ref in enumerate(refs):
+            read_at[idx] = time.perf_counter()
+            yield ref
+
+    latencies = []
+    verdicts = {}
+    start = time.perf_counter()
+    for idx, _, _, _, ver_result in ctr_validator.stream_references(
+            feed(), workers=args.workers, ordered=False, batch_dois=not args.no_batch_doi, dedupe=not args.no_dedupe):
+        latencies.append(time.perf_counter() - read_at[idx])
+        verdicts[ver_result['verified']] = verdicts.get(ver_result['verified'], 0) + 1
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {'refs': size, 'seconds': round(seconds, 3), 'refs_per_second': round(size / seconds, 1),
+            'p50_ms': round(_percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(_percentile(latencies, 0.99) * 1000, 1),
+            'calls_per_ref': round(sum(api.calls.values()) / size, 2),
+            'calls': dict(api.calls), 'injected_errors': api.injected, 'verdicts': verdicts}
+
+def bench_verify(args) -> None:
+    api = mock_api.MockApi(args.latency / 1000, args.tail / 1000, args.error_rate, args.drop_rate, args.seed)
+    ctr_validator.set_http_client(ctr_validator.HttpClient(pool_size=max(ctr_validator.DEFAULT_POOL_SIZE, args.workers)))
+    ctr_validator.set_dispatch_mode(args.dispatch)
+    with mock_api.MockApiServer(api) as server:
+        server.install()
+        if not args.json:
+            print(f"{'refs':>6} {'refs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/ref':>9}  calls by host")
+        for size in args.sizes:
+            row = bench_verify_size(api, server, size, args)
+            if args.json:
+                print(json.dumps(row), flush=True)
+            else:
+                hosts = ', '.join(f"{name} {count}" for name, count in row['calls'].items())
+                print(f"{row['refs']:>6} {row['refs_per_second']:>9,.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                      f"{row['p99_ms']:>8.1f} {row['calls_per_ref']:>9.2f}  {hosts}", flush=True)
+            if args.profile:
+                print(ctr_validator.get_metrics().format_profile(), flush=True)
+    ctr_validator.set_metadata_cache(None)
+    ctr_validator.set_metrics(None)
+
+def _sizes(value: str):
+    try:
+        sizes = [int(size) for size in value.split(',')]
+    except ValueError:
+        sizes = []
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError(f"expected comma-separated positive counts, got '{value}'")
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the reference parser, or full verification against a local mock API")
+    parser.add_argument('-n', '--count', type=int, default=100000, help='References to parse (default: %(default)s)')
+    parser.add_argument('--verify', action='store_true', help='Benchmark verification of synthetic bibliographies against mock_api.py')
+    parser.add_argument('--sizes', type=_sizes, default=[10, 100, 1000], help='Bibliography sizes to verify (default: 10,100,1000)')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='Verification workers (default: %(default)s)')
+    parser.add_argument('--dispatch', choices=ctr_validator.DISPATCH_MODES, default='sequential', help='Provider dispatch mode (default: %(default)s)')
+    parser.add_argument('--latency', metavar='MS', type=float, default=20.0, help='Fixed mock API delay (default: %(default)s)')
+    parser.add_argument('--tail', metavar='MS', type=float, default=10.0, help='Mean extra exponential mock API delay (default: %(default)s)')
+    parser.add_argument('--error-rate', metavar='P', type=float, default=0.0, help='Fraction of mock API requests answered with 500/503')
+    parser.add_argument('--drop-rate', metavar='P', type=float, default=0.0, help='Fraction of mock API connections dropped unanswered')
+    parser.add_argument('--duplicates', metavar='P', type=float, default=0.1, help='Fraction of references repeating an earlier one (default: %(default)s)')
+    parser.add_argument('--cache', action='store_true', help='Verify through an in-memory metadata cache (fresh for each size)')
+    parser.add_argument('--no-dedupe', action='store_true', help='Verify repeated references again')
+    parser.add_argument('--no-batch-doi', action='store_true', help='Resolve DOIs one request at a time')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the bibliographies and the mock API (default: %(default)s)')
+    parser.add_argument('--profile', action='store_true', help='Collect run metrics and print the profile after each size')
+    parser.add_argument('--json', action='store_true', help='Print one JSON object per size')
+    args = parser.parse_args()
+    if args.verify:
+        bench_verify(args)
+    else:
+        bench_parse(args.count)
+
+if __name__ == '__main__':
+    main()
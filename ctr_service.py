@@ -0,0 +1,293 @@
+"""
+Long-running checking service
+Keeps one validator process up for callers that send many small reference
+lists, so the HTTP connection pools, metadata cache and index stay warm and
+nothing is imported or compiled per request.
+Run: python ctr_validator.py serve [--port PORT | --socket PATH] [--jobs N] [-w N]
+
+POST /check with the references (plain text, one per line, or JSON
+{"references": [...]}) streams back one NDJSON record per reference as it is
+verified, the same records as --format ndjson, then {"summary": {...}}.
+Add ?unordered=1 to get records as they finish rather than in input order.
+GET /health reports the job queue and cache hit ratios; GET /metrics is the
+Prometheus export of the run metrics.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import ctr_validator
+
+DEFAULT_PORT = 8765
+DEFAULT_JOBS = 4
+DEFAULT_QUEUE = 64
+DEFAULT_WORKERS = 4
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class JobQueue:
+    # Admits at most max_running jobs at a time, the rest in arrival order;
+    # with max_waiting already queued a new job is turned away
+    def __init__(self, max_running: int = DEFAULT_JOBS, max_waiting: int = DEFAULT_QUEUE):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._admitted = 0
+
+    def enter(self) -> bool:
+        # Blocks until the job may run; False if the queue is full
+        with self._cond:
+            if self.running >= self.max_running and self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.waiting += 1
+            self._cond.notify_all()
+            while ticket != self._admitted or self.running >= self.max_running:
+                self._cond.wait()
+            self._admitted += 1
+            self.waiting -= 1
+            self.running += 1
+            self._cond.notify_all()
+            return True
+
+    def leave(self) -> None:
+        with self._cond:
+            self.running -= 1
+            self.completed += 1
+            self._cond.notify_all()
+
+    def wait_for(self, predicate: Callable[['JobQueue'], bool], timeout: Optional[float] = None) -> bool:
+        # Blocks until predicate(queue) holds after a job arrives, starts or
+        # ends; False if timeout passes first
+        with self._cond:
+            return self._cond.wait_for(lambda: predicate(self), timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {'running': self.running, 'waiting': self.waiting, 'completed': self.completed,
+                    'rejected': self.rejected}
+
+
+class ValidationService:
+    # What the handlers share: the job queue and per-job verification options.
+    # Caches, pools and rate limits are the validator's process-wide settings.
+    def __init__(self, jobs: Optional[JobQueue] = None, workers: int = DEFAULT_WORKERS, batch_dois: bool = True,
+                 dedupe: bool = True, metrics: Optional[ctr_validator.Metrics] = None):
+        self.jobs = jobs or JobQueue()
+        self.workers = workers
+        self.batch_dois = batch_dois
+        self.dedupe = dedupe
+        self.metrics = metrics
+        self.started = time.time()
+
+    def check(self, refs: List[str], ordered: bool = True) -> Iterator[ctr_validator.ReferenceOutcome]:
+        if self.metrics is not None:
+            self.metrics.count('references', len(refs))
+        return ctr_validator.stream_references(refs, workers=self.workers, ordered=ordered,
+                                               batch_dois=self.batch_dois, dedupe=self.dedupe)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'status': 'ok', 'uptime': round(time.time() - self.started, 3), 'jobs': self.jobs.stats(),
+                'cache': ctr_validator.hit_ratio(ctr_validator.get_metadata_cache()),
+                'index': ctr_validator.hit_ratio(ctr_validator.get_metadata_index())}
+
+
+def read_references(body: bytes, content_type: str) -> List[str]:
+    # Raises ValueError for a body that is not a list of references
+    text = body.decode('utf-8')
+    if content_type.split(';')[0].strip().lower() != 'application/json':
+        return ctr_validator.read_references_from_string(text)
+    data = json.loads(text)
+    refs = data.get('references') if isinstance(data, dict) else data
+    if not isinstance(refs, list) or not all(isinstance(ref, str) for ref in refs):
+        raise ValueError('expected {"references": [...]} with one string per reference')
+    return [ref.strip() for ref in refs if ref.strip()]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ctr-validator'
+    # Records go out as many small writes; with Nagle on each waits for an ACK
+    disable_nagle_algorithm = True
+
+    def _send(self, status: int, body: str, content_type: str = 'application/json',
+              headers: Optional[Dict[str, str]] = None) -> None:
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, ctr_validator.to_json(data) + '\n', headers=headers)
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self._send_json(200, service.stats())
+        elif path == '/metrics' and service.metrics is not None:
+            self._send(200, service.metrics.prometheus(), 'text/plain; version=0.0.4')
+        else:
+            self._send_json(404, {'error': f"no such endpoint: {path}"})
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        parts = urlsplit(self.path)
+        if parts.path != '/check':
+            self._send_json(404, {'error': f"no such endpoint: {parts.path}"})
+            return
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            self._send_json(411, {'error': 'Content-Length required'})
+            return
+        if int(length) > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {'error': f"body larger than {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            refs = read_references(self.rfile.read(int(length)), self.headers.get('Content-Type', ''))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        ordered = query.get('unordered', '').lower() not in ('1', 'true', 'yes')
+        if not service.jobs.enter():
+            self._send_json(503, {'error': 'job queue full'}, {'Retry-After': '1'})
+            return
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self._stream(service.check(refs, ordered))
+        except (BrokenPipeError, ConnectionResetError):
+            # The caller went away: _stream has dropped the queued
+            # verifications, and the running ones finish unread
+            self.close_connection = True
+        finally:
+            service.jobs.leave()
+
+    def _stream(self, outcomes: Iterator[ctr_validator.ReferenceOutcome]) -> None:
+        total = valid_ctr = verified = 0
+        try:
+            for idx, ref, parsed, ctr_result, ver_result in outcomes:
+                total += 1
+                valid_ctr += bool(ctr_result['valid'])
+                verified += ver_result['verified'] == 'Yes'
+                self._chunk(ctr_validator.to_json(
+                    ctr_validator.reference_record(ref, parsed, ctr_result, ver_result, idx)) + '\n')
+            last = {'summary': ctr_validator.summary_record(total, valid_ctr, verified)}
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception as e:
+            # Headers are gone already, so the failure ends the stream instead
+            last = {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            outcomes.close()
+        self._chunk(ctr_validator.to_json(last) + '\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _UnixHandler(_Handler):
+    # TCP_NODELAY does not apply to Unix sockets
+    disable_nagle_algorithm = False
+
+    def address_string(self) -> str:
+        return 'unix'
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # An LMS submits in bursts
+    request_queue_size = 128
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+
+def make_server(service: ValidationService, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    # Bound but not yet serving; call serve_forever() on it
+    if socket_path is not None:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Unix sockets are not supported on this platform")
+        # A socket file left behind by a previous run
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixServer(socket_path, _UnixHandler)
+    else:
+        server = _Server((host, port), _Handler)
+    server.service = service
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='ctr_validator.py serve',
+                                     description="Serve reference checks over HTTP, keeping caches and connections warm")
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on; 0 picks a free one (default: %(default)s)')
+    parser.add_argument('--socket', metavar='PATH', help='Listen on a Unix socket at PATH instead of a TCP port')
+    parser.add_argument('--jobs', type=ctr_validator.positive_int, default=DEFAULT_JOBS, help='Reference lists checked at the same time; more wait in arrival order (default: %(default)s)')
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE, help='Lists allowed to wait before new ones get HTTP 503 (default: %(default)s)')
+    ctr_validator.add_verification_options(parser)
+    parser.set_defaults(workers=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+    ctr_validator.configure_verification(args, parser, connections=args.jobs * args.workers)
+    metrics = ctr_validator.Metrics()
+    ctr_validator.set_metrics(metrics)
+    service = ValidationService(JobQueue(args.jobs, args.queue), workers=args.workers,
+                                batch_dois=not args.no_batch_doi, dedupe=not args.no_dedupe, metrics=metrics)
+    try:
+        server = make_server(service, args.host, args.port, args.socket)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving on {where} (POST /check, GET /health, GET /metrics)", file=sys.stderr, flush=True)
+    # Service managers stop daemons with SIGTERM; clean up as for Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        cache = ctr_validator.get_metadata_cache()
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,62 @@
 Harvard Reference Validator and Verifier
 Implements the specification in spec.md
 """
+import codecs
+import gzip
+import hashlib
+import html
+import importlib
+import json
+import os
+import random
 import re
-import requests
 import sys
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
 
-# Optional: For HTML parsing
-try:
-    from bs4 import BeautifulSoup
-    HAS_BS4 = True
-except ImportError:
-    HAS_BS4 = False
+# Parsing and CTR format checks need no network or HTML modules, and those
+# (requests/urllib3, asyncio, bs4, aiohttp) take longer to import than a
+# whole bibliography takes to check. So they are imported where first used:
+# requests and asyncio inside the functions that need them, and the optional
+# ones through _optional, which remembers whether they are installed.
+_optional_modules: Dict[str, Any] = {}
+
+def _optional(name: str) -> Any:
+    # The module, or None when it is not installed
+    try:
+        return _optional_modules[name]
+    except KeyError:
+        pass
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module = None
+    _optional_modules[name] = module
+    return module
+
+def __getattr__(name: str) -> Any:
+    # Module attributes that used to be set at import time
+    if name == 'HAS_BS4':        # Optional: for HTML parsing
+        return _optional('bs4') is not None
+    if name == 'HAS_AIOHTTP':    # Optional: for the native asyncio verifier
+        return _optional('aiohttp') is not None
+    if name == 'BeautifulSoup' and _optional('bs4') is not None:
+        return _optional('bs4').BeautifulSoup
+    if name == 'aiohttp' and _optional('aiohttp') is not None:
+        return _optional('aiohttp')
+    if name in ('asyncio', 'requests'):
+        return importlib.import_module(name)
+    if name == 'Retry':
+        from urllib3.util.retry import Retry
+        return Retry
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Set stdout encoding to UTF-8 on Windows
 if sys.platform.startswith('win'):
@@ -20,354 +65,2641 @@ if sys.platform.startswith('win'):
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # --- Input Reader ---
-def read_references_from_file(filepath: str) -> List[str]:
+def iter_references_from_file(filepath: str) -> Iterator[str]:
+    # Lazily yields one reference per non-blank line
     with open(filepath, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f if line.strip()]
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+def iter_references_from_string(refs: str) -> Iterator[str]:
+    for line in refs.strip().split('\n'):
+        line = line.strip()
+        if line:
+            yield line
+
+def read_references_from_file(filepath: str) -> List[str]:
+    return list(iter_references_from_file(filepath))
 
 def read_references_from_string(refs: str) -> List[str]:
-    return [line.strip() for line in refs.strip().split('\n') if line.strip()]
+    return list(iter_references_from_string(refs))
+
+# --- Result Types ---
+class _Record:
+    # Compact slotted result that still reads like the dicts it replaced:
+    # record['field'], record.get('field'), 'field' in record. A field that
+    # was never set is absent, which is not the same as one set to None.
+    __slots__ = ()
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        try:
+            setattr(self, name, value)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __contains__(self, name: str) -> bool:
+        return hasattr(self, name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, _Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+_ABSENT = object()
+
+class ParsedReference(_Record):
+    # Which fields are present depends on the type, as with the old dicts;
+    # a journal reference without a DOI has doi set to None.
+    __slots__ = ('type', 'author', 'year', 'title', 'journal', 'volume', 'issue', 'pages', 'doi',
+                 'location', 'publisher', 'isbn', 'url', 'accessed', 'raw', 'parse_error')
+
+    # Spelled out rather than looping over **fields: this runs once per
+    # reference and a setattr loop costs more than the parse itself
+    def __init__(self, type: str, author: Any = _ABSENT, year: Any = _ABSENT, title: Any = _ABSENT,
+                 journal: Any = _ABSENT, volume: Any = _ABSENT, issue: Any = _ABSENT, pages: Any = _ABSENT,
+                 doi: Any = _ABSENT, location: Any = _ABSENT, publisher: Any = _ABSENT, isbn: Any = _ABSENT,
+                 url: Any = _ABSENT, accessed: Any = _ABSENT, raw: Any = _ABSENT, parse_error: Any = _ABSENT):
+        self.type = type
+        if author is not _ABSENT: self.author = author
+        if year is not _ABSENT: self.year = year
+        if title is not _ABSENT: self.title = title
+        if journal is not _ABSENT: self.journal = journal
+        if volume is not _ABSENT: self.volume = volume
+        if issue is not _ABSENT: self.issue = issue
+        if pages is not _ABSENT: self.pages = pages
+        if doi is not _ABSENT: self.doi = doi
+        if location is not _ABSENT: self.location = location
+        if publisher is not _ABSENT: self.publisher = publisher
+        if isbn is not _ABSENT: self.isbn = isbn
+        if url is not _ABSENT: self.url = url
+        if accessed is not _ABSENT: self.accessed = accessed
+        if raw is not _ABSENT: self.raw = raw
+        if parse_error is not _ABSENT: self.parse_error = parse_error
+
+class FormatResult(_Record):
+    __slots__ = ('valid', 'reasons')
+
+    def __init__(self, valid: bool, reasons: List[str]):
+        self.valid = valid
+        self.reasons = reasons
+
+class VerificationResult(_Record):
+    __slots__ = ('checks', 'details', 'clickable_link', 'verified', 'match_score')
+
+    def __init__(self, checks: List[str], details: List[str], clickable_link: str, verified: str,
+                 match_score: Optional[float] = None):
+        self.checks = checks
+        self.details = details
+        self.clickable_link = clickable_link
+        self.verified = verified
+        self.match_score = match_score
 
 # --- Reference Parser & Type Identifier ---
-def parse_reference(ref: str) -> Dict[str, Any]:
-    # Improved regexes for Harvard CTR types and fallback detection
-    patterns = {
-        # Multiple authors: "Smith, J. and Doe, A." or "Smith, J., Doe, A. and Lee, B."
-        'journal': re.compile(
-            r"^(?P<author>(?:[A-Z][a-zA-Z\-']+, [A-Z](?:\.[A-Z]\.)?(?:, )?)+(?: and [A-Z][a-zA-Z\-']+, [A-Z](?:\.[A-Z]\.)?)?,?)\s*"
-            r"\((?P<year>\d{4})\) ?'(?P<title>.+?)', ?(?P<journal>.+?), ?(?P<volume>\d+)\((?P<issue>\d+)\), ?pp\. ?(?P<pages>\d+-\d+)(\. doi:(?P<doi>\S+))?\."
-        ),
-        'journal_no_doi': re.compile(
-            r"^(?P<author>(?:[A-Z][a-zA-Z\-']+, [A-Z](?:\.[A-Z]\.)?(?:, )?)+(?: and [A-Z][a-zA-Z\-']+, [A-Z](?:\.[A-Z]\.)?)?,?)\s*"
-            r"\((?P<year>\d{4})\) '(?P<title>.+?)', (?P<journal>.+?), (?P<volume>\d+)\((?P<issue>\d+)\), pp\. (?P<pages>\d+-\d+)\.?$"
-        ),
-        'book': re.compile(
-            r"^(?P<author>(?:[A-Z][a-zA-Z\-']+, (?:[A-Z]\.)+, )+(?:and (?:[A-Z][a-zA-Z\-']+, (?:[A-Z]\.)+,?))?) ?\((?P<year>\d{4})\) "
-            r"(?P<title>.+?)\. (?P<location>.+?): (?P<publisher>.+?)(\. ISBN (?P<isbn>\S+))?\.?$"
-        ),
-        'website': re.compile(
-            r"^(?P<author>(?:[A-Z][a-zA-Z\-']+, [A-Z]\.(?:, )?)+(?: and [A-Z][a-zA-Z\-']+, [A-Z]\.)?) "
-            r"\((?P<year>\d{4})\) (?P<title>.+?)\. Available at: (?P<url>https?://\S+) \(Accessed: (?P<accessed>.+?)\)\."
-        )
-    }
-    for ref_type, pat in patterns.items():
-        m = pat.match(ref)
-        if m:
-            data = m.groupdict()
-            if ref_type == 'journal_no_doi':
-                data['type'] = 'journal'
-                data['doi'] = None
-            else:
-                data['type'] = ref_type.replace('_no_doi', '')
+# Each reference type is split into a head (author list and year) and a body.
+# Author lists cannot contain "(", so the head always ends at the first
+# "(YYYY)" and is matched once. The body fields are found by scanning for
+# their delimiters left to right, which gives the same first-match result the
+# old lazy ".+?" groups did without re-scanning the rest of the line for every
+# candidate split. Parse time is therefore linear in the reference length.
+# Multiple authors: "Smith, J. and Doe, A." or "Smith, J., Doe, A. and Lee, B."
+_JOURNAL_AUTHOR = r"(?P<author>(?:[A-Z][a-zA-Z\-']+, [A-Z](?:\.[A-Z]\.)?(?:, )?)+(?: and [A-Z][a-zA-Z\-']+, [A-Z](?:\.[A-Z]\.)?)?,?)"
+_JOURNAL_HEAD_RE = re.compile(_JOURNAL_AUTHOR + r"\s*\((?P<year>\d{4})\) ?'")
+_JOURNAL_NO_DOI_HEAD_RE = re.compile(_JOURNAL_AUTHOR + r"\s*\((?P<year>\d{4})\) '")
+_JOURNAL_TAIL_RE = re.compile(r", ?(?P<volume>\d+)\((?P<issue>\d+)\), ?pp\. ?(?P<pages>\d+-\d+)(\. doi:(?P<doi>\S+))?\.")
+_JOURNAL_NO_DOI_TAIL_RE = re.compile(r", (?P<volume>\d+)\((?P<issue>\d+)\), pp\. (?P<pages>\d+-\d+)\.?$")
+_BOOK_HEAD_RE = re.compile(
+    r"(?P<author>(?:[A-Z][a-zA-Z\-']+, (?:[A-Z]\.)+, )+(?:and (?:[A-Z][a-zA-Z\-']+, (?:[A-Z]\.)+,?))?) ?\((?P<year>\d{4})\) ")
+_BOOK_TAIL_RE = re.compile(r"(\. ISBN (?P<isbn>\S+))?\.?$")
+_WEBSITE_HEAD_RE = re.compile(
+    r"(?P<author>(?:[A-Z][a-zA-Z\-']+, [A-Z]\.(?:, )?)+(?: and [A-Z][a-zA-Z\-']+, [A-Z]\.)?) \((?P<year>\d{4})\) ")
+_WEBSITE_LINK_RE = re.compile(r"\. Available at: (?P<url>https?://\S+) \(Accessed: ")
+_WEBSITE_END_RE = re.compile(r"\)\.")
+
+# Real references are a few hundred characters; anything far longer is
+# pasted junk and is rejected before any pattern runs. The extractors are
+# linear, so this also bounds the time spent on any one line.
+MAX_REFERENCE_LENGTH = 2000
+
+class _NextMatch:
+    # Earliest match of pattern at or after a position. Callers ask with
+    # non-decreasing positions, so a previous answer is reused while it is
+    # still ahead and the string is scanned at most once overall.
+    __slots__ = ('pattern', 'ref', 'pos', 'match')
+
+    def __init__(self, pattern: 're.Pattern', ref: str):
+        self.pattern = pattern
+        self.ref = ref
+        self.pos = -1
+        self.match = None
+
+    def at_or_after(self, pos: int) -> Optional['re.Match']:
+        if self.pos < 0 or (self.match is not None and self.match.start() < pos):
+            self.match = self.pattern.search(self.ref, pos)
+            self.pos = pos
+        return self.match
+
+def _extract_journal(ref: str, head_re: 're.Pattern', tail_re: 're.Pattern', space_optional: bool) -> Optional[Dict[str, Any]]:
+    # 'Title', Journal, 1(2), pp. 3-4 -- the title ends at the first "'," for
+    # which a volume/issue/pages tail follows a non-empty journal name
+    head = head_re.match(ref)
+    if head is None:
+        return None
+    start = head.end()
+    tails = _NextMatch(tail_re, ref)
+    end = ref.find("',", start + 1)
+    while end != -1:
+        journal_start = end + 2
+        tail = None
+        if ref.startswith(' ', journal_start):
+            journal_start += 1
+            tail = tails.at_or_after(journal_start + 1)
+            if tail is None and space_optional:
+                # ", ?" may also leave the space as a one-character journal name
+                journal_start -= 1
+                tail = tail_re.match(ref, journal_start + 1)
+        elif space_optional:
+            tail = tails.at_or_after(journal_start + 1)
+        if tail is not None:
+            data = {'author': head.group('author'), 'year': head.group('year'),
+                    'title': ref[start:end], 'journal': ref[journal_start:tail.start()]}
+            data.update(tail.groupdict())
             return data
+        end = ref.find("',", end + 1)
+    return None
+
+def _extract_book(ref: str) -> Optional[Dict[str, Any]]:
+    # Title. Location: Publisher. ISBN x -- only the first ". " can start a
+    # location that is followed by ": " and a non-empty publisher
+    head = _BOOK_HEAD_RE.match(ref)
+    if head is None:
+        return None
+    start = head.end()
+    title_end = ref.find('. ', start + 1)
+    if title_end == -1:
+        return None
+    location_end = ref.find(': ', title_end + 3)
+    if location_end == -1 or location_end + 3 > len(ref):
+        return None
+    tail = _BOOK_TAIL_RE.search(ref, location_end + 3)
+    return {'author': head.group('author'), 'year': head.group('year'), 'title': ref[start:title_end],
+            'location': ref[title_end + 2:location_end], 'publisher': ref[location_end + 2:tail.start()],
+            'isbn': tail.group('isbn')}
+
+def _extract_website(ref: str) -> Optional[Dict[str, Any]]:
+    # Title. Available at: URL (Accessed: date).
+    head = _WEBSITE_HEAD_RE.match(ref)
+    if head is None:
+        return None
+    start = head.end()
+    closers = _NextMatch(_WEBSITE_END_RE, ref)
+    end = ref.find('. Available at: ', start + 1)
+    while end != -1:
+        link = _WEBSITE_LINK_RE.match(ref, end)
+        if link is not None:
+            closer = closers.at_or_after(link.end() + 1)
+            if closer is None:
+                return None
+            return {'author': head.group('author'), 'year': head.group('year'), 'title': ref[start:end],
+                    'url': link.group('url'), 'accessed': ref[link.end():closer.start()]}
+        end = ref.find('. Available at: ', end + 1)
+    return None
+
+_EXTRACTORS = {
+    'journal': lambda ref: _extract_journal(ref, _JOURNAL_HEAD_RE, _JOURNAL_TAIL_RE, True),
+    'journal_no_doi': lambda ref: _extract_journal(ref, _JOURNAL_NO_DOI_HEAD_RE, _JOURNAL_NO_DOI_TAIL_RE, False),
+    'book': _extract_book,
+    'website': _extract_website,
+}
+
+def classify_reference(ref: str) -> List[str]:
+    # Extractor names that could match ref, in trial order. Each check is a
+    # literal token the extractor cannot match without; plain substring tests
+    # are far cheaper than a failed extraction, and the order is kept so the
+    # first match still wins as before.
+    candidates = []
+    if '(' not in ref:
+        return candidates
+    if "pp." in ref and "'" in ref:
+        candidates.append('journal')
+        if "pp. " in ref:
+            candidates.append('journal_no_doi')
+    if ". " in ref:
+        if ": " in ref:
+            candidates.append('book')
+        if " (Accessed: " in ref and ". Available at: http" in ref:
+            candidates.append('website')
+    return candidates
+
+def parse_reference(ref: str) -> ParsedReference:
+    if len(ref) > MAX_REFERENCE_LENGTH:
+        return ParsedReference(type='unknown', raw=ref,
+                               parse_error=f"Reference too long to parse ({len(ref)} characters, limit {MAX_REFERENCE_LENGTH})")
+    for ref_type in classify_reference(ref):
+        data = _EXTRACTORS[ref_type](ref)
+        if data is not None:
+            if ref_type == 'journal_no_doi':
+                return ParsedReference(type='journal', doi=None, **data)
+            return ParsedReference(type=ref_type, **data)
     # Fallback: unknown type
-    return {'type': 'unknown', 'raw': ref}
+    return ParsedReference(type='unknown', raw=ref)
 
 # --- CTR Format Validator ---
-def validate_ctr_format(parsed: Dict[str, Any]) -> Dict[str, Any]:
+_AUTHOR_FORMAT_RE = re.compile(r"[A-Z][a-zA-Z\-']+, [A-Z]\.")
+_BOOK_AUTHOR_FORMAT_RE = re.compile(r"[A-Z][a-zA-Z\-']+, [A-Z]\.?")
+_YEAR_FORMAT_RE = re.compile(r"\d{4}$")
+_PAGES_FORMAT_RE = re.compile(r"\d+-\d+$")
+_ACCESSED_FORMAT_RE = re.compile(r"\d{1,2} [A-Za-z]+ \d{4}$")
+
+def validate_ctr_format(parsed: ParsedReference) -> FormatResult:
     valid = True
     reasons = []
     t = parsed.get('type')
     if t == 'journal':
-        if not re.match(r"^[A-Z][a-zA-Z\-']+, [A-Z]\.", parsed.get('author', '')):
+        if not _AUTHOR_FORMAT_RE.match(parsed.get('author', '')):
             valid = False
             reasons.append("Incorrect author format")
-        if not re.match(r"^\d{4}$", parsed.get('year', '')):
+        if not _YEAR_FORMAT_RE.match(parsed.get('year', '')):
             valid = False
             reasons.append("Incorrect year format")
         if not parsed.get('volume') or not parsed.get('issue'):
             valid = False
             reasons.append("Missing volume/issue format")
-        if not parsed.get('pages') or not re.match(r"^\d+-\d+$", parsed.get('pages', '')):
+        if not parsed.get('pages') or not _PAGES_FORMAT_RE.match(parsed.get('pages', '')):
             valid = False
             reasons.append("Page format incorrect, should be pp. 25-35 not pages 25-35")
         if 'doi' in parsed and parsed.get('doi') is None:
             reasons.append("No DOI found (not required, but preferred)")
     elif t == 'book':
-        if not re.match(r"^[A-Z][a-zA-Z\-']+, [A-Z]\.?", parsed.get('author', '')):
+        if not _BOOK_AUTHOR_FORMAT_RE.match(parsed.get('author', '')):
             valid = False
             reasons.append("Incorrect author format"+parsed.get('author', ''))
-        if not re.match(r"^\d{4}$", parsed.get('year', '')):
+        if not _YEAR_FORMAT_RE.match(parsed.get('year', '')):
             valid = False
             reasons.append("Incorrect year format")
     elif t == 'website':
-        if not re.match(r"^[A-Z][a-zA-Z\-']+, [A-Z]\.", parsed.get('author', '')):
+        if not _AUTHOR_FORMAT_RE.match(parsed.get('author', '')):
             valid = False
             reasons.append("Incorrect author format")
-        if not re.match(r"^\d{4}$", parsed.get('year', '')):
+        if not _YEAR_FORMAT_RE.match(parsed.get('year', '')):
             valid = False
             reasons.append("Incorrect year format")
         # Accessed date format: '15 July 2025'
-        if not re.match(r"^\d{1,2} [A-Za-z]+ \d{4}$", parsed.get('accessed', '')):
+        if not _ACCESSED_FORMAT_RE.match(parsed.get('accessed', '')):
             valid = False
             reasons.append("Accessed date format incorrect, should be '15 July 2025' not '{}'".format(parsed.get('accessed', '')))
     elif t == 'unknown':
         valid = False
-        reasons.append("Could not identify reference type")
-    return {'valid': valid, 'reasons': reasons}
+        reasons.append(parsed.get('parse_error') or "Could not identify reference type")
+    return FormatResult(valid, reasons)
+
+FormatOutcome = Tuple[str, ParsedReference, FormatResult]
+
+def validate_references(refs: Iterable[str]) -> Iterator[FormatOutcome]:
+    # Format check only, as used by --format-only: never touches the network
+    # or imports a network or HTML module
+    for ref in refs:
+        parsed = parse_reference(ref)
+        yield ref, parsed, validate_ctr_format(parsed)
+
+
+# --- Rate Limiting ---
+# Requests-per-second budgets for the APIs we call. Hosts not listed here
+# (e.g. cited websites) are not throttled.
+DEFAULT_RATE_LIMITS = {
+    'api.crossref.org': 5.0,
+    'api.openalex.org': 10.0,
+    'openlibrary.org': 3.0,
+}
+PROVIDER_HOSTS = {
+    'crossref': 'api.crossref.org',
+    'openalex': 'api.openalex.org',
+    'openlibrary': 'openlibrary.org',
+}
+# Statuses that mean "slow down and try again"
+RETRY_STATUSES = (429, 503)
+MAX_RATE_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+class TokenBucket:
+    # Thread-safe token bucket. reserve() takes a token and returns how long
+    # the caller must wait before using it, so blocking and asyncio callers
+    # can share one bucket and sleep in their own way.
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.burst = max(1.0, rate)
+            self._tokens = min(self._tokens, self.burst)
+
+    def pause(self, seconds: float) -> None:
+        # Hold every caller for at least `seconds` (used for Retry-After)
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _parse_interval(value: str) -> Optional[float]:
+    # CrossRef sends X-Rate-Limit-Interval like "1s"
+    m = re.match(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$", value or '')
+    if not m:
+        return None
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[m.group(2) or 's']
+    return float(m.group(1)) * scale
+
+class RateLimiter:
+    # Per-host token buckets plus the retry policy for throttled responses.
+    # The effective rate for a host is the lower of the configured budget and
+    # whatever the server advertises in X-Rate-Limit-Limit/Interval.
+    def __init__(self, limits: Optional[Dict[str, float]] = None, max_retries: int = MAX_RATE_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP):
+        self.limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._advertised: Dict[str, float] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, host: str) -> Optional[float]:
+        rates = [r for r in (self.limits.get(host), self._advertised.get(host)) if r]
+        return min(rates) if rates else None
+
+    def _bucket(self, host: str) -> Optional[TokenBucket]:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate = self._rate_for(host)
+            if rate is None:
+                return None
+            with self._lock:
+                bucket = self._buckets.setdefault(host, TokenBucket(rate))
+        return bucket
+
+    def reserve(self, url: str) -> float:
+        bucket = self._bucket(urlsplit(url).netloc.lower())
+        return bucket.reserve() if bucket is not None else 0.0
+
+    def observe(self, url: str, status: int, headers: Any, attempt: int) -> Optional[float]:
+        # Record a response; returns the delay the caller must wait before
+        # retrying, or None to accept it. Hosts with a bucket are also paused
+        # so other workers hold off too.
+        host = urlsplit(url).netloc.lower()
+        headers = headers or {}
+        limit, interval = headers.get('X-Rate-Limit-Limit'), _parse_interval(headers.get('X-Rate-Limit-Interval', ''))
+        if limit and interval:
+            try:
+                advertised = float(limit) / interval
+            except ValueError:
+                advertised = None
+            if advertised and advertised != self._advertised.get(host):
+                self._advertised[host] = advertised
+                bucket = self._bucket(host)
+                if bucket is not None:
+                    bucket.set_rate(self._rate_for(host))
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        delay = parse_retry_after(headers.get('Retry-After'))
+        if delay is None:
+            # Full jitter keeps many workers from retrying in lockstep
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        delay = min(delay, self.backoff_cap)
+        bucket = self._bucket(host)
+        if bucket is not None:
+            bucket.pause(delay)
+        return delay
+
+_rate_limiter = RateLimiter()
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    # None disables throttling and retries for rate-limited responses
+    global _rate_limiter
+    _rate_limiter = limiter
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    return _rate_limiter
+
+# --- Instrumentation ---
+# Timers and counters for finding where a run spends its time. Every hook
+# reads the module-level _metrics first and does nothing else when it is
+# None, so instrumentation can stay compiled in at the cost of one global
+# lookup per hook.
+METRIC_STAGES = ('parse', 'validate', 'prefetch', 'verify', 'format', 'rate_limit_wait')
+# Upper bounds in seconds of the timer histogram buckets (the last is +Inf)
+TIMER_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FORMATS = ('json', 'prometheus')
+
+class _Timer:
+    # Count, total, maximum and histogram of observed durations. A batch of
+    # n items timed together counts n times at its mean duration.
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(TIMER_BUCKETS) + 1)
+
+    def add(self, seconds: float, n: int = 1) -> None:
+        each = seconds / n
+        self.count += n
+        self.total += seconds
+        if each > self.max:
+            self.max = each
+        self.buckets[bisect_left(TIMER_BUCKETS, each)] += n
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'seconds': round(self.total, 6),
+                'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                'max_ms': round(self.max * 1000, 3)}
+
+def hit_ratio(source: Any) -> Optional[Dict[str, Any]]:
+    # Hit counts of a MetadataCache or MetadataIndex
+    if source is None:
+        return None
+    lookups = source.hits + source.misses
+    counts = {'hits': source.hits, 'misses': source.misses,
+              'hit_ratio': round(source.hits / lookups, 4) if lookups else 0.0}
+    if hasattr(source, 'revalidations'):
+        counts['revalidations'] = source.revalidations
+    return counts
+
+def _prometheus_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _prometheus_labels(**labels: Any) -> str:
+    return '{' + ','.join(f'{name}="{_prometheus_value(value)}"' for name, value in labels.items()) + '}'
+
+# Cited web pages are on any number of hosts, so only the API hosts (public
+# or as configured) get a series of their own and the rest share this one
+OTHER_HOSTS = 'other'
+
+def _metric_host(url: str) -> str:
+    host = urlsplit(url).netloc.lower()
+    return host if any(host in _api_hosts(provider) for provider in API_BASES) else OTHER_HOSTS
+
+class Metrics:
+    # One run's stage and provider timers, and HTTP requests, body bytes and
+    # statuses per API host (cited sites together under OTHER_HOSTS). Cache
+    # and index hit ratios are read from those objects when the metrics are
+    # exported.
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages: Dict[str, _Timer] = {}
+        self.providers: Dict[str, _Timer] = {}
+        self.verdicts: Dict[Tuple[str, str], int] = {}
+        self.hosts: Dict[str, _Timer] = {}
+        self.host_bytes: Dict[str, int] = {}
+        self.statuses: Dict[Tuple[str, str], int] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, seconds: float, n: int = 1) -> None:
+        with self._lock:
+            timer = self.stages.get(name)
+            if timer is None:
+                timer = self.stages[name] = _Timer()
+            timer.add(seconds, n)
+
+    def provider(self, name: str, seconds: float, verdict: str) -> None:
+        with self._lock:
+            timer = self.providers.get(name)
+            if timer is None:
+                timer = self.providers[name] = _Timer()
+            timer.add(seconds)
+            self.verdicts[name, verdict] = self.verdicts.get((name, verdict), 0) + 1
+
+    def http(self, url: str, status: Union[int, str], size: int, seconds: float) -> None:
+        # status is the HTTP status, or the FetchError kind when there was none
+        host = _metric_host(url)
+        with self._lock:
+            timer = self.hosts.get(host)
+            if timer is None:
+                timer = self.hosts[host] = _Timer()
+            timer.add(seconds)
+            self.host_bytes[host] = self.host_bytes.get(host, 0) + size
+            self.statuses[host, str(status)] = self.statuses.get((host, str(status)), 0) + 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, Any]:
+        # JSON-ready view of everything recorded so far
+        with self._lock:
+            hosts = {host: dict(timer.to_dict(), bytes=self.host_bytes.get(host, 0),
+                                statuses={status: n for (h, status), n in sorted(self.statuses.items()) if h == host})
+                     for host, timer in sorted(self.hosts.items())}
+            providers = {name: dict(timer.to_dict(),
+                                    verdicts={verdict: n for (p, verdict), n in sorted(self.verdicts.items()) if p == name})
+                         for name, timer in sorted(self.providers.items())}
+            return {'wall_seconds': round(time.monotonic() - self.started, 6),
+                    'stages': {name: timer.to_dict() for name, timer in self.stages.items()},
+                    'providers': providers, 'http': hosts,
+                    'cache': hit_ratio(_metadata_cache), 'index': hit_ratio(_metadata_index),
+                    'counters': dict(self.counters)}
+
+    def prometheus(self) -> str:
+        # Prometheus text exposition format
+        out: List[str] = []
+
+        def histogram(metric: str, help_text: str, timers: Dict[str, _Timer], label: str) -> None:
+            out.append(f"# HELP {metric} {help_text}")
+            out.append(f"# TYPE {metric} histogram")
+            for name, timer in sorted(timers.items()):
+                cumulative = 0
+                for bound, n in zip(TIMER_BUCKETS + ('+Inf',), timer.buckets):
+                    cumulative += n
+                    out.append(f"{metric}_bucket{_prometheus_labels(**{label: name, 'le': bound})} {cumulative}")
+                out.append(f"{metric}_sum{_prometheus_labels(**{label: name})} {timer.total}")
+                out.append(f"{metric}_count{_prometheus_labels(**{label: name})} {timer.count}")
+
+        def counter(metric: str, help_text: str, values: Iterable[Tuple[Dict[str, str], Union[int, float]]]) -> None:
+            out.append(f"# HELP {metric} {help_text}")
+            out.append(f"# TYPE {metric} counter")
+            for labels, value in values:
+                out.append(f"{metric}{_prometheus_labels(**labels) if labels else ''} {value}")
+
+        with self._lock:
+            histogram('ctr_stage_seconds', 'Time spent in each pipeline stage.', self.stages, 'stage')
+            histogram('ctr_provider_seconds', 'Time each verifier provider took per reference.', self.providers, 'provider')
+            counter('ctr_provider_results_total', 'Verifier provider results by verdict.',
+                    (({'provider': p, 'verdict': v}, n) for (p, v), n in sorted(self.verdicts.items())))
+            histogram('ctr_http_request_seconds', 'Network time per HTTP request.', self.hosts, 'host')
+            counter('ctr_http_requests_total', 'HTTP requests by host and status.',
+                    (({'host': h, 'status': status}, n) for (h, status), n in sorted(self.statuses.items())))
+            counter('ctr_http_response_bytes_total', 'Response body bytes read per host.',
+                    (({'host': h}, n) for h, n in sorted(self.host_bytes.items())))
+            counters = dict(self.counters)
+        for name, source in (('cache', _metadata_cache), ('index', _metadata_index)):
+            ratio = hit_ratio(source)
+            if ratio is not None:
+                counter(f'ctr_{name}_lookups_total', f'Metadata {name} lookups by result.',
+                        (({'result': result}, ratio[result]) for result in ('hits', 'misses', 'revalidations')
+                         if result in ratio))
+        counter('ctr_events_total', 'Run counters: references, rate-limit retries, hedged requests.',
+                (({'event': name}, n) for name, n in sorted(counters.items())))
+        return '\n'.join(out) + '\n'
+
+    def format_profile(self) -> str:
+        # The --profile summary
+        data = self.snapshot()
+        wall = data['wall_seconds']
+        out = ["", "--- Profile ---", f"Wall time: {wall:.3f}s",
+               "Stages (summed over workers, so concurrent stages can exceed the wall time):"]
+        rows = [(name, data['stages'][name]) for name in METRIC_STAGES if name in data['stages']]
+        rows += [(name, timer) for name, timer in data['stages'].items() if name not in METRIC_STAGES]
+        for name, timer in rows:
+            share = timer['seconds'] / wall * 100 if wall else 0.0
+            out.append(f"  {name:<16} {timer['count']:>7} x {timer['mean_ms']:>9.3f} ms = {timer['seconds']:>9.3f}s"
+                       f" ({share:.1f}% of wall, max {timer['max_ms']:.1f} ms)")
+        if data['providers']:
+            out.append("Providers:")
+            for name, timer in data['providers'].items():
+                verdicts = ', '.join(f"{verdict} {n}" for verdict, n in timer['verdicts'].items())
+                out.append(f"  {name:<20} {timer['count']:>6} calls, mean {timer['mean_ms']:.1f} ms,"
+                           f" max {timer['max_ms']:.1f} ms ({verdicts})")
+        if data['http']:
+            out.append("HTTP:")
+            for host, timer in data['http'].items():
+                statuses = ', '.join(f"{status} x{n}" for status, n in timer['statuses'].items())
+                out.append(f"  {host:<24} {timer['count']:>6} requests, {timer['bytes']:,} bytes,"
+                           f" mean {timer['mean_ms']:.1f} ms, max {timer['max_ms']:.1f} ms [{statuses}]")
+        for name in ('cache', 'index'):
+            ratio = data[name]
+            if ratio is not None:
+                extra = f", {ratio['revalidations']} revalidated" if 'revalidations' in ratio else ''
+                out.append(f"Metadata {name}: {ratio['hits']} hits, {ratio['misses']} misses"
+                           f" ({ratio['hit_ratio'] * 100:.1f}% hit ratio{extra})")
+        events = {name: n for name, n in data['counters'].items() if n}
+        if events:
+            out.append("Counters: " + ', '.join(f"{name} {n}" for name, n in sorted(events.items())))
+        return '\n'.join(out)
+
+    def write(self, path: str, fmt: str = 'json') -> None:
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f"unknown metrics format '{fmt}'")
+        text = self.prometheus() if fmt == 'prometheus' else json.dumps(self.snapshot(), indent=2) + '\n'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+_metrics: Optional[Metrics] = None
+
+def set_metrics(metrics: Optional[Metrics]) -> None:
+    # Install the Metrics that hooks report to (None turns instrumentation off)
+    global _metrics
+    _metrics = metrics
+
+def get_metrics() -> Optional[Metrics]:
+    return _metrics
+
+# --- HTTP Fetching ---
+USER_AGENT = "CTR-Validator/1.0"
+REQUEST_TIMEOUT = 10
+# Maximum concurrent requests to any one API host from the async verifier
+DEFAULT_PER_HOST_LIMIT = 4
+# Keep-alive connections kept open per host by HttpClient
+DEFAULT_POOL_SIZE = 10
+# Transport-level retries for connection failures and 502/504 (429/503 go through RateLimiter)
+DEFAULT_RETRIES = 2
+
+# Where each API is reached; set_api_base() points one at a mirror or at a
+# local stand-in such as mock_api.py
+API_BASES = {
+    'crossref': 'https://api.crossref.org',
+    'openalex': 'https://api.openalex.org',
+    'openlibrary': 'https://openlibrary.org',
+}
+_api_bases = dict(API_BASES)
+
+def set_api_base(provider: str, base: Optional[str]) -> None:
+    # None restores the public API
+    if provider not in API_BASES:
+        raise ValueError(f"unknown API '{provider}'")
+    _api_bases[provider] = API_BASES[provider] if base is None else base.rstrip('/')
+
+def api_url(provider: str, path: str) -> str:
+    return _api_bases[provider] + path
+
+def _api_hosts(provider: str) -> Tuple[str, str]:
+    # The public host and the configured one (the same unless overridden)
+    return PROVIDER_HOSTS[provider], urlsplit(_api_bases[provider]).netloc.lower()
+
+# Cited web pages are read in chunks and never beyond this many bytes
+DEFAULT_MAX_PAGE_BYTES = 512 * 1024
+BODY_CHUNK_SIZE = 16 * 1024
+
+class FetchRequest:
+    # What the verifier asks for when a plain GET of a URL is not enough:
+    # a HEAD probe, or a GET that stops after max_bytes or once every string
+    # in stop_at (compared case-insensitively) has been seen in the body.
+    # headers carries extra request headers (conditional revalidation);
+    # deadline is a time.monotonic() instant after which the driver gives up;
+    # cache=False sends the request without consulting or filling the cache.
+    __slots__ = ('url', 'method', 'max_bytes', 'stop_at', 'headers', 'deadline', 'cache')
+
+    def __init__(self, url: str, method: str = 'GET', max_bytes: Optional[int] = None, stop_at: Iterable[str] = (),
+                 headers: Optional[Dict[str, str]] = None, deadline: Optional[float] = None, cache: bool = True):
+        self.url = url
+        self.method = method
+        self.max_bytes = max_bytes
+        self.stop_at = tuple(s.lower() for s in stop_at if s)
+        self.headers = headers
+        self.deadline = deadline
+        self.cache = cache
+
+    def __repr__(self) -> str:
+        return f"FetchRequest({self.method} {self.url})"
+
+def _as_request(request: Union[str, FetchRequest]) -> FetchRequest:
+    return request if isinstance(request, FetchRequest) else FetchRequest(request)
+
+def _body_encoding(headers: Any) -> str:
+    # Only trust a declared charset; undeclared HTML is nearly always UTF-8
+    m = re.search(r"charset=([\w.:-]+)", (headers or {}).get('Content-Type', ''), re.I)
+    if m:
+        try:
+            codecs.lookup(m.group(1))
+            return m.group(1)
+        except LookupError:
+            pass
+    return 'utf-8'
+
+class _BoundedBody:
+    # Decodes a streamed body chunk by chunk, stopping at the byte limit or
+    # as soon as all stop_at strings have appeared.
+    def __init__(self, request: FetchRequest, encoding: str):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._parts: List[str] = []
+        self._tail = ''
+        self._missing = list(request.stop_at)
+        self._remaining = request.max_bytes if request.max_bytes is not None else float('inf')
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        # Returns True once no more data is needed
+        chunk = chunk[:int(min(len(chunk), self._remaining))]
+        self._remaining -= len(chunk)
+        self.size += len(chunk)
+        text = self._decoder.decode(chunk)
+        self._parts.append(text)
+        if self._missing:
+            # Search only the new text plus enough carried-over tail to catch a
+            # match split across chunks
+            window = self._tail + text.lower()
+            self._missing = [m for m in self._missing if m not in window]
+            if not self._missing:
+                return True
+            self._tail = window[-max(len(m) for m in self._missing):]
+        return self._remaining <= 0
+
+    def text(self) -> str:
+        self._parts.append(self._decoder.decode(b'', final=True))
+        return ''.join(self._parts)
+
+class FetchResponse:
+    # Transport-neutral view of an HTTP response handed to the verifier;
+    # size is the body bytes read off the wire, when the transport knows it
+    __slots__ = ('status_code', 'headers', 'text', 'size')
+
+    def __init__(self, status_code: int, headers: Any, text: str, size: Optional[int] = None):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.size = size
+
+    def json(self) -> Any:
+        try:
+            return json.loads(self.text)
+        except ValueError as e:
+            raise FetchError(str(e), 'JSONDecodeError') from e
+
+class FetchError(Exception):
+    # Network or decoding failure; kind keeps the original exception name for debug output
+    def __init__(self, message: str, kind: str = 'RequestException'):
+        super().__init__(message)
+        self.kind = kind
+
+class HttpClient:
+    # Every blocking request goes through here: one pooled keep-alive
+    # Session per host, with User-Agent, timeout and retry policy set once.
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = REQUEST_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, user_agent: str = USER_AGENT):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.user_agent = user_agent
+        self._sessions: Dict[str, 'requests.Session'] = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> 'requests.Session':
+        import requests
+        import requests.adapters
+        from urllib3.util.retry import Retry
+        session = requests.Session()
+        session.headers['User-Agent'] = self.user_agent
+        # 429 and 503 are left to the RateLimiter; urllib3 would otherwise
+        # retry them as well whenever Retry-After is present
+        retry = Retry(total=self.retries, backoff_factor=0.5, status_forcelist=(502, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False,
+                      respect_retry_after_header=False)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session_for(self, url: str) -> 'requests.Session':
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc.lower()}"
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._sessions[host] = self._new_session()
+        return session
+
+    def get(self, url: str, **kwargs) -> 'requests.Response':
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session_for(url).get(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> 'requests.Response':
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        return self.session_for(url).head(url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+def get_http_client() -> HttpClient:
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = HttpClient()
+    return _http_client
+
+def set_http_client(client: Optional[HttpClient]) -> None:
+    # Replace the shared client (None recreates the default on next use)
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None and _http_client is not client:
+            _http_client.close()
+        _http_client = client
+
+def _fetch_once(request: FetchRequest) -> FetchResponse:
+    client = get_http_client()
+    started = time.monotonic()
+    response = None
+    try:
+        response = _fetch_once_with(client, request)
+        return response
+    except FetchError as e:
+        response = e
+        raise
+    finally:
+        _fetch_done(request, started, response)
+
+def _fetch_done(request: FetchRequest, started: float, response: Union[FetchResponse, FetchError, None]) -> None:
+    # Bookkeeping for one network round trip, answered or not
+    seconds = time.monotonic() - started
+    _latency.record(request.url, seconds)
+    metrics = _metrics
+    if metrics is not None:
+        if isinstance(response, FetchResponse):
+            metrics.http(request.url, response.status_code, response.size or 0, seconds)
+        else:
+            metrics.http(request.url, response.kind if response is not None else 'error', 0, seconds)
+
+def _fetch_once_with(client: 'HttpClient', request: FetchRequest) -> FetchResponse:
+    import requests
+    try:
+        if request.method == 'HEAD':
+            r = client.head(request.url, headers=request.headers)
+            return FetchResponse(r.status_code, r.headers, '')
+        if request.max_bytes is None and not request.stop_at:
+            r = client.get(request.url, headers=request.headers)
+            return FetchResponse(r.status_code, r.headers, r.text, len(r.content))
+        with client.get(request.url, headers=request.headers, stream=True) as r:
+            body = _BoundedBody(request, _body_encoding(r.headers))
+            for chunk in r.iter_content(BODY_CHUNK_SIZE):
+                if body.feed(chunk):
+                    break
+            return FetchResponse(r.status_code, r.headers, body.text(), body.size)
+    except requests.exceptions.RequestException as e:
+        raise FetchError(str(e), type(e).__name__) from e
+
+def _fetch_network(request: FetchRequest) -> FetchResponse:
+    limiter = _rate_limiter
+    if limiter is None:
+        return _fetch_once(request)
+    attempt = 0
+    while True:
+        wait = limiter.reserve(request.url)
+        if wait > 0:
+            time.sleep(wait)
+            if _metrics is not None:
+                _metrics.stage('rate_limit_wait', wait)
+        response = _fetch_once(request)
+        delay = limiter.observe(request.url, response.status_code, response.headers, attempt)
+        if delay is None:
+            return response
+        # Hosts without a bucket (cited sites, unlimited hosts, mirrors) have
+        # no pause for reserve() to apply, so back off here in every case;
+        # a bucket's pause has run out by the time this returns
+        time.sleep(delay)
+        if _metrics is not None:
+            _metrics.count('rate_limit_retries')
+            _metrics.stage('rate_limit_wait', delay)
+        attempt += 1
+
+def _cache_variant(request: FetchRequest) -> str:
+    # Bounded page reads depend on their limits, so each combination is
+    # cached separately from the whole-body response for the same URL
+    if request.max_bytes is None and not request.stop_at:
+        return ''
+    return f"{request.max_bytes}:{'|'.join(request.stop_at)}"
+
+class _CacheLookup:
+    # Outcome of consulting the metadata cache before a fetch: either a fresh
+    # response, or the request to send (conditional when a stale entry has
+    # validators) plus what is needed to store or revalidate afterwards.
+    __slots__ = ('cache', 'request', 'variant', 'ttl', 'fresh', 'stale')
+
+    def __init__(self, request: FetchRequest):
+        self.cache = _metadata_cache if request.method == 'GET' and request.cache else None
+        self.request = request
+        self.variant = _cache_variant(request)
+        # Cited pages change without notice: revalidate them on every run
+        self.ttl = PAGE_CACHE_TTL if self.variant else None
+        self.fresh = None
+        self.stale = None
+        if self.cache is None:
+            return
+        self.fresh = self.cache.get(request.url, self.variant)
+        if self.fresh is not None:
+            return
+        found = self.cache.get_stale(request.url, self.variant)
+        if found is not None:
+            self.stale, conditional = found
+            self.request = FetchRequest(request.url, request.method, request.max_bytes, request.stop_at,
+                                        dict(request.headers or {}, **conditional), request.deadline)
+
+    def finish(self, response: FetchResponse) -> FetchResponse:
+        if self.cache is None:
+            return response
+        if response.status_code == 304 and self.stale is not None:
+            self.cache.revalidated(self.request.url, response.headers, self.variant, self.ttl)
+            return self.stale
+        self.cache.put(self.request.url, response, self.variant, self.ttl)
+        return response
+
+def fetch_url(request: Union[str, FetchRequest]) -> FetchResponse:
+    lookup = _CacheLookup(_as_request(request))
+    if lookup.fresh is not None:
+        return lookup.fresh
+    return lookup.finish(_fetch_network(lookup.request))
+
+class AsyncFetcher:
+    # Shares one aiohttp session across a batch and caps in-flight requests
+    # per host. aiohttp is optional for the rest of the module but required
+    # here; without it use the thread-pool verify_references() instead.
+    def __init__(self, per_host_limit: int = DEFAULT_PER_HOST_LIMIT, timeout: float = REQUEST_TIMEOUT):
+        if per_host_limit < 1:
+            raise ValueError("per_host_limit must be at least 1")
+        if _optional('aiohttp') is None:
+            raise ImportError("The asyncio verifier needs aiohttp (pip install aiohttp); "
+                              "verify_references() works without it")
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self._limits: Dict[str, 'asyncio.Semaphore'] = {}
+        self._session = None
+
+    def _host_limit(self, url: str) -> 'asyncio.Semaphore':
+        import asyncio
+        host = urlsplit(url).netloc
+        limit = self._limits.get(host)
+        if limit is None:
+            limit = self._limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return limit
+
+    async def fetch(self, request: Union[str, FetchRequest]) -> FetchResponse:
+        lookup = _CacheLookup(_as_request(request))
+        if lookup.fresh is not None:
+            return lookup.fresh
+        async with self._host_limit(lookup.request.url):
+            response = await self._fetch_network(lookup.request)
+        return lookup.finish(response)
+
+    async def _fetch_network(self, request: FetchRequest) -> FetchResponse:
+        import asyncio
+        limiter = _rate_limiter
+        if limiter is None:
+            return await self._fetch_once(request)
+        attempt = 0
+        while True:
+            wait = limiter.reserve(request.url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                if _metrics is not None:
+                    _metrics.stage('rate_limit_wait', wait)
+            response = await self._fetch_once(request)
+            delay = limiter.observe(request.url, response.status_code, response.headers, attempt)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            if _metrics is not None:
+                _metrics.count('rate_limit_retries')
+                _metrics.stage('rate_limit_wait', delay)
+            attempt += 1
+
+    async def _fetch_once(self, request: FetchRequest) -> FetchResponse:
+        import asyncio
+        aiohttp = _optional('aiohttp')
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"User-Agent": USER_AGENT},
+                connector=aiohttp.TCPConnector(limit_per_host=self.per_host_limit),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        started = time.monotonic()
+        response = None
+        try:
+            response = await self._request(request)
+            return response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            response = FetchError(str(e) or type(e).__name__, type(e).__name__)
+            raise response from e
+        finally:
+            _fetch_done(request, started, response)
+
+    async def _request(self, request: FetchRequest) -> FetchResponse:
+        async with self._session.request(request.method, request.url, headers=request.headers) as r:
+            if request.method == 'HEAD':
+                return FetchResponse(r.status, r.headers, '')
+            if request.max_bytes is None and not request.stop_at:
+                # text() decodes the body read() has already buffered
+                size = len(await r.read())
+                return FetchResponse(r.status, r.headers, await r.text(errors='replace'), size)
+            body = _BoundedBody(request, _body_encoding(r.headers))
+            async for chunk in r.content.iter_chunked(BODY_CHUNK_SIZE):
+                if body.feed(chunk):
+                    break
+            return FetchResponse(r.status, r.headers, body.text(), body.size)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'AsyncFetcher':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+# --- Metadata Cache ---
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'ctr-validator', 'metadata.sqlite3')
+DEFAULT_CACHE_TTL = 30 * 24 * 3600           # DOI/ISBN metadata rarely changes
+DEFAULT_NEGATIVE_CACHE_TTL = 24 * 3600       # 404s and empty searches may be fixed upstream
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Page reads are stored only to be revalidated with If-None-Match/If-Modified-Since
+PAGE_CACHE_TTL = 0
+# Statuses worth remembering; anything else (5xx, 429, ...) is retried next run
+_NEGATIVE_STATUSES = (404, 410)
+_EVICT_EVERY = 64
+
+def normalize_cache_key(url: str) -> str:
+    # Collapse URLs that fetch the same record: host case, query order,
+    # DOI case (DOIs are case-insensitive) and ISBN hyphenation.
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    path = parts.path
+    if host in _api_hosts('crossref') and path.startswith('/works/'):
+        path = path.lower()
+    elif host in _api_hosts('openlibrary') and path.startswith('/isbn/'):
+        path = path.replace('-', '').lower()
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), host, path, query, ''))
+
+def _is_negative(response: FetchResponse) -> bool:
+    if response.status_code in _NEGATIVE_STATUSES:
+        return True
+    # Successful searches that found nothing (OpenLibrary numFound, OpenAlex meta.count)
+    if response.status_code == 200 and ('"numFound"' in response.text or '"meta"' in response.text):
+        try:
+            data = json.loads(response.text)
+        except ValueError:
+            return False
+        if isinstance(data, dict):
+            if data.get('numFound', 1) == 0:
+                return True
+            meta = data.get('meta')
+            if isinstance(meta, dict) and meta.get('count', 1) == 0:
+                return True
+    return False
+
+class MetadataCache:
+    # Persistent SQLite cache of API responses keyed on normalize_cache_key().
+    # Positive and negative results get separate TTLs; once the stored bodies
+    # exceed max_bytes the least recently used entries are evicted. Expired
+    # entries that came with an ETag or Last-Modified are kept for a further
+    # TTL so the next fetch can revalidate them instead of downloading again.
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_CACHE_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_CACHE_TTL, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, status INTEGER NOT NULL, headers TEXT NOT NULL,"
+            " body TEXT NOT NULL, size INTEGER NOT NULL, negative INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        for column in ('etag', 'last_modified'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+
+    @staticmethod
+    def _key(url: str, variant: str = '') -> str:
+        key = normalize_cache_key(url)
+        return f"{key}#{variant}" if variant else key
+
+    def get(self, url: str, variant: str = '') -> Optional[FetchResponse]:
+        return self._get(url, variant, count_miss=True)
+
+    def peek(self, url: str, variant: str = '') -> Optional[FetchResponse]:
+        # get() for a caller that looks the URL up again when it is missing,
+        # so the miss is counted once, by that lookup
+        return self._get(url, variant, count_miss=False)
+
+    def _get(self, url: str, variant: str, count_miss: bool) -> Optional[FetchResponse]:
+        key = self._key(url, variant)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body FROM responses WHERE key = ? AND expires_at > ?",
+                (key, now)).fetchone()
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return FetchResponse(row[0], json.loads(row[1]), row[2])
+
+    def get_stale(self, url: str, variant: str = '') -> Optional[Tuple[FetchResponse, Dict[str, str]]]:
+        # An expired entry that can be revalidated, with the conditional
+        # headers to send for it
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified FROM responses"
+                " WHERE key = ? AND (etag IS NOT NULL OR last_modified IS NOT NULL)",
+                (self._key(url, variant),)).fetchone()
+        if row is None:
+            return None
+        conditional = {}
+        if row[3]:
+            conditional['If-None-Match'] = row[3]
+        if row[4]:
+            conditional['If-Modified-Since'] = row[4]
+        return FetchResponse(row[0], json.loads(row[1]), row[2]), conditional
+
+    def revalidated(self, url: str, headers: Any, variant: str = '', ttl: Optional[float] = None) -> None:
+        # The server answered 304: keep the stored body for another TTL,
+        # picking up any new validators it sent
+        now = time.time()
+        headers = headers or {}
+        with self._lock:
+            self.revalidations += 1
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, accessed_at = ?,"
+                " etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (now + (self.ttl if ttl is None else ttl), now, headers.get('ETag'), headers.get('Last-Modified'),
+                 self._key(url, variant)))
+
+    def put(self, url: str, response: FetchResponse, variant: str = '', ttl: Optional[float] = None) -> None:
+        negative = _is_negative(response)
+        if response.status_code != 200 and not negative:
+            return
+        etag = response.headers.get('ETag') if response.headers else None
+        last_modified = response.headers.get('Last-Modified') if response.headers else None
+        if ttl is not None and ttl <= 0 and not (etag or last_modified):
+            # Would expire at once with nothing to revalidate against
+            return
+        now = time.time()
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        headers = json.dumps(dict(response.headers or {}))
+        size = len(response.text) + len(headers)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, status, headers, body, size, negative, expires_at, accessed_at,"
+                " etag, last_modified) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(url, variant), response.status_code, headers, response.text, size, int(negative),
+                 now + ttl, now, etag, last_modified))
+            self._puts += 1
+            if self._puts % _EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # Entries without validators are useless once expired; those with
+        # them stay one more TTL for a conditional request
+        self._conn.execute(
+            "DELETE FROM responses WHERE expires_at <= ? AND ((etag IS NULL AND last_modified IS NULL) OR expires_at <= ?)",
+            (now, now - self.ttl))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the budget so eviction does not run on every insert
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict(time.time())
+
+    def items(self, prefix: str = '') -> Iterator[Tuple[str, FetchResponse]]:
+        # Every stored 200 response whose key starts with prefix, expired or not
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, headers, body FROM responses WHERE status = 200 AND negative = 0 AND key >= ? AND key < ?",
+                (prefix, prefix + '\uffff')).fetchall()
+        for key, headers, body in rows:
+            yield key, FetchResponse(200, json.loads(headers), body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_metadata_cache: Optional[MetadataCache] = None
+
+def set_metadata_cache(cache: Optional[MetadataCache]) -> None:
+    # Install the cache used by fetch_url and AsyncFetcher (None disables caching)
+    global _metadata_cache
+    _metadata_cache = cache
+
+def get_metadata_cache() -> Optional[MetadataCache]:
+    return _metadata_cache
+
+# --- Local Metadata Index ---
+# Most references in a term's submissions cite the same few thousand works,
+# so DOIs and ISBNs are looked up in a local SQLite index before any request
+# is made. The index is loaded from JSONL snapshots (CrossRef works, OpenAlex
+# works, OpenLibrary editions, optionally gzipped; OpenLibrary's tab-separated
+# dumps too) and from responses already in the metadata cache. Records are
+# stored in the shape the verifiers read from the network: CrossRef works for
+# DOIs, OpenLibrary editions for ISBNs.
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'ctr-validator', 'index.sqlite3')
+# A DOI found in both a CrossRef and an OpenAlex snapshot keeps CrossRef's record
+_INDEX_RANKS = {'crossref': 2, 'openlibrary': 2, 'openalex': 1}
+_INDEX_BATCH = 10000
+_INDEX_FIELDS = ('DOI', 'title', 'author', 'container-title', 'volume', 'issue', 'page', 'abstract')
+_EDITION_FIELDS = ('key', 'title', 'authors', 'publishers', 'publish_date')
+
+def normalize_isbn(isbn: str) -> str:
+    return re.sub(r"[\s-]", '', isbn).upper()
+
+def _indexed_prefixes() -> List[str]:
+    # Cache keys of responses that carry works or editions: those from the
+    # public APIs and from any base set with set_api_base()
+    bases = set(API_BASES.values()) | set(_api_bases.values())
+    return sorted({normalize_cache_key(base + '/') for base in bases})
+
+def isbn_forms(isbn: str) -> List[str]:
+    # The ISBN itself plus its ISBN-10/ISBN-13 counterpart, when it has one
+    isbn = normalize_isbn(isbn)
+    forms = [isbn]
+    if len(isbn) == 10 and isbn[:9].isdigit():
+        core = '978' + isbn[:9]
+        check = -sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(core)) % 10
+        forms.append(core + str(check))
+    elif len(isbn) == 13 and isbn.isdigit() and isbn.startswith('978'):
+        core = isbn[3:12]
+        check = -sum(int(c) * (10 - i) for i, c in enumerate(core)) % 11
+        forms.append(core + ('X' if check == 10 else str(check)))
+    return forms
+
+def _openalex_as_crossref(data: Dict[str, Any]) -> Dict[str, Any]:
+    # The fields _crossref_doi_steps reads, taken from an OpenAlex work
+    authors = []
+    for authorship in data.get('authorships') or []:
+        given, _, family = ((authorship.get('author') or {}).get('display_name') or '').strip().rpartition(' ')
+        if given and family:
+            authors.append({'family': family, 'given': given})
+    biblio = data.get('biblio') or {}
+    source = ((data.get('primary_location') or {}).get('source') or {}).get('display_name')
+    work = {'DOI': data['doi'].split('doi.org/')[-1], 'title': [data.get('title') or data.get('display_name') or ''],
+            'author': authors, 'container-title': [source or ''], 'volume': biblio.get('volume') or '',
+            'issue': biblio.get('issue') or '',
+            'page': '-'.join(p for p in (biblio.get('first_page'), biblio.get('last_page')) if p)}
+    abstract = rebuild_openalex_abstract(data.get('abstract_inverted_index'))
+    if abstract:
+        work['abstract'] = abstract
+    return work
+
+def index_entries(data: Any) -> Iterator[Tuple[str, str, int, Dict[str, Any]]]:
+    # (kind, key, rank, record) for every work or edition in one snapshot
+    # line or API response, including those inside a "message", "items" or
+    # "results" wrapper
+    if not isinstance(data, dict):
+        return
+    if isinstance(data.get('message'), dict):
+        yield from index_entries(data['message'])
+        return
+    for listing in ('items', 'results'):
+        if isinstance(data.get(listing), list):
+            for item in data[listing]:
+                yield from index_entries(item)
+            return
+    if isinstance(data.get('DOI'), str):
+        work = {name: data[name] for name in _INDEX_FIELDS if name in data}
+        # _crossref_doi_steps indexes the first title and journal
+        work['title'] = data.get('title') or ['']
+        work['container-title'] = data.get('container-title') or ['']
+        yield 'doi', data['DOI'].lower(), _INDEX_RANKS['crossref'], work
+    elif isinstance(data.get('doi'), str) and 'authorships' in data:
+        work = _openalex_as_crossref(data)
+        yield 'doi', work['DOI'].lower(), _INDEX_RANKS['openalex'], work
+    elif data.get('isbn_10') or data.get('isbn_13'):
+        edition = {name: data[name] for name in _EDITION_FIELDS if name in data}
+        keys = dict.fromkeys(form for isbn in (data.get('isbn_10') or []) + (data.get('isbn_13') or [])
+                             if isinstance(isbn, str) for form in isbn_forms(isbn))
+        for key in keys:
+            yield 'isbn', key, _INDEX_RANKS['openlibrary'], edition
+
+def _snapshot_lines(path: str) -> Iterator[str]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        yield from f
+
+def _snapshot_files(path: str) -> List[str]:
+    # A snapshot directory (OpenAlex ships one per entity) is loaded file by file
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                  if not name.startswith('.'))
+
+class MetadataIndex:
+    # SQLite table of records keyed on (kind, key): lowercased DOIs and
+    # normalized ISBNs (stored under both their ISBN-10 and ISBN-13 form).
+    # Every loaded snapshot file is listed in sources so refresh() can reload
+    # the ones that changed on disk.
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, rank INTEGER NOT NULL, record TEXT NOT NULL,"
+            " PRIMARY KEY (kind, key)) WITHOUT ROWID")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL,"
+            " records INTEGER NOT NULL, loaded_at REAL NOT NULL)")
+
+    def _get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM records WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def crossref_work(self, doi: str) -> Optional[Dict[str, Any]]:
+        return self._get('doi', doi.strip().lower())
+
+    def edition(self, isbn: str) -> Optional[Dict[str, Any]]:
+        return self._get('isbn', normalize_isbn(isbn))
+
+    def _upsert(self, entries: Iterable[Tuple[str, str, int, Dict[str, Any]]]) -> int:
+        # Loads entries in batches, one transaction each; a lower-ranked record
+        # never replaces a higher-ranked one
+        count = 0
+        entries = iter(entries)
+        while True:
+            batch = [(kind, key, rank, json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                     for kind, key, rank, record in islice(entries, _INDEX_BATCH)]
+            if not batch:
+                return count
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO records (kind, key, rank, record) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (kind, key) DO UPDATE SET rank = excluded.rank, record = excluded.record"
+                    " WHERE excluded.rank >= records.rank", batch)
+                self._conn.execute("COMMIT")
+            count += len(batch)
+
+    def _load_file(self, path: str) -> int:
+        def entries():
+            for line in _snapshot_lines(path):
+                line = line.strip()
+                if not line:
+                    continue
+                if not line.startswith('{'):
+                    # OpenLibrary dumps: type, key, revision, last_modified, JSON
+                    line = line.rpartition('\t')[2]
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                yield from index_entries(data)
+        stat = os.stat(path)
+        count = self._upsert(entries())
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sources (path, mtime, size, records, loaded_at) VALUES (?, ?, ?, ?, ?)",
+                               (os.path.abspath(path), stat.st_mtime, stat.st_size, count, time.time()))
+        return count
+
+    def load(self, path: str) -> List[Tuple[str, int]]:
+        # Loads a snapshot file or directory; returns (file, records) for each file
+        return [(name, self._load_file(name)) for name in _snapshot_files(path)]
+
+    def load_cache(self, cache: MetadataCache) -> int:
+        # Past verification runs: CrossRef works, OpenAlex works and
+        # OpenLibrary editions already fetched into the metadata cache
+        def entries():
+            for prefix in _indexed_prefixes():
+                for _, response in cache.items(prefix):
+                    try:
+                        data = json.loads(response.text)
+                    except ValueError:
+                        continue
+                    yield from index_entries(data)
+        return self._upsert(entries())
+
+    def refresh(self) -> List[Tuple[str, int]]:
+        # Reloads each recorded snapshot file whose size or mtime changed;
+        # files that have disappeared keep their records
+        with self._lock:
+            sources = self._conn.execute("SELECT path, mtime, size FROM sources ORDER BY path").fetchall()
+        reloaded = []
+        for path, mtime, size in sources:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime != mtime or stat.st_size != size:
+                reloaded.append((path, self._load_file(path)))
+        return reloaded
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT kind, COUNT(*) FROM records GROUP BY kind").fetchall())
+            sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        return {'dois': counts.get('doi', 0), 'isbns': counts.get('isbn', 0), 'sources': sources}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM records")
+            self._conn.execute("DELETE FROM sources")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_metadata_index: Optional[MetadataIndex] = None
+
+def set_metadata_index(index: Optional[MetadataIndex]) -> None:
+    # Install the index consulted before any DOI or ISBN request (None disables it)
+    global _metadata_index
+    _metadata_index = index
+
+def get_metadata_index() -> Optional[MetadataIndex]:
+    return _metadata_index
+
+# --- Latency Budgets ---
+# A reference may be given a total time budget and each provider a budget of
+# its own; the dispatcher stamps the earlier deadline on every request, and
+# the drivers stop waiting once it passes. A request still unanswered after
+# the host's observed p95 latency can be hedged with a duplicate; whichever
+# copy answers first is used.
+TIMED_OUT = "Inconclusive (timed out)"
+LATENCY_WINDOW = 200          # recent samples kept per host
+HEDGE_MIN_SAMPLES = 20        # no hedging until the p95 means something
+HEDGE_MIN_DELAY = 0.05        # never hedge sooner than this
+FETCH_POOL_SIZE = 32          # fewest fetch threads, whatever the workers
+
+class LatencyTracker:
+    # Recent network latencies per host (fetch time only, not cache hits or
+    # rate-limit waits)
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, url: str, seconds: float) -> None:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            samples = self._samples.get(host)
+            if samples is None:
+                samples = self._samples[host] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, url: str, q: float = 0.95, min_samples: int = HEDGE_MIN_SAMPLES) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(urlsplit(url).netloc.lower(), ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+_latency = LatencyTracker()
+_reference_budget: Optional[float] = None
+_provider_budget: Optional[float] = None
+_hedging = False
+
+def set_latency_budgets(reference: Optional[float] = None, provider: Optional[float] = None) -> None:
+    # Seconds allowed per reference and per provider call chain (None: unlimited)
+    global _reference_budget, _provider_budget
+    _reference_budget = reference
+    _provider_budget = provider
+
+def set_hedging(enabled: bool) -> None:
+    global _hedging
+    _hedging = enabled
+
+def _hedge_delay(url: str) -> Optional[float]:
+    if not _hedging:
+        return None
+    p95 = _latency.quantile(url)
+    return None if p95 is None else max(p95, HEDGE_MIN_DELAY)
+
+def _deadline_error(request: FetchRequest) -> FetchError:
+    return FetchError(f"Deadline exceeded before {request.url} answered", 'DeadlineExceeded')
+
+def _needs_timing(request: Union[str, FetchRequest]) -> bool:
+    return _hedging or (isinstance(request, FetchRequest) and request.deadline is not None)
+
+_fetch_pool: Optional[ThreadPoolExecutor] = None
+_fetch_pool_size = FETCH_POOL_SIZE
+_fetch_pool_lock = threading.Lock()
+
+def set_fetch_pool_size(size: int) -> None:
+    # Deadlines run from before a request is queued, so the pool must hold
+    # every request that can be in flight at once or queued ones time out
+    global _fetch_pool, _fetch_pool_size
+    size = max(FETCH_POOL_SIZE, size)
+    with _fetch_pool_lock:
+        if _fetch_pool is not None and size != _fetch_pool_size:
+            # Requests already running there finish in the background
+            _fetch_pool.shutdown(wait=False)
+            _fetch_pool = None
+        _fetch_pool_size = size
+
+def _get_fetch_pool() -> ThreadPoolExecutor:
+    # Threads for requests the sync driver waits on with a timeout (raced,
+    # hedged or under a deadline)
+    global _fetch_pool
+    if _fetch_pool is None:
+        with _fetch_pool_lock:
+            if _fetch_pool is None:
+                _fetch_pool = ThreadPoolExecutor(max_workers=_fetch_pool_size, thread_name_prefix='ctr-fetch')
+    return _fetch_pool
+
+def _fetch_or_error(fetch, request):
+    try:
+        return fetch(request)
+    except FetchError as e:
+        return e
+
+def _fetch_timed(fetch, request: Union[str, FetchRequest]) -> Union[FetchResponse, FetchError]:
+    # One request under its deadline, hedged past the host's p95. Copies that
+    # lose or time out keep running in the background and are ignored.
+    request = _as_request(request)
+    hedge_at = _hedge_delay(request.url)
+    started = time.monotonic()
+    pending = set()
+    result = None
+    if request.deadline is None or started < request.deadline:
+        pending.add(_get_fetch_pool().submit(_fetch_or_error, fetch, request))
+    while pending:
+        timeout = _wait_timeout(request, started, hedge_at)
+        if timeout is not None and timeout < 0:
+            result = None
+            break
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        result = _first_result([future.result() for future in done], result)
+        if done and (not isinstance(result, FetchError) or not pending):
+            break
+        if hedge_at is not None and time.monotonic() >= started + hedge_at:
+            hedge_at = None
+            pending.add(_get_fetch_pool().submit(_fetch_or_error, fetch, request))
+            if _metrics is not None:
+                _metrics.count('hedged_requests')
+    for future in pending:
+        future.cancel()
+    return result if result is not None else _deadline_error(request)
+
+async def _fetch_timed_async(fetch, request: Union[str, FetchRequest]) -> Union[FetchResponse, FetchError]:
+    import asyncio
+    request = _as_request(request)
+
+    async def attempt():
+        try:
+            return await fetch(request)
+        except FetchError as e:
+            return e
+
+    hedge_at = _hedge_delay(request.url)
+    started = time.monotonic()
+    pending = set()
+    result = None
+    if request.deadline is None or started < request.deadline:
+        pending.add(asyncio.ensure_future(attempt()))
+    try:
+        while pending:
+            timeout = _wait_timeout(request, started, hedge_at)
+            if timeout is not None and timeout < 0:
+                result = None
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            result = _first_result([task.result() for task in done], result)
+            if done and (not isinstance(result, FetchError) or not pending):
+                break
+            if hedge_at is not None and time.monotonic() >= started + hedge_at:
+                hedge_at = None
+                pending.add(asyncio.ensure_future(attempt()))
+                if _metrics is not None:
+                    _metrics.count('hedged_requests')
+    finally:
+        for task in pending:
+            task.cancel()
+    return result if result is not None else _deadline_error(request)
+
+def _wait_timeout(request: FetchRequest, started: float, hedge_at: Optional[float]) -> Optional[float]:
+    # How long to wait for the copies in flight: until the deadline, or until
+    # it is time to hedge. Negative once the deadline has passed.
+    now = time.monotonic()
+    timeout = None if request.deadline is None else request.deadline - now
+    if timeout is not None and timeout <= 0:
+        return -1.0
+    if hedge_at is not None:
+        until_hedge = max(0.0, started + hedge_at - now)
+        timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+    return timeout
+
+def _first_result(results: List[Union[FetchResponse, FetchError]], previous: Any) -> Any:
+    # A response beats an error; an error only stands if nothing else answers
+    for result in results:
+        if not isinstance(result, FetchError):
+            return result
+    return results[0] if results else previous
+
+# --- Drivers ---
+class Parallel:
+    # Yielded by a verifier generator to keep several requests in flight:
+    # the driver starts the tagged requests in start, abandons the tags in
+    # cancel, then sends back (tag, FetchResponse or FetchError) for whichever
+    # in-flight request finishes first, or None if nothing is in flight.
+    __slots__ = ('start', 'cancel')
+
+    def __init__(self, start: Optional[Dict[Any, Union[str, FetchRequest]]] = None, cancel: Iterable[Any] = ()):
+        self.start = start or {}
+        self.cancel = tuple(cancel)
+
+def _earliest_deadline(in_flight: Dict[Any, Tuple[Union[str, FetchRequest], Any]]) -> Optional[float]:
+    deadlines = [request.deadline for request, _ in in_flight.values()
+                 if isinstance(request, FetchRequest) and request.deadline is not None]
+    return min(deadlines) if deadlines else None
+
+def _expired_tag(in_flight: Dict[Any, Tuple[Union[str, FetchRequest], Any]]) -> Any:
+    now = time.monotonic()
+    for tag, (request, _) in in_flight.items():
+        if isinstance(request, FetchRequest) and request.deadline is not None and request.deadline <= now:
+            return tag
+    return None
+
+def _next_finished(in_flight: Dict[Any, Tuple[Union[str, FetchRequest], Any]]) -> Optional[Tuple[Any, Any]]:
+    # (tag, FetchResponse or FetchError) for the first in-flight request to
+    # answer or pass its deadline, removing it; None if nothing is in flight
+    while in_flight:
+        deadline = _earliest_deadline(in_flight)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, _ = wait([future for _, future in in_flight.values()], timeout=timeout, return_when=FIRST_COMPLETED)
+        if done:
+            tag = next(tag for tag, (_, future) in in_flight.items() if future in done)
+            return tag, in_flight.pop(tag)[1].result()
+        tag = _expired_tag(in_flight)
+        if tag is not None:
+            request, future = in_flight.pop(tag)
+            future.cancel()
+            return tag, _deadline_error(_as_request(request))
+    return None
 
+async def _next_finished_async(in_flight: Dict[Any, Tuple[Union[str, FetchRequest], 'asyncio.Task']]) -> Optional[Tuple[Any, Any]]:
+    import asyncio
+    while in_flight:
+        deadline = _earliest_deadline(in_flight)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, _ = await asyncio.wait([task for _, task in in_flight.values()], timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if done:
+            tag = next(tag for tag, (_, task) in in_flight.items() if task in done)
+            return tag, in_flight.pop(tag)[1].result()
+        tag = _expired_tag(in_flight)
+        if tag is not None:
+            request, task = in_flight.pop(tag)
+            task.cancel()
+            return tag, _deadline_error(_as_request(request))
+    return None
+
+def _drive(steps, fetch) -> Dict[str, Any]:
+    in_flight: Dict[Any, Any] = {}
+    try:
+        url = next(steps)
+        while True:
+            if isinstance(url, Parallel):
+                for tag in url.cancel:
+                    entry = in_flight.pop(tag, None)
+                    if entry is not None:
+                        entry[1].cancel()
+                for tag, request in url.start.items():
+                    in_flight[tag] = (request, _get_fetch_pool().submit(_fetch_or_error, fetch, request))
+                url = steps.send(_next_finished(in_flight))
+                continue
+            if _needs_timing(url):
+                response = _fetch_timed(fetch, url)
+                url = steps.throw(response) if isinstance(response, FetchError) else steps.send(response)
+                continue
+            try:
+                response = fetch(url)
+            except FetchError as e:
+                url = steps.throw(e)
+            else:
+                url = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        # Requests already running finish in the background; their results are dropped
+        for _, future in in_flight.values():
+            future.cancel()
+
+async def _drive_async(steps, fetch) -> Dict[str, Any]:
+    import asyncio
+    in_flight: Dict[Any, Tuple[Union[str, FetchRequest], 'asyncio.Task']] = {}
+
+    async def fetch_or_error(request):
+        try:
+            return await fetch(request)
+        except FetchError as e:
+            return e
+
+    try:
+        url = next(steps)
+        while True:
+            if isinstance(url, Parallel):
+                for tag in url.cancel:
+                    entry = in_flight.pop(tag, None)
+                    if entry is not None:
+                        entry[1].cancel()
+                for tag, request in url.start.items():
+                    in_flight[tag] = (request, asyncio.ensure_future(fetch_or_error(request)))
+                url = steps.send(await _next_finished_async(in_flight))
+                continue
+            if _needs_timing(url):
+                response = await _fetch_timed_async(fetch, url)
+                url = steps.throw(response) if isinstance(response, FetchError) else steps.send(response)
+                continue
+            try:
+                response = await fetch(url)
+            except FetchError as e:
+                url = steps.throw(e)
+            else:
+                url = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        for _, task in in_flight.values():
+            task.cancel()
+
+# --- Metadata Record ---
+def crossref_work_url(doi: str) -> str:
+    return api_url('crossref', f"/works/{doi}")
+
+def rebuild_openalex_abstract(inverted_index: Optional[Dict[str, List[int]]]) -> Optional[str]:
+    # OpenAlex ships abstracts as {word: [positions]}
+    if not inverted_index:
+        return None
+    words = sorted((pos, word) for word, positions in inverted_index.items() for pos in positions)
+    return ' '.join(word for _, word in words)
+
+class MetadataRecord:
+    # Everything fetched about one reference. Each CrossRef work is requested
+    # at most once (a failure is remembered too), so the match, details and
+    # abstract steps read from here instead of issuing repeat requests. Works
+    # and editions in the local metadata index are never requested at all.
+    def __init__(self, prefetched: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._prefetched = prefetched or {}
+        self._index = _metadata_index
+        self._crossref: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._crossref_errors: Dict[str, FetchError] = {}
+        self.openalex: Optional[Dict[str, Any]] = None
+
+    def crossref_work(self, doi: str) -> Optional[Dict[str, Any]]:
+        # The CrossRef work for doi if it is already in hand; never fetches
+        key = doi.lower()
+        if key in self._crossref:
+            return self._crossref[key]
+        work = self._prefetched.get(key)
+        if work is None and self._index is not None:
+            work = self._index.crossref_work(key)
+            if work is not None:
+                self._crossref[key] = work
+        return work
+
+    def edition(self, isbn: str) -> Optional[Dict[str, Any]]:
+        # The OpenLibrary edition for isbn from the local index; never fetches
+        return self._index.edition(isbn) if self._index is not None else None
+
+    def fetch_crossref(self, doi: str):
+        # Generator (see _verify_steps); returns the work, or None if the DOI did not resolve
+        key = doi.lower()
+        if key in self._crossref_errors:
+            raise self._crossref_errors[key]
+        work = self.crossref_work(doi)
+        if work is not None or key in self._crossref:
+            return work
+        try:
+            r = yield crossref_work_url(doi)
+            work = r.json().get('message', {}) if r.status_code == 200 else None
+        except FetchError as e:
+            self._crossref_errors[key] = e
+            raise
+        self._crossref[key] = work
+        return work
+
+# --- Web Page Checks ---
+# Statuses some servers send for HEAD even though GET works
+HEAD_REJECTED_STATUSES = (403, 405, 501)
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]*>", re.I | re.S)
+_SPACE_RE = re.compile(r"\s+")
+
+_max_page_bytes = DEFAULT_MAX_PAGE_BYTES
+
+def set_max_page_bytes(limit: int) -> None:
+    # Cap on how much of a cited web page is downloaded
+    global _max_page_bytes
+    _max_page_bytes = limit
+
+def _is_text_content(content_type: str) -> bool:
+    media = content_type.split(';')[0].strip().lower()
+    return media.startswith('text/') or media in ('application/xhtml+xml', 'application/xml')
+
+def _normalize_page_text(text: str) -> str:
+    return _SPACE_RE.sub(' ', text).strip().lower()
+
+def page_text(markup: str) -> str:
+    # Visible text of an HTML page: BeautifulSoup when installed, otherwise a
+    # fast tag strip that is good enough for a keyword search
+    bs4 = _optional('bs4')
+    if bs4 is not None:
+        soup = bs4.BeautifulSoup(markup, 'html.parser')
+        for tag in soup(['script', 'style']):
+            tag.decompose()
+        return soup.get_text(' ')
+    return html.unescape(_TAG_RE.sub(' ', markup))
+
+def page_mentions(markup: str, phrase: str) -> bool:
+    phrase = _normalize_page_text(phrase)
+    if not phrase:
+        return False
+    # Cheap check on the raw markup before paying for text extraction
+    if phrase in _normalize_page_text(markup):
+        return True
+    return phrase in _normalize_page_text(page_text(markup))
+
+# --- Candidate Matching ---
+# Search results are ranked by how well their title, authors and year agree
+# with the reference. The reference side is tokenized once (MatchProfile) and
+# each candidate costs a few set operations, so large result pages are cheap.
+_WORD_RE = re.compile(r"\w+")
+_TITLE_STOPWORDS = frozenset(['a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'of', 'on', 'or', 'the', 'to', 'with'])
+_AUTHOR_NOISE = frozenset(['and', 'et', 'al', 'eds', 'ed'])
+# Weights of the title, author and year components of a score
+TITLE_WEIGHT, AUTHOR_WEIGHT, YEAR_WEIGHT = 0.7, 0.2, 0.1
+# Scores at or above this count as the same work. A candidate with the exact
+# title and year but none of the first author's names scores 0.8, so this
+# sits above that: a "Yes" needs the author to match too, as it always did.
+MATCH_THRESHOLD = 0.85
+# Results requested per search; one larger page beats a second round trip
+OPENALEX_SEARCH_LIMIT = 50
+OPENLIBRARY_SEARCH_LIMIT = 50
+
+def title_tokens(title: Optional[str]) -> frozenset:
+    words = _WORD_RE.findall(canonical_text(title or '').casefold())
+    return frozenset(w for w in words if w not in _TITLE_STOPWORDS) or frozenset(words)
+
+def author_tokens(authors: Union[str, Iterable[str], None]) -> frozenset:
+    # Surnames and given names; single letters (initials) are too ambiguous
+    if authors is None:
+        return frozenset()
+    if not isinstance(authors, str):
+        authors = ' '.join(a for a in authors if a)
+    words = _WORD_RE.findall(canonical_text(authors).casefold())
+    return frozenset(w for w in words if len(w) > 1 and w not in _AUTHOR_NOISE and not w.isdigit())
+
+def _year(value: Any) -> Optional[int]:
+    m = re.search(r"\d{4}", str(value)) if value is not None else None
+    return int(m.group()) if m else None
+
+class MatchProfile:
+    # The reference side of a comparison, normalized once
+    __slots__ = ('title', 'authors', 'year')
+
+    def __init__(self, parsed: Dict[str, Any]):
+        self.title = title_tokens(parsed.get('title'))
+        # The first author's surname is the part before the first comma
+        self.authors = author_tokens((parsed.get('author') or '').split(',')[0])
+        self.year = _year(parsed.get('year'))
+
+    def score(self, title: Optional[str], authors: Iterable[str] = (), years: Iterable[Any] = ()) -> float:
+        # 0..1 agreement with one candidate. The title counts as the better of
+        # token-set Jaccard and (slightly discounted) containment of the
+        # reference title, so a reference that drops a subtitle still matches.
+        cand = title_tokens(title)
+        if not self.title or not cand:
+            return 0.0
+        common = len(self.title & cand)
+        title_score = max(common / len(self.title | cand), 0.9 * common / len(self.title) if len(self.title) >= 3 else 0.0)
+        author_score = 1.0 if not self.authors else len(self.authors & author_tokens(authors)) / len(self.authors)
+        year_score = 1.0
+        if self.year is not None:
+            cand_years = [y for y in (_year(v) for v in years) if y is not None]
+            if cand_years:
+                year_score = 1.0 if self.year in cand_years else 0.5 if min(abs(self.year - y) for y in cand_years) == 1 else 0.0
+        return round(TITLE_WEIGHT * title_score + AUTHOR_WEIGHT * author_score + YEAR_WEIGHT * year_score, 4)
+
+def rank_openalex(profile: MatchProfile, results: List[Dict[str, Any]]) -> List[Tuple[float, Dict[str, Any]]]:
+    scored = [(profile.score(result.get('title'),
+                             [(auth.get('author') or {}).get('display_name', '') for auth in result.get('authorships') or []],
+                             [result.get('publication_year')]), result)
+              for result in results]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+def rank_openlibrary(profile: MatchProfile, docs: List[Dict[str, Any]]) -> List[Tuple[float, Dict[str, Any]]]:
+    scored = [(profile.score(doc.get('title'), doc.get('author_name') or [],
+                             doc.get('publish_year') or [doc.get('first_publish_year')]), doc)
+              for doc in docs]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
 
 # --- Source Verifier ---
-def verify_source(parsed: Dict[str, Any], debug: bool = False) -> Dict[str, Any]:
-    checks = []
-    details = []
-    clickable_link = "No direct link found."
+def _crossref_doi_steps(parsed: ParsedReference, debug: bool, record: MetadataRecord):
+    # Resolves the reference's DOI through CrossRef (or the batch prefetch or
+    # local index)
+    checks: List[str] = []
+    details: List[str] = []
+    clickable_link = None
+    match_score = None
     verified = "No"
-    t = parsed.get('type')# Journal Article with DOI
-    if t == 'journal' and parsed.get('doi'):
-        checks.append("Identified reference type: Journal Article.")
-        checks.append(f"Extracted DOI: {parsed['doi']}.")
-        checks.append("Resolved DOI using CrossRef API.")
-        url = f"https://api.crossref.org/works/{parsed['doi']}"
-        try:
-            r = requests.get(url, headers={"User-Agent": "CTR-Validator/1.0"}, timeout=10)
+    checks.append("Identified reference type: Journal Article.")
+    checks.append(f"Extracted DOI: {parsed['doi']}.")
+    checks.append("Resolved DOI using CrossRef API.")
+    try:
+        data = yield from record.fetch_crossref(parsed['doi'])
+        if data is not None:
+            title = data.get('title', [''])[0]
+            authors = ', '.join([f"{a.get('family', '')}, {a.get('given', '')[0]}." for a in data.get('author', []) if 'family' in a and 'given' in a])
+            details.append(f"DOI resolved successfully to '{title}' by {authors}.")
+            journal = data.get('container-title', [''])[0]
+            volume = data.get('volume', '')
+            issue = data.get('issue', '')
+            pages = data.get('page', '')
+            details.append(f"Journal: {journal}, Volume {volume}, Issue {issue}, Pages {pages}.")
+            verified = "Yes"
+            clickable_link = f"https://doi.org/{parsed['doi']}"
+        else:
+            details.append("DOI did not resolve to a valid document.")
+    except FetchError as e:
+        details.append(f"Error resolving DOI: {str(e)}")
+    return VerificationResult(checks, details, clickable_link, verified, match_score)
+
+def _openlibrary_isbn_steps(parsed: ParsedReference, debug: bool, record: MetadataRecord):
+    # Looks the ISBN up in OpenLibrary, following its redirect to the edition
+    checks: List[str] = []
+    details: List[str] = []
+    clickable_link = None
+    match_score = None
+    verified = "No"
+    isbn = parsed['isbn']
+    checks.append(f"Extracted ISBN: {isbn}.")
+    checks.append("Verifying ISBN using OpenLibrary API.")
+    # Try OpenLibrary ISBN API first
+    url = api_url('openlibrary', f"/isbn/{isbn}.json")
+    if debug:
+        details.append(f"DEBUG: OpenLibrary ISBN API URL: {url}")
+    try:
+        book_data = record.edition(isbn)
+        if book_data is not None:
+            if debug:
+                details.append("DEBUG: ISBN found in the local metadata index")
+        else:
+            r = yield url
+            if debug:
+                details.append(f"DEBUG: OpenLibrary API response status: {r.status_code}")
+                # dump out headers for debugging
+                details.append(f"DEBUG: OpenLibrary API response headers: {r.headers}")
+                # dump out the first 100 characters of the response body
+                details.append(f"DEBUG: OpenLibrary API response body (first 100 chars): {r.text[:100]}")
+
+            # handle a redirect 
+            if r.status_code == 301 or r.status_code == 302:
+                redirect_url = r.headers.get('Location')
+                if redirect_url:
+                    details.append(f"DEBUG: Redirected to {redirect_url}")
+                    r = yield redirect_url
+                    if debug:
+                        details.append(f"DEBUG: Redirected API response status: {r.status_code}")
+
             if r.status_code == 200:
-                data = r.json().get('message', {})
-                title = data.get('title', [''])[0]
-                authors = ', '.join([f"{a.get('family', '')}, {a.get('given', '')[0]}." for a in data.get('author', []) if 'family' in a and 'given' in a])
-                details.append(f"DOI resolved successfully to '{title}' by {authors}.")
-                journal = data.get('container-title', [''])[0]
-                volume = data.get('volume', '')
-                issue = data.get('issue', '')
-                pages = data.get('page', '')
-                details.append(f"Journal: {journal}, Volume {volume}, Issue {issue}, Pages {pages}.")
-                verified = "Yes"
-                clickable_link = f"https://doi.org/{parsed['doi']}"
+                #isbn_key = f"ISBN:{isbn}"
+                #if isbn_key in data:
+                book_data = r.json()
             else:
-                details.append("DOI did not resolve to a valid document.")
-        except requests.exceptions.RequestException as e:
-            details.append(f"Error resolving DOI: {str(e)}")
+                details.append("Error accessing OpenLibrary ISBN database.")
+                if debug:
+                    details.append(f"DEBUG: OpenLibrary API returned status {r.status_code}")
+
+        if book_data is not None:
+            title = book_data.get('title', 'Unknown title')
+            authors = book_data.get('authors', [])
+            #author_names = [author.get('name', 'Unknown') for author in authors]
+            publishers = book_data.get('publishers', [])
+            #publisher_names = [pub.get('name', 'Unknown') for pub in publishers]
+            pub_date = book_data.get('publish_date', 'Unknown')
 
-    # Book verification
-    elif t == 'book':
-        checks.append("Identified reference type: Book.")
-        isbn = parsed.get('isbn')
-        if isbn:
-            checks.append(f"Extracted ISBN: {isbn}.")
-            checks.append("Verifying ISBN using OpenLibrary API.")
-            # Try OpenLibrary ISBN API first
-            url = f"https://openlibrary.org/isbn/{isbn}.json"
             if debug:
-                details.append(f"DEBUG: OpenLibrary ISBN API URL: {url}")
-            try:
-                r = requests.get(url, headers={"User-Agent": "CTR-Validator/1.0"}, timeout=10)
+                details.append(f"DEBUG: Found book data: Title='{title}', Authors={authors}, Publishers={publishers}, Date={pub_date}")
+
+            details.append(f"ISBN verified: '{title}' by {authors}.")
+            details.append(f"Publisher: {publishers}, Published: {pub_date}.")
+            verified = "Yes"
+            clickable_link = f"https://openlibrary.org/isbn/{isbn}"
+            #else:
+            #    details.append("ISBN not found in OpenLibrary database.")
+            #    if debug:
+            #        details.append(f"DEBUG: No data found for ISBN key '{isbn_key}' in response")
+    except FetchError as e:
+        details.append(f"Error verifying ISBN: {str(e)}")
+        if debug:
+            details.append(f"DEBUG: ISBN verification exception: {e.kind}: {str(e)}")
+    return VerificationResult(checks, details, clickable_link, verified, match_score)
+
+def _openlibrary_search_steps(parsed: ParsedReference, debug: bool, record: MetadataRecord):
+    # Full-text OpenLibrary search, ranked with rank_openlibrary()
+    checks: List[str] = []
+    details: List[str] = []
+    clickable_link = None
+    match_score = None
+    verified = "No"
+    checks.append("Performing general book search.")
+    query = f"{parsed.get('title', '')} {parsed.get('author', '')} {parsed.get('publisher', '')}"
+    url = api_url('openlibrary', f"/search.json?q={quote(query)}&limit={OPENLIBRARY_SEARCH_LIMIT}"
+                                 "&fields=key,title,author_name,first_publish_year,publish_year,publisher,isbn")
+    if debug:
+        details.append(f"DEBUG: Book search query: '{query}'")
+        details.append(f"DEBUG: OpenLibrary search URL: {url}")
+    try:
+        r = yield url
+        if debug:
+            details.append(f"DEBUG: Search API response status: {r.status_code}")
+        if r.status_code == 200:
+            data = r.json()
+            num_found = data.get('numFound', 0)
+            if debug:
+                details.append(f"DEBUG: Total search results: {num_found}")
+
+            if num_found > 0:
+                docs = data.get('docs', [])
                 if debug:
-                    details.append(f"DEBUG: OpenLibrary API response status: {r.status_code}")
-                    # dump out headers for debugging
-                    details.append(f"DEBUG: OpenLibrary API response headers: {r.headers}")
-                    # dump out the first 100 characters of the response body
-                    details.append(f"DEBUG: OpenLibrary API response body (first 100 chars): {r.text[:100]}")
-
-                # handle a redirect 
-                if r.status_code == 301 or r.status_code == 302:
-                    redirect_url = r.headers.get('Location')
-                    if redirect_url:
-                        details.append(f"DEBUG: Redirected to {redirect_url}")
-                        r = requests.get(redirect_url, headers={"User-Agent": "CTR-Validator/1.0"}, timeout=10)
-                        if debug:
-                            details.append(f"DEBUG: Redirected API response status: {r.status_code}")
-
-                if r.status_code == 200:
-                    data = r.json()
-                    #isbn_key = f"ISBN:{isbn}"
-                    #if isbn_key in data:
-                    book_data = data
-                    title = book_data.get('title', 'Unknown title')
-                    authors = book_data.get('authors', [])
-                    #author_names = [author.get('name', 'Unknown') for author in authors]
-                    publishers = book_data.get('publishers', [])
-                    #publisher_names = [pub.get('name', 'Unknown') for pub in publishers]
-                    pub_date = book_data.get('publish_date', 'Unknown')
-                    
-                    if debug:
-                        details.append(f"DEBUG: Found book data: Title='{title}', Authors={authors}, Publishers={publishers}, Date={pub_date}")
-                    
-                    details.append(f"ISBN verified: '{title}' by {authors}.")
-                    details.append(f"Publisher: {publishers}, Published: {pub_date}.")
+                    details.append(f"DEBUG: Number of results returned: {len(docs)}")
+
+                    # Show details of first few results
+                    for i, doc in enumerate(docs[:3]):
+                        title = doc.get('title', 'No title')
+                        authors = doc.get('author_name', ['Unknown author'])
+                        first_pub_year = doc.get('first_publish_year', 'Unknown')
+                        publishers = doc.get('publisher', ['Unknown publisher'])
+                        isbn_list = doc.get('isbn', [])
+
+                        details.append(f"DEBUG: Book result {i+1}: Title='{title}'")
+                        details.append(f"DEBUG: Book result {i+1}: Authors={authors[:2]}")
+                        details.append(f"DEBUG: Book result {i+1}: First published={first_pub_year}")
+                        details.append(f"DEBUG: Book result {i+1}: Publishers={publishers[:2]}")
+                        details.append(f"DEBUG: Book result {i+1}: ISBNs={isbn_list[:2] if isbn_list else 'None'}")
+
+                # rank every returned doc against the parsed reference
+                ranked = rank_openlibrary(MatchProfile(parsed), docs)
+                if ranked:
+                    match_score = ranked[0][0]
+                if ranked and match_score >= MATCH_THRESHOLD:
+                    details.append(f"Verified book match found (score {match_score:.2f}): Title='{ranked[0][1].get('title', '')}'.")
                     verified = "Yes"
-                    clickable_link = f"https://openlibrary.org/isbn/{isbn}"
-                    #else:
-                    #    details.append("ISBN not found in OpenLibrary database.")
-                    #    if debug:
-                    #        details.append(f"DEBUG: No data found for ISBN key '{isbn_key}' in response")
-                else:
-                    details.append("Error accessing OpenLibrary ISBN database.")
-                    if debug:
-                        details.append(f"DEBUG: OpenLibrary API returned status {r.status_code}")
-            except requests.exceptions.RequestException as e:
-                details.append(f"Error verifying ISBN: {str(e)}")
-                if debug:
-                    details.append(f"DEBUG: ISBN verification exception: {type(e).__name__}: {str(e)}")
-        
-        # Fallback search for books without ISBN or failed ISBN lookup
-        if verified == "No":
-            checks.append("Performing general book search.")
-            query = f"{parsed.get('title', '')} {parsed.get('author', '')} {parsed.get('publisher', '')}"
-            url = f"https://openlibrary.org/search.json?q={requests.utils.quote(query)}&limit=5"
+
+                if verified == "No":
+                    details.append("General book search found potential matches, but no definitive match.")
+                    if ranked:
+                        first_doc = ranked[0][1]
+                        title = first_doc.get('title', 'No title')
+                        authors = first_doc.get('author_name', ['Unknown author'])
+                        first_pub_year = first_doc.get('first_publish_year', 'Unknown')
+                        publishers = first_doc.get('publisher', ['Unknown publisher'])
+                        isbn_list = first_doc.get('isbn', [])
+
+                        details.append(f"Best match (score {match_score:.2f}): Title='{title}', Authors={authors[:2]}, "
+                                       f"Year={first_pub_year}, Publishers={publishers[:2]}, "
+                                       f"ISBNs={isbn_list[:2] if isbn_list else 'None'}.")
+                        verified = "Partial"
+            else:
+                details.append("General book search did not find any matches.")
+        else:
             if debug:
-                details.append(f"DEBUG: Book search query: '{query}'")
-                details.append(f"DEBUG: OpenLibrary search URL: {url}")
-            try:
-                r = requests.get(url, headers={"User-Agent": "CTR-Validator/1.0"}, timeout=10)
-                if debug:
-                    details.append(f"DEBUG: Search API response status: {r.status_code}")
-                if r.status_code == 200:
-                    data = r.json()
-                    num_found = data.get('numFound', 0)
-                    if debug:
-                        details.append(f"DEBUG: Total search results: {num_found}")
-                    
-                    if num_found > 0:
-                        docs = data.get('docs', [])
-                        if debug:
-                            details.append(f"DEBUG: Number of results returned: {len(docs)}")
-                            
-                            # Show details of first few results
-                            for i, doc in enumerate(docs[:3]):
-                                title = doc.get('title', 'No title')
-                                authors = doc.get('author_name', ['Unknown author'])
-                                first_pub_year = doc.get('first_publish_year', 'Unknown')
-                                publishers = doc.get('publisher', ['Unknown publisher'])
-                                isbn_list = doc.get('isbn', [])
-                                
-                                details.append(f"DEBUG: Book result {i+1}: Title='{title}'")
-                                details.append(f"DEBUG: Book result {i+1}: Authors={authors[:2]}")
-                                details.append(f"DEBUG: Book result {i+1}: First published={first_pub_year}")
-                                details.append(f"DEBUG: Book result {i+1}: Publishers={publishers[:2]}")
-                                details.append(f"DEBUG: Book result {i+1}: ISBNs={isbn_list[:2] if isbn_list else 'None'}")
-                        
-                        # check if any result matches the parsed reference
-                        for i, doc in enumerate(docs):
-                            if (doc.get('title', '').lower() == parsed.get('title', '').lower() and
-                                any(author.lower() in parsed.get('author', '').lower() for author in doc.get('author_name', []))):
-                                details.append(f"DEBUG: Found matching book for reference {i+1}: {doc.get('title', '')}")
-                                verified = "Yes"
-                                break
-                        
-                        if verified == "No":
-                            details.append("General book search found potential matches, but no definitive match.")
-                            if docs:
-                                first_doc = docs[0]
-                                title = first_doc.get('title', 'No title')
-                                authors = first_doc.get('author_name', ['Unknown author'])
-                                first_pub_year = first_doc.get('first_publish_year', 'Unknown')
-                                publishers = first_doc.get('publisher', ['Unknown publisher'])
-                                isbn_list = first_doc.get('isbn', [])
-                                
-                                details.append(f"First match: Title='{title}', Authors={authors[:2]}, Year={first_pub_year}, Publishers={publishers[:2]}, ISBNs={isbn_list[:2] if isbn_list else 'None'}.")
-                                verified = "Partial"
-                    else:
-                        details.append("General book search did not find any matches.")
+                details.append(f"DEBUG: Book search API failed with status {r.status_code}")
+            details.append("Error performing book search.")
+    except FetchError as e:
+        details.append(f"Error performing book search: {str(e)}")
+        if debug:
+            details.append(f"DEBUG: Book search exception: {e.kind}: {str(e)}")
+    return VerificationResult(checks, details, clickable_link, verified, match_score)
+
+def _website_steps(parsed: ParsedReference, debug: bool, record: MetadataRecord):
+    # A HEAD probe first, then a bounded read that stops as soon as the title
+    # shows up on the page
+    checks: List[str] = []
+    details: List[str] = []
+    clickable_link = None
+    match_score = None
+    verified = "No"
+    checks.append("Checked URL accessibility.")
+    url = parsed['url']
+    title = parsed.get('title', '')
+    try:
+        r = yield FetchRequest(url, method='HEAD')
+        if debug:
+            details.append(f"DEBUG: HEAD {url} returned status {r.status_code}")
+        content_type = r.headers.get('Content-Type', '') if r.status_code < 400 else ''
+        if r.status_code < 400 and content_type and not _is_text_content(content_type):
+            details.append(f"URL is accessible (HTTP {r.status_code}).")
+            details.append(f"Page content is {content_type.split(';')[0]}, keywords not checked.")
+            verified = "Partial"
+            clickable_link = url
+        elif r.status_code >= 400 and r.status_code not in HEAD_REJECTED_STATUSES:
+            details.append(f"URL is not accessible (HTTP {r.status_code}).")
+        else:
+            # HEAD looked fine or the server refuses HEAD; read the page itself
+            checks.append("Verified presence of keywords on the page.")
+            page = yield FetchRequest(url, max_bytes=_max_page_bytes, stop_at=[_normalize_page_text(title)])
+            if debug:
+                details.append(f"DEBUG: GET {url} returned status {page.status_code}, read {len(page.text)} characters")
+            if page.status_code >= 400:
+                details.append(f"URL is not accessible (HTTP {page.status_code}).")
+            else:
+                details.append(f"URL is accessible (HTTP {page.status_code} OK)." if page.status_code == 200
+                               else f"URL is accessible (HTTP {page.status_code}).")
+                clickable_link = url
+                if page_mentions(page.text, title):
+                    details.append(f"Keywords '{title}' found on the webpage.")
+                    verified = "Yes"
                 else:
-                    if debug:
-                        details.append(f"DEBUG: Book search API failed with status {r.status_code}")
-                    details.append("Error performing book search.")
-            except requests.exceptions.RequestException as e:
-                details.append(f"Error performing book search: {str(e)}")
-                if debug:
-                    details.append(f"DEBUG: Book search exception: {type(e).__name__}: {str(e)}")
-            
-    # Fallback for failed DOI resolution
-    if verified == "No" and t == 'journal':
-        checks.append("Performed general academic search for article.")
-        query = f"{parsed.get('title', '')}"# {parsed.get('author', '')} {parsed.get('journal', '')}"
-        url = f"https://api.openalex.org/works?search={requests.utils.quote(query)}"
+                    details.append(f"Keywords '{title}' not found on the webpage.")
+                    verified = "Partial"
+    except FetchError as e:
+        details.append(f"URL is not accessible (Connection Error: {str(e)}).")
         if debug:
-            details.append(f"DEBUG: Fallback search query: '{query}'")
-            details.append(f"DEBUG: OpenAlex API URL: {url}")
-        try:
-            r = requests.get(url, headers={"User-Agent": "CTR-Validator/1.0"}, timeout=10)
+            details.append(f"DEBUG: Website check exception: {e.kind}: {str(e)}")
+    return VerificationResult(checks, details, clickable_link, verified, match_score)
+
+def _openalex_search_steps(parsed: ParsedReference, debug: bool, record: MetadataRecord):
+    # OpenAlex search ranked with rank_openalex(); the matched work also
+    # supplies the abstract when CrossRef has none
+    checks: List[str] = []
+    details: List[str] = []
+    clickable_link = None
+    match_score = None
+    verified = "No"
+    # A DOI found by the search; parsed may be shared by duplicate lines, so it is never written to
+    found_doi = parsed.get('doi')
+    checks.append("Performed general academic search for article.")
+    query = f"{parsed.get('title', '')}"# {parsed.get('author', '')} {parsed.get('journal', '')}"
+    url = api_url('openalex', f"/works?search={quote(query)}&per-page={OPENALEX_SEARCH_LIMIT}"
+                              "&select=doi,title,authorships,primary_location,publication_year,abstract_inverted_index")
+    if debug:
+        details.append(f"DEBUG: Fallback search query: '{query}'")
+        details.append(f"DEBUG: OpenAlex API URL: {url}")
+    try:
+        r = yield url
+        if debug:
+            details.append(f"DEBUG: API response status: {r.status_code}")
+        if r.status_code == 200:
+            json_data = r.json()
+            meta = json_data.get('meta', {})
+            count = meta.get('count', 0)
             if debug:
-                details.append(f"DEBUG: API response status: {r.status_code}")
-            if r.status_code == 200:
-                json_data = r.json()
-                meta = json_data.get('meta', {})
-                count = meta.get('count', 0)
+                details.append(f"DEBUG: Total search results count: {count}")
+
+            if count > 0:
+                results = json_data.get('results', [])
                 if debug:
-                    details.append(f"DEBUG: Total search results count: {count}")
-                
-                if count > 0:
-                    results = json_data.get('results', [])
-                    if debug:
-                        details.append(f"DEBUG: Number of results returned: {len(results)}")
-                        
-                        # Show details of first few results
-                        for i, result in enumerate(results[:3]):  # Show first 3 results
-                            title = result.get('title', 'No title')
-                            authors = result.get('authorships', [])
-                            author_names = [auth.get('author', {}).get('display_name', 'Unknown') for auth in authors[:2]]  # First 2 authors
-                            journal_name = ''
-                            if result.get('primary_location'):
-                                journal_name = result.get('primary_location', {}).get('source', {}).get('display_name', 'Unknown journal')
-                            pub_year = result.get('publication_year', 'Unknown')
-                            doi = result.get('doi', 'No DOI')
-                            
-                            details.append(f"DEBUG: Result {i+1}: Title='{title}'")
-                            details.append(f"DEBUG: Result {i+1}: Authors={', '.join(author_names)}")
-                            details.append(f"DEBUG: Result {i+1}: Journal='{journal_name}'")
-                            details.append(f"DEBUG: Result {i+1}: Year={pub_year}")
-                            details.append(f"DEBUG: Result {i+1}: DOI={doi}")
-                    
-                    for i, result in enumerate(results):
-                        if parsed.get('title', '').lower() in result.get('title', '').lower() and parsed.get('author', '').split(',')[0] in result.get('authorships', [{}])[0].get('author', {}).get('display_name', '') and str(parsed.get('year', '')) == str(result.get('publication_year', '')):
-                            verified = "Yes"
-                            clickable_link = result.get('doi', 'No DOI')
-                            details.append(f"Verified match found: Title='{result.get('title', '')}', DOI='{clickable_link}'.")
-                            if clickable_link.startswith("http"):
-                                parsed['doi'] = clickable_link.split("doi.org/")[-1]
-                            break
-
-                    if verified == "No":
-                        details.append("General academic search found potential matches, but no definitive match.")
-                        if count > 0:
-                            first_result = results[0]
-                            title = first_result.get('title', 'No title')
-                            authors = first_result.get('authorships', [])
-                            author_names = ', '.join([auth.get('author', {}).get('display_name', 'Unknown') for auth in authors])
-                            journal_name = first_result.get('primary_location', {}).get('source', {}).get('display_name', 'Unknown journal')
-                            pub_year = first_result.get('publication_year', 'Unknown')
-                            doi = first_result.get('doi', 'No DOI')
-                            details.append(f"First match: Title='{title}', Authors='{author_names}', Year={pub_year}, Journal='{journal_name}', DOI='{doi}'.")
-                        verified = "Partial"
+                    details.append(f"DEBUG: Number of results returned: {len(results)}")
+
+                    # Show details of first few results
+                    for i, result in enumerate(results[:3]):  # Show first 3 results
+                        title = result.get('title', 'No title')
+                        authors = result.get('authorships', [])
+                        author_names = [auth.get('author', {}).get('display_name', 'Unknown') for auth in authors[:2]]  # First 2 authors
+                        journal_name = ''
+                        if result.get('primary_location'):
+                            journal_name = (result['primary_location'].get('source') or {}).get('display_name', 'Unknown journal')
+                        pub_year = result.get('publication_year', 'Unknown')
+                        doi = result.get('doi', 'No DOI')
+
+                        details.append(f"DEBUG: Result {i+1}: Title='{title}'")
+                        details.append(f"DEBUG: Result {i+1}: Authors={', '.join(author_names)}")
+                        details.append(f"DEBUG: Result {i+1}: Journal='{journal_name}'")
+                        details.append(f"DEBUG: Result {i+1}: Year={pub_year}")
+                        details.append(f"DEBUG: Result {i+1}: DOI={doi}")
+
+                ranked = rank_openalex(MatchProfile(parsed), results)
+                if ranked:
+                    match_score = ranked[0][0]
+                if ranked and match_score >= MATCH_THRESHOLD:
+                    result = ranked[0][1]
+                    verified = "Yes"
+                    record.openalex = result
+                    clickable_link = result.get('doi') or 'No DOI'
+                    details.append(f"Verified match found (score {match_score:.2f}): Title='{result.get('title', '')}', DOI='{clickable_link}'.")
+                    if clickable_link.startswith("http"):
+                        found_doi = clickable_link.split("doi.org/")[-1]
+
+                if verified == "No":
+                    details.append("General academic search found potential matches, but no definitive match.")
+                    if ranked:
+                        first_result = ranked[0][1]
+                        title = first_result.get('title', 'No title')
+                        authors = first_result.get('authorships', [])
+                        author_names = ', '.join([auth.get('author', {}).get('display_name', 'Unknown') for auth in authors])
+                        journal_name = ((first_result.get('primary_location') or {}).get('source') or {}).get('display_name', 'Unknown journal')
+                        pub_year = first_result.get('publication_year', 'Unknown')
+                        doi = first_result.get('doi', 'No DOI')
+                        details.append(f"Best match (score {match_score:.2f}): Title='{title}', Authors='{author_names}', Year={pub_year}, Journal='{journal_name}', DOI='{doi}'.")
+                    verified = "Partial"
+            else:
+                details.append("General academic search did not find a match.") #else:
+            if debug:
+                details.append(f"DEBUG: API request failed with status {r.status_code}")
+            # Abstract from the record: CrossRef work already in hand, then the
+            # matched OpenAlex work, and only then a CrossRef lookup not yet made
+            if found_doi:
+                work = record.crossref_work(found_doi)
+                abstract = work.get('abstract') if work else None
+                if not abstract and record.openalex is not None:
+                    abstract = rebuild_openalex_abstract(record.openalex.get('abstract_inverted_index'))
+                if abstract:
+                    details.append(f"Abstract: {abstract}")
                 else:
-                    details.append("General academic search did not find a match.") #else:
-                if debug:
-                    details.append(f"DEBUG: API request failed with status {r.status_code}")
-                # Fetch abstract if DOI is available
-                if parsed.get('doi'):
-                    abstract_url = f"https://api.crossref.org/works/{parsed['doi']}"
                     try:
-                        abstract_response = requests.get(abstract_url, headers={"User-Agent": "CTR-Validator/1.0"}, timeout=10)
-                        if abstract_response.status_code == 200:
-                            abstract_data = abstract_response.json().get('message', {})
-                            abstract = abstract_data.get('abstract', None)
-                            if abstract:
-                                details.append(f"Abstract: {abstract}")
-                            else:
-                                details.append("Abstract not available for this DOI.")
+                        work = yield from record.fetch_crossref(found_doi)
+                        if work is not None:
+                            details.append("Abstract not available for this DOI.")
                         else:
                             details.append("Failed to fetch abstract from DOI.")
-                    except requests.exceptions.RequestException as e:
+                    except FetchError as e:
                         details.append(f"Error fetching abstract: {str(e)}")
-        except requests.exceptions.RequestException as e:
-            details.append(f"Error performing academic search: {str(e)}")
-            if debug:
-                details.append(f"DEBUG: Exception details: {type(e).__name__}: {str(e)}")
+    except FetchError as e:
+        details.append(f"Error performing academic search: {str(e)}")
+        if debug:
+            details.append(f"DEBUG: Exception details: {e.kind}: {str(e)}")
+    return VerificationResult(checks, details, clickable_link, verified, match_score)
+
+# --- Verifier Dispatch ---
+# Each provider is a generator like _verify_steps that checks one reference
+# against one source and returns a VerificationResult for just its own
+# checks. The dispatcher picks the providers registered for the reference
+# type in (priority, cost) order and either runs them one after another,
+# stopping at the first "Yes", or races them all and keeps the first "Yes".
+DISPATCH_MODES = ('sequential', 'race')
+# A provider that ran out of time says less than a partial match but more
+# than a clean "No"
+_VERDICT_RANK = {'No': 0, TIMED_OUT: 1, 'Partial': 2, 'Yes': 3}
+
+class VerifierProvider:
+    # steps(parsed, debug, record) is the provider's generator; applies(parsed)
+    # narrows it further than its types (e.g. only references with an ISBN).
+    # Lower priority runs first; cost (roughly round trips) breaks ties.
+    # budget overrides the default per-provider time budget, in seconds.
+    __slots__ = ('name', 'types', 'steps', 'priority', 'cost', 'applies', 'budget')
 
+    def __init__(self, name: str, types: Iterable[str], steps, priority: int = 100, cost: int = 1, applies=None,
+                 budget: Optional[float] = None):
+        self.name = name
+        self.types = frozenset(types)
+        self.steps = steps
+        self.priority = priority
+        self.cost = cost
+        self.applies = applies
+        self.budget = budget
+
+    def __repr__(self) -> str:
+        return f"VerifierProvider({self.name!r}, priority={self.priority}, cost={self.cost})"
+
+_PROVIDERS: Dict[str, VerifierProvider] = {}
+
+def register_provider(provider: VerifierProvider) -> None:
+    # Adds a provider, replacing any registered under the same name
+    _PROVIDERS[provider.name] = provider
+
+def unregister_provider(name: str) -> None:
+    _PROVIDERS.pop(name, None)
+
+def providers_for(parsed: ParsedReference) -> List[VerifierProvider]:
+    t = parsed.get('type')
+    chosen = [p for p in _PROVIDERS.values() if t in p.types and (p.applies is None or p.applies(parsed))]
+    chosen.sort(key=lambda p: (p.priority, p.cost))
+    return chosen
 
+register_provider(VerifierProvider('crossref_doi', ['journal'], _crossref_doi_steps, priority=10, cost=1,
+                                   applies=lambda parsed: bool(parsed.get('doi'))))
+register_provider(VerifierProvider('openalex_search', ['journal'], _openalex_search_steps, priority=20, cost=2))
+register_provider(VerifierProvider('openlibrary_isbn', ['book'], _openlibrary_isbn_steps, priority=10, cost=1,
+                                   applies=lambda parsed: bool(parsed.get('isbn'))))
+register_provider(VerifierProvider('openlibrary_search', ['book'], _openlibrary_search_steps, priority=20, cost=1))
+register_provider(VerifierProvider('website', ['website'], _website_steps, priority=10, cost=2))
 
-    # Return verification results
-    return {
-        'checks': checks,
-        'details': details,
-        'clickable_link': clickable_link,
-        'verified': verified
-    }
+_dispatch_mode = 'sequential'
+
+def set_dispatch_mode(mode: str) -> None:
+    global _dispatch_mode
+    if mode not in DISPATCH_MODES:
+        raise ValueError(f"unknown dispatch mode '{mode}'")
+    _dispatch_mode = mode
+
+# Checks reported for the reference type itself, ahead of any provider's.
+# Journals announce themselves from crossref_doi, as they always have.
+_TYPE_CHECKS = {
+    'book': "Identified reference type: Book.",
+    'website': "Identified reference type: Website.",
+}
+
+def _race(runs: List[Any]):
+    # Drives several provider generators at once through Parallel yields and
+    # returns their results in the same order; once one returns "Yes" the
+    # rest are abandoned and left as None.
+    results: List[Optional[VerificationResult]] = [None] * len(runs)
+    start = {}
+    for i, run in enumerate(runs):
+        try:
+            start[i] = next(run)
+        except StopIteration as stop:
+            results[i] = stop.value
+    in_flight = set()
+    while (start or in_flight) and not any(r is not None and r['verified'] == 'Yes' for r in results):
+        in_flight.update(start)
+        i, value = yield Parallel(start=start)
+        in_flight.discard(i)
+        start = {}
+        try:
+            start[i] = runs[i].throw(value) if isinstance(value, FetchError) else runs[i].send(value)
+        except StopIteration as stop:
+            results[i] = stop.value
+    if in_flight:
+        for i in in_flight:
+            runs[i].close()
+        yield Parallel(cancel=in_flight)
+    return results
+
+def _budgeted(provider: VerifierProvider, run, reference_deadline: Optional[float]):
+    # Runs one provider with the earlier of the reference deadline and its own
+    # budget stamped on every request; a provider cut short by the deadline
+    # reports TIMED_OUT unless it had already found a match.
+    budget = provider.budget if provider.budget is not None else _provider_budget
+    deadline = reference_deadline
+    if budget is not None:
+        deadline = time.monotonic() + budget if deadline is None else min(deadline, time.monotonic() + budget)
+    if deadline is None:
+        return (yield from run)
+    timed_out = False
+    try:
+        request = next(run)
+        while True:
+            request = _as_request(request)
+            if request.deadline is None or request.deadline > deadline:
+                request = FetchRequest(request.url, request.method, request.max_bytes, request.stop_at,
+                                       request.headers, deadline, request.cache)
+            try:
+                response = yield request
+            except FetchError as e:
+                timed_out = timed_out or e.kind == 'DeadlineExceeded'
+                request = run.throw(e)
+            else:
+                request = run.send(response)
+    except StopIteration as stop:
+        result = stop.value
+    except FetchError as e:
+        # The provider let the deadline error escape rather than report it
+        if e.kind != 'DeadlineExceeded':
+            raise
+        result = VerificationResult([], [], None, TIMED_OUT)
+    finally:
+        run.close()
+    if timed_out and result['verified'] != 'Yes':
+        result['verified'] = TIMED_OUT
+        result['details'].append(f"Source {provider.name} did not answer within the time budget.")
+    return result
+
+def _timed_provider(provider: VerifierProvider, run):
+    # Reports how long a provider ran and its verdict ("cancelled" when a race
+    # abandoned it)
+    started = time.monotonic()
+    try:
+        result = yield from run
+    except GeneratorExit:
+        if _metrics is not None:
+            _metrics.provider(provider.name, time.monotonic() - started, 'cancelled')
+        raise
+    if _metrics is not None:
+        _metrics.provider(provider.name, time.monotonic() - started, result['verified'])
+    return result
+
+def _combine(t: Optional[str], results: List[Optional[VerificationResult]]) -> VerificationResult:
+    # Checks and details in provider order; the verdict, link and score of
+    # the best result (the earliest one on a tie)
+    checks = [_TYPE_CHECKS[t]] if t in _TYPE_CHECKS else []
+    details = []
+    best = None
+    for result in results:
+        if result is None:
+            continue
+        checks.extend(result['checks'])
+        details.extend(result['details'])
+        if best is None or _VERDICT_RANK[result['verified']] > _VERDICT_RANK[best['verified']]:
+            best = result
+    if best is None:
+        return VerificationResult(checks, details, "No direct link found.", "No")
+    finished = [r for r in results if r is not None]
+    clickable_link = best['clickable_link'] or next((r['clickable_link'] for r in finished if r['clickable_link']), None)
+    match_score = best['match_score'] if best['match_score'] is not None else \
+        next((r['match_score'] for r in finished if r['match_score'] is not None), None)
+    return VerificationResult(checks, details, clickable_link or "No direct link found.", best['verified'], match_score)
+
+def _verify_steps(parsed: ParsedReference, debug: bool = False, prefetched: Optional[Dict[str, Dict[str, Any]]] = None,
+                  dispatch: Optional[str] = None):
+    # Generator: yields each URL it needs and is sent back a FetchResponse
+    # (or has a FetchError thrown in); when racing it also yields Parallel.
+    # Drive it with verify_source() or async_verify_source(). prefetched maps
+    # lowercased DOIs to CrossRef work records already resolved by
+    # prefetch_dois().
+    record = MetadataRecord(prefetched)
+    providers = providers_for(parsed)
+    deadline = None if _reference_budget is None else time.monotonic() + _reference_budget
+    timed = _metrics is not None
+
+    def run(provider: VerifierProvider):
+        steps = _budgeted(provider, provider.steps(parsed, debug, record), deadline)
+        return _timed_provider(provider, steps) if timed else steps
+
+    if (dispatch or _dispatch_mode) == 'race' and len(providers) > 1:
+        results = yield from _race([run(p) for p in providers])
+    else:
+        results = []
+        for provider in providers:
+            if deadline is not None and time.monotonic() >= deadline:
+                # Out of time before this provider could start
+                results.append(VerificationResult([], [f"Source {provider.name} skipped: time budget used up."],
+                                                  None, TIMED_OUT))
+                break
+            result = yield from run(provider)
+            results.append(result)
+            if result['verified'] == 'Yes':
+                break
+    return _combine(parsed.get('type'), results)
+
+def verify_source(parsed: ParsedReference, debug: bool = False, prefetched: Optional[Dict[str, Dict[str, Any]]] = None) -> VerificationResult:
+    if _metrics is None:
+        return _drive(_verify_steps(parsed, debug, prefetched), fetch_url)
+    started = time.perf_counter()
+    try:
+        return _drive(_verify_steps(parsed, debug, prefetched), fetch_url)
+    finally:
+        _metrics.stage('verify', time.perf_counter() - started)
+
+async def async_verify_source(parsed: ParsedReference, debug: bool = False, fetcher: Optional[AsyncFetcher] = None,
+                              prefetched: Optional[Dict[str, Dict[str, Any]]] = None) -> VerificationResult:
+    if fetcher is None:
+        async with AsyncFetcher() as own_fetcher:
+            return await async_verify_source(parsed, debug, own_fetcher, prefetched)
+    if _metrics is None:
+        return await _drive_async(_verify_steps(parsed, debug, prefetched), fetcher.fetch)
+    started = time.perf_counter()
+    try:
+        return await _drive_async(_verify_steps(parsed, debug, prefetched), fetcher.fetch)
+    finally:
+        _metrics.stage('verify', time.perf_counter() - started)
+
+# --- Batch DOI Resolution ---
+# CrossRef ORs repeated filters, so /works?filter=doi:a,doi:b returns the same
+# work records as /works/{doi} for a whole chunk of DOIs in one request.
+DOI_BATCH_SIZE = 50
+
+def _prefetch_doi_steps(dois: List[str]):
+    # Generator (see _verify_steps); returns {lowercased DOI: CrossRef work}
+    found: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    cache = _metadata_cache
+    index = _metadata_index
+    for doi in dict.fromkeys(d.lower() for d in dois):
+        if index is not None:
+            work = index.crossref_work(doi)
+            if work is not None:
+                found[doi] = work
+                continue
+        if cache is not None:
+            cached = cache.peek(crossref_work_url(doi))
+            if cached is not None:
+                if cached.status_code == 200:
+                    try:
+                        found[doi] = cached.json().get('message', {})
+                    except FetchError:
+                        pass
+                continue
+        # Commas separate filters, so such DOIs are left to the per-reference lookup
+        if ',' not in doi:
+            pending.append(doi)
+    if len(pending) < 2:
+        return found
+    for start in range(0, len(pending), DOI_BATCH_SIZE):
+        chunk = pending[start:start + DOI_BATCH_SIZE]
+        url = api_url('crossref', "/works?filter=" + quote(','.join(f"doi:{doi}" for doi in chunk), safe=':,/')
+                      + f"&rows={len(chunk)}")
+        try:
+            # Only the per-DOI entries seeded below are ever looked up again
+            r = yield FetchRequest(url, cache=False)
+            if r.status_code != 200:
+                continue
+            items = r.json().get('message', {}).get('items', [])
+        except FetchError:
+            # DOIs in a failed chunk are simply resolved one by one later
+            continue
+        for item in items:
+            doi = str(item.get('DOI', '')).lower()
+            if doi in chunk:
+                found[doi] = item
+                if cache is not None:
+                    cache.put(crossref_work_url(doi), FetchResponse(
+                        200, {'Content-Type': 'application/json'}, json.dumps({'status': 'ok', 'message': item})))
+    return found
+
+def _journal_dois(parsed_refs: List[Dict[str, Any]]) -> List[str]:
+    return [p['doi'] for p in parsed_refs if p.get('type') == 'journal' and p.get('doi')]
+
+def prefetch_dois(parsed_refs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # Resolve every journal DOI in parsed_refs with batched CrossRef queries
+    started = time.perf_counter()
+    found = _drive(_prefetch_doi_steps(_journal_dois(parsed_refs)), fetch_url)
+    if _metrics is not None:
+        _metrics.stage('prefetch', time.perf_counter() - started)
+    return found
+
+async def async_prefetch_dois(parsed_refs: List[Dict[str, Any]], fetcher: AsyncFetcher) -> Dict[str, Dict[str, Any]]:
+    started = time.perf_counter()
+    found = await _drive_async(_prefetch_doi_steps(_journal_dois(parsed_refs)), fetcher.fetch)
+    if _metrics is not None:
+        _metrics.stage('prefetch', time.perf_counter() - started)
+    return found
 
 # --- Output Formatter ---
-def format_reference_output(ref: str, parsed: Dict[str, Any], ctr_result: Dict[str, Any], ver_result: Dict[str, Any], idx: int) -> str:
+def format_reference_output(ref: str, parsed: ParsedReference, ctr_result: FormatResult, ver_result: Optional[VerificationResult], idx: int) -> str:
+    # ver_result is None for a format-only check
     out = [f"--- Reference {idx+1} ---"]
     out.append(f"Original Reference: {ref}")
     out.append(f"CTR Format Valid: {'Yes' if ctr_result['valid'] else 'No'}" + (f" (Reason: {', '.join(ctr_result['reasons'])})" if not ctr_result['valid'] else ""))
+    if ver_result is None:
+        return '\n'.join(out)
     out.append(f"Source Verified: {ver_result['verified']}")
     out.append("Checks Performed:")
     for c in ver_result['checks']:
@@ -378,42 +2710,827 @@ def format_reference_output(ref: str, parsed: Dict[str, Any], ctr_result: Dict[s
     out.append(f"Clickable Link: {ver_result['clickable_link']}")
     return '\n'.join(out)
 
+OUTPUT_FORMATS = ('text', 'ndjson', 'json')
+
+def reference_record(ref: str, parsed: ParsedReference, ctr_result: FormatResult, ver_result: Optional[VerificationResult], idx: int) -> Dict[str, Any]:
+    # Machine-readable counterpart of format_reference_output
+    record = {'index': idx + 1, 'reference': ref, 'parsed': parsed.to_dict(), 'format': ctr_result.to_dict()}
+    if ver_result is not None:
+        record['verification'] = ver_result.to_dict()
+    return record
+
+def to_json(data: Any) -> str:
+    # Compact JSON for records, checkpoints and the service
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
 # --- Summary Generator ---
-def format_summary(total: int, valid_ctr: int, verified: int) -> str:
+# verified is None when sources were not checked (--format-only)
+def summary_record(total: int, valid_ctr: int, verified: Optional[int]) -> Dict[str, Any]:
+    record = {'total': total, 'valid_ctr': valid_ctr}
+    if verified is not None:
+        record['verified'] = verified
+    return record
+
+def format_summary(total: int, valid_ctr: int, verified: Optional[int]) -> str:
+    if verified is None:
+        return f"""
+--- Summary ---
+Total references checked: {total}
+References with valid CTR format: {valid_ctr}
+"""
     return f"""
 --- Summary ---
 Total references checked: {total}
 References with valid CTR format: {valid_ctr}
 References verified correct: {verified}
-"""# --- Main Entrypoint ---
+"""
+
+# --- Reference Deduplication ---
+# Merged bibliographies repeat the same source with cosmetic differences.
+# Each reference gets a key built from the parsed fields verify_source reads,
+# canonicalized, so equivalent copies are verified once and share the result.
+_CANONICAL_CHARS = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'", '`': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u2033': '"',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-', '\u2212': '-',
+    '\u00a0': ' ', '\u2009': ' ', '\u202f': ' ',
+})
+
+def canonical_text(text: str) -> str:
+    # Typographic quotes and dashes to ASCII, whitespace runs to one space
+    return _SPACE_RE.sub(' ', text.translate(_CANONICAL_CHARS)).strip()
+
+def verification_key(parsed: Dict[str, Any]) -> Tuple[str, ...]:
+    # Two references with the same key get the same verification result
+    t = parsed.get('type', 'unknown')
+    if t == 'unknown':
+        return (t,)
+    fields = {name: canonical_text(str(parsed.get(name) or '')) for name in ('title', 'author', 'year', 'publisher', 'url')}
+    return (t,
+            (parsed.get('doi') or '').strip().lower(),          # DOIs are case-insensitive
+            re.sub(r"[\s-]", '', parsed.get('isbn') or '').upper(),
+            fields['title'].casefold(),
+            fields['author'], fields['year'], fields['publisher'], fields['url'])
+
+def unique_references(parsed_refs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    # Returns the first reference of each distinct source, and for every input
+    # reference the position of its representative in that list
+    first: Dict[Tuple[str, ...], int] = {}
+    unique: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for parsed in parsed_refs:
+        key = verification_key(parsed)
+        pos = first.get(key)
+        if pos is None:
+            pos = first[key] = len(unique)
+            unique.append(parsed)
+        positions.append(pos)
+    return unique, positions
+
+# --- Concurrent Verification ---
+def verify_references(parsed_refs: List[Dict[str, Any]], workers: int = 1, debug: bool = False,
+                      batch_dois: bool = True, dedupe: bool = True) -> List[Dict[str, Any]]:
+    # Verification is dominated by network waits, so a bounded thread pool
+    # overlaps them. pool.map yields results in input order. With batch_dois
+    # the journal DOIs are resolved up front in a few batched requests. With
+    # dedupe, equivalent references share one result dict.
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if dedupe:
+        unique, positions = unique_references(parsed_refs)
+        results = verify_references(unique, workers, debug, batch_dois, dedupe=False)
+        return [results[pos] for pos in positions]
+    prefetched = prefetch_dois(parsed_refs) if batch_dois else None
+    if workers == 1 or len(parsed_refs) <= 1:
+        return [verify_source(parsed, debug=debug, prefetched=prefetched) for parsed in parsed_refs]
+    with ThreadPoolExecutor(max_workers=min(workers, len(parsed_refs))) as pool:
+        return list(pool.map(lambda parsed: verify_source(parsed, debug=debug, prefetched=prefetched), parsed_refs))
+
+async def async_verify_references(parsed_refs: List[Dict[str, Any]], debug: bool = False,
+                                  per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+                                  fetcher: Optional[AsyncFetcher] = None,
+                                  batch_dois: bool = True, dedupe: bool = True) -> List[Dict[str, Any]]:
+    # Verifies the whole list on the running event loop; results are in input order.
+    import asyncio
+    if fetcher is None:
+        async with AsyncFetcher(per_host_limit=per_host_limit) as own_fetcher:
+            return await async_verify_references(parsed_refs, debug, fetcher=own_fetcher, batch_dois=batch_dois,
+                                                 dedupe=dedupe)
+    if dedupe:
+        unique, positions = unique_references(parsed_refs)
+        results = await async_verify_references(unique, debug, fetcher=fetcher, batch_dois=batch_dois, dedupe=False)
+        return [results[pos] for pos in positions]
+    prefetched = await async_prefetch_dois(parsed_refs, fetcher) if batch_dois else None
+    return list(await asyncio.gather(*(async_verify_source(p, debug, fetcher, prefetched) for p in parsed_refs)))
+
+# --- Run Manifest ---
+# A resubmitted bibliography is mostly the lines checked last time. The
+# manifest maps a fingerprint of each reference line to what the run found
+# for it, so an incremental run only parses and verifies new or edited lines.
+# It holds exactly the lines of the run that wrote it.
+MANIFEST_VERSION = 1
+
+def reference_fingerprint(ref: str) -> str:
+    # Lines are compared as the readers yield them (stripped); the parser is
+    # sensitive to everything else, so nothing more is normalized away
+    return hashlib.sha256(ref.strip().encode('utf-8')).hexdigest()
+
+class RunManifest:
+    def __init__(self, path: str, max_age: float = DEFAULT_CACHE_TTL):
+        self.path = path
+        self.max_age = max_age
+        self.previous: Dict[str, Dict[str, Any]] = {}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.reused = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # A manifest from another version of the checks is not reused
+        if isinstance(data, dict) and data.get('version') == MANIFEST_VERSION:
+            self.previous = data.get('entries') or {}
+
+    def lookup(self, ref: str) -> Optional[Tuple[ParsedReference, FormatResult, VerificationResult]]:
+        entry = self.previous.get(reference_fingerprint(ref))
+        if entry is None or time.time() - entry.get('checked_at', 0) > self.max_age:
+            return None
+        try:
+            outcome = (ParsedReference(**entry['parsed']), FormatResult(**entry['format']),
+                       VerificationResult(**entry['verification']))
+        except (KeyError, TypeError):
+            return None
+        # A timeout says nothing about the source; give it another chance
+        if outcome[2]['verified'] == TIMED_OUT:
+            return None
+        self.reused += 1
+        self.entries[reference_fingerprint(ref)] = entry
+        return outcome
+
+    def record(self, ref: str, parsed: ParsedReference, ctr_result: FormatResult, ver_result: VerificationResult) -> None:
+        key = reference_fingerprint(ref)
+        if key not in self.entries:
+            self.entries[key] = {'checked_at': time.time(), 'parsed': parsed.to_dict(),
+                                 'format': ctr_result.to_dict(), 'verification': ver_result.to_dict()}
+
+    def save(self) -> None:
+        # Written next to the old file and renamed over it, so an interrupted
+        # run leaves the previous manifest intact
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f, ensure_ascii=False,
+                      separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+# --- Checkpoints ---
+# A long job appends every finished reference to an NDJSON checkpoint as soon
+# as its verification completes, so a killed or disconnected run can resume
+# having lost only the references that were in flight. A torn last line from
+# a crash is cut off before appending again. Timed-out verifications are not
+# kept, so a resumed run tries them again. Only each line's fingerprint and
+# offset are held in memory; a resumed reference is read back from the file.
+CHECKPOINT_SYNC_EVERY = 64
+CHECKPOINT_SYNC_INTERVAL = 1.0
+
+class Checkpoint:
+    def __init__(self, path: str, resume: bool = False, sync_every: int = CHECKPOINT_SYNC_EVERY,
+                 sync_interval: float = CHECKPOINT_SYNC_INTERVAL):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        # Fingerprint -> offset of its line in the file
+        self.completed: Dict[str, int] = {}
+        self.resumed = 0
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._end = self._load() if resume else 0
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        # Append mode, so lookups can seek without moving where records go
+        self._file = open(path, 'a+b')
+        self._file.truncate(self._end)
+
+    def _load(self) -> int:
+        # Returns the offset just past the last complete, readable line
+        end = 0
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return 0
+        with f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                    if entry['verification']['verified'] != TIMED_OUT:
+                        self.completed[entry['fingerprint']] = end
+                except (ValueError, KeyError, TypeError):
+                    break
+                end += len(line)
+        return end
+
+    def lookup(self, ref: str) -> Optional[Tuple[ParsedReference, FormatResult, VerificationResult]]:
+        offset = self.completed.get(reference_fingerprint(ref))
+        if offset is None:
+            return None
+        with self._lock:
+            self._file.seek(offset)
+            line = self._file.readline()
+        try:
+            entry = json.loads(line)
+            outcome = (ParsedReference(**entry['parsed']), FormatResult(**entry['format']),
+                       VerificationResult(**entry['verification']))
+        except (ValueError, KeyError, TypeError):
+            return None
+        self.resumed += 1
+        return outcome
+
+    def record(self, ref: str, parsed: ParsedReference, ctr_result: FormatResult, ver_result: VerificationResult) -> None:
+        # Called from worker threads as verifications finish
+        key = reference_fingerprint(ref)
+        if ver_result.verified == TIMED_OUT or key in self.completed:
+            return
+        entry = {'fingerprint': key, 'reference': ref, 'parsed': parsed.to_dict(),
+                 'format': ctr_result.to_dict(), 'verification': ver_result.to_dict()}
+        data = (to_json(entry) + '\n').encode('utf-8')
+        with self._lock:
+            if key in self.completed or self._file.closed:
+                return
+            self.completed[key] = self._end
+            # Flushed at once so a killed process loses nothing written;
+            # fsync, which also survives power loss, is batched
+            self._file.write(data)
+            self._file.flush()
+            self._end += len(data)
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._synced_at >= self.sync_interval:
+                self._sync()
+
+    def on_done(self, ref: str, parsed: ParsedReference, ctr_result: FormatResult, future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.record(ref, parsed, ctr_result, future.result())
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+# --- Streaming Pipeline ---
+# References are read, parsed and validated a chunk at a time (the chunk is
+# also the DOI batch), verified on the worker pool and yielded as they finish,
+# so memory use depends on the number in flight rather than the input size.
+STREAM_CHUNK_SIZE = DOI_BATCH_SIZE
+# Distinct sources remembered for dedupe, least recently cited dropped first;
+# a repeat further back than this is verified again
+DEDUPE_WINDOW = 10000
+
+ReferenceOutcome = Tuple[int, str, Dict[str, Any], Dict[str, Any], Dict[str, Any]]
+
+def stream_references(refs: Iterable[str], workers: int = 1, debug: bool = False, ordered: bool = True,
+                      batch_dois: bool = True, dedupe: bool = True,
+                      manifest: Optional[RunManifest] = None,
+                      checkpoint: Optional[Checkpoint] = None) -> Iterator[ReferenceOutcome]:
+    # Yields (idx, ref, parsed, ctr_result, ver_result) per reference: in input
+    # order, or as soon as each completes when ordered is False. With dedupe,
+    # a reference equivalent to one of the last DEDUPE_WINDOW distinct sources
+    # (see verification_key) reuses that one's verification instead of its own.
+    # With a manifest, lines it already holds are neither parsed nor verified,
+    # and every outcome is recorded in it (the caller saves it). With a
+    # checkpoint, lines it holds are taken from it the same way, and each
+    # verification is appended to it the moment it completes.
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    max_in_flight = max(2 * workers, STREAM_CHUNK_SIZE)
+    refs = enumerate(refs)
+    verifications: Dict[Tuple[str, ...], Future] = OrderedDict()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # (idx, ref, parsed, ctr_result, future of ver_result); several
+        # entries may share one future
+        pending = deque()
+
+        def finish(entry) -> ReferenceOutcome:
+            outcome = entry[:4] + (entry[4].result(),)
+            if manifest is not None:
+                manifest.record(*outcome[1:])
+            # The done callback may not have run yet; what is yielded must be saved
+            if checkpoint is not None:
+                checkpoint.record(*outcome[1:])
+            return outcome
+
+        def drain(limit: int) -> Iterator[ReferenceOutcome]:
+            while len(pending) > limit:
+                if ordered:
+                    yield finish(pending.popleft())
+                else:
+                    done, _ = wait({entry[4] for entry in pending}, return_when=FIRST_COMPLETED)
+                    for entry in [entry for entry in pending if entry[4] in done]:
+                        pending.remove(entry)
+                        yield finish(entry)
+
+        while True:
+            chunk = list(islice(refs, STREAM_CHUNK_SIZE))
+            if not chunk:
+                break
+            reused = {}
+            if checkpoint is not None or manifest is not None:
+                for idx, ref in chunk:
+                    outcome = checkpoint.lookup(ref) if checkpoint is not None else None
+                    if outcome is None and manifest is not None:
+                        outcome = manifest.lookup(ref)
+                    if outcome is not None:
+                        reused[idx] = outcome
+            fresh = [(idx, ref) for idx, ref in chunk if idx not in reused] if reused else chunk
+            metrics = _metrics
+            started = time.perf_counter()
+            parsed_chunk = [(idx, ref, parse_reference(ref)) for idx, ref in fresh]
+            if metrics is not None:
+                parsed_at = time.perf_counter()
+                metrics.stage('parse', parsed_at - started, len(fresh))
+            ctr_results = [validate_ctr_format(parsed) for _, _, parsed in parsed_chunk]
+            if metrics is not None:
+                metrics.stage('validate', time.perf_counter() - parsed_at, len(fresh))
+            keyed = [(idx, ref, parsed, verification_key(parsed) if dedupe else None) for idx, ref, parsed in parsed_chunk]
+            new = [parsed for _, _, parsed, key in keyed if key is None or key not in verifications]
+            prefetched = prefetch_dois(new) if batch_dois and new else None
+            checked = zip(keyed, ctr_results)
+            for idx, ref in chunk:
+                if idx in reused:
+                    parsed, ctr_result, ver_result = reused[idx]
+                    future = Future()
+                    future.set_result(ver_result)
+                else:
+                    (_, _, parsed, key), ctr_result = next(checked)
+                    future = verifications.get(key) if key is not None else None
+                    if future is not None:
+                        verifications.move_to_end(key)
+                    else:
+                        future = pool.submit(verify_source, parsed, debug, prefetched)
+                        if key is not None:
+                            verifications[key] = future
+                            if len(verifications) > DEDUPE_WINDOW:
+                                verifications.popitem(last=False)
+                if checkpoint is not None:
+                    future.add_done_callback(partial(checkpoint.on_done, ref, parsed, ctr_result))
+                pending.append((idx, ref, parsed, ctr_result, future))
+                yield from drain(max_in_flight)
+        yield from drain(0)
+    finally:
+        # A consumer that stops early (closing the generator) drops the queued
+        # verifications; those already running finish in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def positive_int(value: str) -> int:
+    import argparse
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got '{value}'")
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got '{value}'")
+    return n
+
+def positive_float(value: str) -> float:
+    import argparse
+    try:
+        x = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got '{value}'")
+    if not x > 0:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got '{value}'")
+    return x
+
+def parse_rate_spec(spec: str) -> Dict[str, float]:
+    # "crossref=2" or "api.crossref.org=2"; a rate of 0 means unlimited
+    name, sep, value = spec.partition('=')
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = -1.0
+    if not sep or not name.strip() or rate < 0:
+        raise ValueError(f"invalid rate '{spec}', expected HOST=RPS")
+    host = PROVIDER_HOSTS.get(name.strip().lower(), name.strip().lower())
+    return {host: rate}
+
+def parse_api_base_spec(spec: str) -> Tuple[str, str]:
+    # "crossref=http://127.0.0.1:8001"
+    name, sep, base = spec.partition('=')
+    name, base = name.strip().lower(), base.strip()
+    if not sep or name not in API_BASES or not base.startswith(('http://', 'https://')):
+        raise ValueError(f"invalid API base '{spec}', expected NAME=URL with NAME one of {', '.join(API_BASES)}")
+    return name, base
+
+# --- Corpus Audit ---
+# Format-only audit of many reference lists (ctr_validator.py corpus).
+# Parsing and validation are pure CPU work, so the files are cut into tasks of
+# whole lines, about CORPUS_CHUNK_BYTES each, and checked in a process pool.
+# Small files are batched into one task and large ones split at line
+# boundaries. Each worker reads its own byte ranges and returns only counts,
+# so little crosses process boundaries and throughput scales with the cores.
+CORPUS_CHUNK_BYTES = 1 << 20
+DEFAULT_CORPUS_PATTERN = '*.txt'
+
+CorpusSegment = Tuple[str, int, int]         # path, start and end byte offsets
+
+def corpus_files(paths: Iterable[str], pattern: str = DEFAULT_CORPUS_PATTERN) -> List[str]:
+    # Files named directly are always taken; directories are searched for pattern
+    import fnmatch
+    files: List[str] = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        files.extend(sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                            if not name.startswith('.') and fnmatch.fnmatch(name, pattern)))
+    return files
+
+def corpus_tasks(files: List[str], chunk_bytes: int = CORPUS_CHUNK_BYTES) -> Iterator[List[CorpusSegment]]:
+    task: List[CorpusSegment] = []
+    size = 0
+    for path in files:
+        end = os.path.getsize(path)
+        start = 0
+        with open(path, 'rb') as f:
+            while start < end:
+                stop = start + chunk_bytes - size
+                if stop < end:
+                    f.seek(stop)
+                    f.readline()
+                    stop = min(f.tell(), end)
+                else:
+                    stop = end
+                task.append((path, start, stop))
+                size += stop - start
+                start = stop
+                if size >= chunk_bytes:
+                    yield task
+                    task, size = [], 0
+    if task:
+        yield task
+
+def _corpus_counts() -> Dict[str, Any]:
+    return {'references': 0, 'valid': 0, 'bytes': 0, 'types': Counter(), 'reasons': Counter()}
+
+def _merge_corpus_counts(into: Dict[str, Any], counts: Dict[str, Any]) -> None:
+    for name in ('references', 'valid', 'bytes'):
+        into[name] += counts[name]
+    into['types'].update(counts['types'])
+    into['reasons'].update(counts['reasons'])
+
+def audit_segments(task: List[CorpusSegment]) -> Dict[str, Dict[str, Any]]:
+    # Runs in a worker process: counts per file for one task
+    files: Dict[str, Dict[str, Any]] = {}
+    for path, start, stop in task:
+        counts = files.get(path)
+        if counts is None:
+            counts = files[path] = _corpus_counts()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(stop - start)
+        counts['bytes'] += len(data)
+        # Segments end on line boundaries, so no character is split
+        for _, parsed, ctr_result in validate_references(
+                line for line in (raw.strip() for raw in data.decode('utf-8', errors='replace').splitlines()) if line):
+            counts['references'] += 1
+            counts['types'][parsed.type] += 1
+            if ctr_result.valid:
+                counts['valid'] += 1
+            # Valid references can carry advisory reasons too
+            counts['reasons'].update(ctr_result.reasons)
+    return files
+
+def audit_corpus(paths: Iterable[str], workers: Optional[int] = None, pattern: str = DEFAULT_CORPUS_PATTERN,
+                 chunk_bytes: int = CORPUS_CHUNK_BYTES) -> Dict[str, Any]:
+    # Returns {'files': {path: counts}, 'total': counts, 'throughput': {...}};
+    # workers defaults to one process per core, and 1 runs in this process
+    files = corpus_files(paths, pattern)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    per_file = {path: _corpus_counts() for path in files}
+    total = _corpus_counts()
+    tasks = corpus_tasks(files, chunk_bytes)
+    n_tasks = 0
+    if workers == 1:
+        results = map(audit_segments, tasks)
+        pool = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(audit_segments, tasks)
+    try:
+        for result in results:
+            n_tasks += 1
+            for path, counts in result.items():
+                _merge_corpus_counts(per_file[path], counts)
+                _merge_corpus_counts(total, counts)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    seconds = time.perf_counter() - started
+    throughput = {'seconds': round(seconds, 3), 'workers': workers, 'tasks': n_tasks,
+                  'references_per_second': round(total['references'] / seconds, 1) if seconds else 0.0,
+                  'mb_per_second': round(total['bytes'] / 1e6 / seconds, 2) if seconds else 0.0}
+    return {'files': per_file, 'total': total, 'throughput': throughput}
+
+def _corpus_record(counts: Dict[str, Any]) -> Dict[str, Any]:
+    # Reasons from most to least common
+    return {'references': counts['references'], 'valid_ctr': counts['valid'], 'types': dict(counts['types']),
+            'reasons': dict(counts['reasons'].most_common())}
+
+def format_corpus_counts(title: str, counts: Dict[str, Any], top: Optional[int] = None) -> str:
+    n = counts['references']
+    share = f" ({counts['valid'] / n * 100:.1f}%)" if n else ""
+    out = [f"--- {title} ---", f"References: {n}", f"Valid CTR format: {counts['valid']}{share}"]
+    reasons = counts['reasons'].most_common(top)
+    if reasons:
+        out.append("Reasons:")
+        out.extend(f"  {count:>8}  {reason}" for reason, count in reasons)
+    return '\n'.join(out)
+
+# --- Main Entrypoint ---
+def add_verification_options(parser: Any) -> None:
+    # Options shared by main and the serve entry point (ctr_service.py)
+    parser.add_argument('-w', '--workers', type=positive_int, default=1,
+                        help='Number of references to verify concurrently (default: %(default)s)')
+    parser.add_argument('--dispatch', choices=DISPATCH_MODES, default='sequential',
+                        help="Run a reference's verifier providers one after another, stopping at the first "
+                             "match, or race them all and take the first match (default: %(default)s)")
+    parser.add_argument('--budget', metavar='SECONDS', type=positive_float,
+                        help='Time allowed to verify one reference; past it the reference is reported as '
+                             f'"{TIMED_OUT}"')
+    parser.add_argument('--provider-budget', metavar='SECONDS', type=positive_float,
+                        help='Time allowed for each source (CrossRef, OpenAlex, ...) before moving on to the next')
+    parser.add_argument('--hedge', action='store_true',
+                        help="Send a duplicate request when one takes longer than the host's observed p95 latency")
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help='Verify every reference even when an equivalent one appears earlier in the input')
+    parser.add_argument('--no-batch-doi', action='store_true',
+                        help='Resolve each DOI with its own CrossRef request instead of batched queries')
+    parser.add_argument('--pool-size', type=positive_int, default=DEFAULT_POOL_SIZE,
+                        help='Keep-alive connections per API host (default: %(default)s)')
+    parser.add_argument('--rate', metavar='HOST=RPS', action='append', default=[],
+                        help='Requests per second for an API host or provider (crossref, openalex, openlibrary); '
+                             '0 removes the limit. May be repeated')
+    parser.add_argument('--api-base', metavar='NAME=URL', action='append', default=[],
+                        help='Send requests for an API (crossref, openalex, openlibrary) to another base URL, '
+                             'such as a mirror or mock_api.py. May be repeated')
+    parser.add_argument('--max-page-bytes', metavar='BYTES', type=positive_int, default=DEFAULT_MAX_PAGE_BYTES,
+                        help='Most bytes read from a cited web page (default: %(default)s)')
+    parser.add_argument('--cache', metavar='PATH', default=DEFAULT_CACHE_PATH,
+                        help=f'Metadata cache file (default: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the metadata cache')
+    parser.add_argument('--index', metavar='PATH', default=DEFAULT_INDEX_PATH,
+                        help='Local DOI/ISBN index checked before any request, used if the file exists '
+                             f'(default: {DEFAULT_INDEX_PATH})')
+    parser.add_argument('--no-index', action='store_true', help='Do not consult the local index')
+    parser.add_argument('--cache-ttl', metavar='DAYS', type=float, default=DEFAULT_CACHE_TTL / 86400,
+                        help='Days before cached metadata is fetched again (default: %(default)s)')
+
+def configure_verification(args: Any, parser: Any, connections: int) -> None:
+    # Installs the process-wide settings chosen by add_verification_options;
+    # connections is how many requests may be in flight at once
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for spec in args.rate:
+        try:
+            limits.update(parse_rate_spec(spec))
+        except ValueError as e:
+            parser.error(str(e))
+    set_rate_limiter(RateLimiter(limits))
+    for spec in args.api_base:
+        try:
+            set_api_base(*parse_api_base_spec(spec))
+        except ValueError as e:
+            parser.error(str(e))
+    # Never fewer pooled connections than concurrent requests, or handshakes come back
+    set_http_client(HttpClient(pool_size=max(args.pool_size, connections)))
+    set_max_page_bytes(args.max_page_bytes)
+    set_dispatch_mode(args.dispatch)
+    set_latency_budgets(args.budget, args.provider_budget)
+    set_hedging(args.hedge)
+    # Raced providers each have a request in flight, and hedging can double it
+    set_fetch_pool_size(connections * len(_PROVIDERS) * (2 if args.hedge else 1))
+    if not args.no_cache:
+        set_metadata_cache(MetadataCache(args.cache, ttl=args.cache_ttl * 86400))
+    if not args.no_index and os.path.exists(args.index):
+        set_metadata_index(MetadataIndex(args.index))
+
+def index_main(argv: Optional[List[str]] = None) -> None:
+    # ctr_validator.py index {build,refresh,stats}
+    import argparse
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--index', metavar='PATH', default=DEFAULT_INDEX_PATH, help=f'Index file (default: {DEFAULT_INDEX_PATH})')
+    sources = argparse.ArgumentParser(add_help=False)
+    sources.add_argument('--from-cache', action='store_true', help='Also add the works and editions stored in the metadata cache by past runs')
+    sources.add_argument('--cache', metavar='PATH', default=DEFAULT_CACHE_PATH, help=f'Metadata cache file (default: {DEFAULT_CACHE_PATH})')
+    sources.add_argument('--api-base', metavar='NAME=URL', action='append', default=[],
+                         help='With --from-cache, also add responses cached from this base URL. May be repeated')
+    parser = argparse.ArgumentParser(prog='ctr_validator.py index', description="Manage the local DOI/ISBN metadata index")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', parents=[common, sources], help='Load snapshot files into the index')
+    build.add_argument('sources', nargs='*', metavar='SOURCE', help='JSONL snapshot file or directory (CrossRef, OpenAlex or OpenLibrary; may be gzipped)')
+    build.add_argument('--rebuild', action='store_true', help='Empty the index before loading')
+    commands.add_parser('refresh', parents=[common, sources], help='Reload snapshot files that changed since they were loaded')
+    commands.add_parser('stats', parents=[common], help='Show what the index holds')
+    args = parser.parse_args(argv)
+    if args.command == 'build' and not args.sources and not args.from_cache:
+        parser.error("build needs at least one SOURCE or --from-cache")
+    if args.command == 'build':
+        missing = [path for path in args.sources if not os.path.exists(path)]
+        if missing:
+            parser.error(f"no such file or directory: {', '.join(missing)}")
+    elif not os.path.exists(args.index):
+        parser.error(f"no index at {args.index}; create one with 'index build'")
+    for spec in getattr(args, 'api_base', []):
+        try:
+            set_api_base(*parse_api_base_spec(spec))
+        except ValueError as e:
+            parser.error(str(e))
+    index = MetadataIndex(args.index)
+    try:
+        loaded: List[Tuple[str, int]] = []
+        if args.command == 'build':
+            if args.rebuild:
+                index.clear()
+            for path in args.sources:
+                loaded.extend(index.load(path))
+        elif args.command == 'refresh':
+            loaded = index.refresh()
+        for path, count in loaded:
+            print(f"Loaded {count} records from {path}")
+        if args.command != 'stats' and args.from_cache:
+            if os.path.exists(args.cache):
+                cache = MetadataCache(args.cache)
+                try:
+                    print(f"Loaded {index.load_cache(cache)} records from the metadata cache")
+                finally:
+                    cache.close()
+            else:
+                print(f"No metadata cache at {args.cache}")
+        stats = index.stats()
+        print(f"Index {args.index}: {stats['dois']} DOIs, {stats['isbns']} ISBNs from {stats['sources']} snapshot files")
+    finally:
+        index.close()
+
+def corpus_main(argv: Optional[List[str]] = None) -> None:
+    # ctr_validator.py corpus PATH...
+    import argparse
+    parser = argparse.ArgumentParser(prog='ctr_validator.py corpus',
+                                     description="Audit the CTR format of many reference lists on all cores, offline")
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='Reference list file, or directory searched for --pattern')
+    parser.add_argument('-j', '--jobs', type=positive_int, help='Worker processes (default: one per core)')
+    parser.add_argument('--pattern', default=DEFAULT_CORPUS_PATTERN, help='File names to audit inside directories (default: %(default)s)')
+    parser.add_argument('--chunk-bytes', type=positive_int, default=CORPUS_CHUNK_BYTES, help='Approximate input size of one worker task (default: %(default)s)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text', help='Output format: text, one JSON record per file then the totals (ndjson), or a single JSON document (default: %(default)s)')
+    parser.add_argument('--summary-only', action='store_true', help='Only print the corpus-wide counts')
+    parser.add_argument('--top', type=positive_int, help='Show only the N most common reasons in text output')
+    args = parser.parse_args(argv)
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        parser.error(f"no such file or directory: {', '.join(missing)}")
+    audit = audit_corpus(args.paths, args.jobs, args.pattern, args.chunk_bytes)
+    files = {} if args.summary_only else audit['files']
+    total, speed = audit['total'], audit['throughput']
+    if args.format == 'json':
+        print(to_json({'files': {path: _corpus_record(counts) for path, counts in files.items()},
+                        'total': dict(_corpus_record(total), files=len(audit['files'])), 'throughput': speed}))
+        return
+    if args.format == 'ndjson':
+        for path, counts in files.items():
+            print(to_json(dict(_corpus_record(counts), file=path)))
+        print(to_json({'total': dict(_corpus_record(total), files=len(audit['files'])), 'throughput': speed}))
+        return
+    for path, counts in files.items():
+        print(format_corpus_counts(path, counts, args.top) + '\n')
+    print(format_corpus_counts(f"Corpus Summary ({len(audit['files'])} files)", total, args.top))
+    print(f"Throughput: {total['references']} references in {speed['seconds']:.2f}s "
+          f"({speed['references_per_second']:,.0f} references/s, {speed['mb_per_second']:.1f} MB/s) "
+          f"on {speed['workers']} process{'es' if speed['workers'] != 1 else ''}")
+
 def main():
     import argparse
-    parser = argparse.ArgumentParser(description="Harvard Reference Validator and Verifier")
+    if sys.argv[1:2] == ['index']:
+        return index_main(sys.argv[2:])
+    if sys.argv[1:2] == ['serve']:
+        import ctr_service
+        return ctr_service.main(sys.argv[2:])
+    if sys.argv[1:2] == ['corpus']:
+        return corpus_main(sys.argv[2:])
+    parser = argparse.ArgumentParser(description="Harvard Reference Validator and Verifier",
+                                     epilog="Run 'ctr_validator.py index --help' to manage the local DOI/ISBN index, "
+                                            "'ctr_validator.py serve --help' to keep a checking service running, "
+                                            "or 'ctr_validator.py corpus --help' to audit the format of many files at once.")
     parser.add_argument('-f', '--file', help='Path to reference list file')
     parser.add_argument('-s', '--string', help='Direct string input of references (\n separated)')
     parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output for DOI resolution fallback')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                        help='Output format: human-readable text, one JSON record per line (ndjson), or a single '
+                             'JSON document (default: %(default)s)')
+    parser.add_argument('--format-only', action='store_true',
+                        help='Only check the CTR format, offline; exits with status 1 if any reference is invalid '
+                             '(for editors and pre-commit hooks)')
+    add_verification_options(parser)
+    parser.add_argument('--unordered', action='store_true',
+                        help='Print each reference as soon as it is verified instead of in input order')
+    parser.add_argument('--manifest', metavar='PATH',
+                        help='Incremental mode: reuse the results recorded in PATH for lines unchanged since that '
+                             'run, verify only new or edited lines, then rewrite PATH')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='Append each reference to PATH (NDJSON) as soon as it is verified, so an interrupted '
+                             'job can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                        help='With --checkpoint, keep the references already in PATH and verify only the rest')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print where the time went (stages, providers, HTTP per host, cache hit ratio) to '
+                             'stderr at the end')
+    parser.add_argument('--metrics', metavar='PATH', help='Write run metrics to PATH at the end')
+    parser.add_argument('--metrics-format', choices=METRICS_FORMATS, default='json',
+                        help='Format of the --metrics file (default: %(default)s)')
     args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+    if args.format_only and (args.manifest or args.checkpoint):
+        parser.error("--format-only cannot be combined with --manifest or --checkpoint")
     if args.file:
-        refs = read_references_from_file(args.file)
+        refs = iter_references_from_file(args.file)
     elif args.string:
-        refs = read_references_from_string(args.string)
+        refs = iter_references_from_string(args.string)
     else:
         print("No input provided. Use -f <file> or -s <string>.")
         return
-    outputs = []
+    metrics = Metrics() if args.profile or args.metrics else None
+    set_metrics(metrics)
+    total = 0
     valid_ctr = 0
-    verified = 0
-    for idx, ref in enumerate(refs):
-        parsed = parse_reference(ref)
-        ctr_result = validate_ctr_format(parsed)
-        if ctr_result['valid']:
-            valid_ctr += 1
-        ver_result = verify_source(parsed, debug=args.debug)
-        if ver_result['verified'] == 'Yes':
-            verified += 1
-        outputs.append(format_reference_output(ref, parsed, ctr_result, ver_result, idx))
-    print('\n\n'.join(outputs))
-    print(format_summary(len(refs), valid_ctr, verified))
+    if args.format_only:
+        # No verification settings are installed, so nothing network-related is imported
+        verified = manifest = checkpoint = None
+        outcomes = ((idx, ref, parsed, ctr_result, None)
+                    for idx, (ref, parsed, ctr_result) in enumerate(validate_references(refs)))
+    else:
+        configure_verification(args, parser, connections=args.workers)
+        verified = 0
+        manifest = RunManifest(args.manifest, max_age=args.cache_ttl * 86400) if args.manifest else None
+        checkpoint = Checkpoint(args.checkpoint, resume=args.resume) if args.checkpoint else None
+        outcomes = stream_references(refs, workers=args.workers, debug=args.debug,
+                                     ordered=not args.unordered, batch_dois=not args.no_batch_doi,
+                                     dedupe=not args.no_dedupe, manifest=manifest, checkpoint=checkpoint)
+    # json streams its "references" array too, so records still appear as
+    # they finish and the document is only complete after the summary
+    if args.format == 'json':
+        print('{"references":[', end='', flush=True)
+    try:
+        for idx, ref, parsed, ctr_result, ver_result in outcomes:
+            total += 1
+            if ctr_result['valid']:
+                valid_ctr += 1
+            if ver_result is not None and ver_result['verified'] == 'Yes':
+                verified += 1
+            started = time.perf_counter()
+            if args.format == 'text':
+                if total > 1:
+                    print()
+                print(format_reference_output(ref, parsed, ctr_result, ver_result, idx), flush=True)
+            else:
+                record = to_json(reference_record(ref, parsed, ctr_result, ver_result, idx))
+                if args.format == 'json' and total > 1:
+                    record = ',\n' + record
+                print(record, end='\n' if args.format == 'ndjson' else '', flush=True)
+            if metrics is not None:
+                metrics.stage('format', time.perf_counter() - started)
+    finally:
+        # Also on Ctrl-C: closing the stream drops the queued verifications;
+        # everything already printed is in the checkpoint
+        outcomes.close()
+        if checkpoint is not None:
+            checkpoint.close()
+    if args.format == 'text':
+        print(format_summary(total, valid_ctr, verified))
+    elif args.format == 'json':
+        print('],"summary":' + to_json(summary_record(total, valid_ctr, verified)) + '}')
+    if checkpoint is not None and args.resume:
+        print(f"Resumed: {checkpoint.resumed} of {total} references taken from {args.checkpoint}", file=sys.stderr)
+    if manifest is not None:
+        manifest.save()
+        print(f"Incremental run: {manifest.reused} of {total} references unchanged since the last run, "
+              f"{total - manifest.reused} checked", file=sys.stderr)
+    if metrics is not None:
+        metrics.count('references', total)
+        if args.metrics:
+            metrics.write(args.metrics, args.metrics_format)
+        if args.profile:
+            print(metrics.format_profile(), file=sys.stderr)
+    if args.format_only and valid_ctr < total:
+        return 1
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
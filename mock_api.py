@@ -0,0 +1,397 @@
+"""
+Local stand-in for the CrossRef, OpenAlex and OpenLibrary APIs
+Replays recorded responses with configurable latency and injected errors, so
+verification can be tested and benchmarked without the network. Recordings
+with an ETag or Last-Modified answer conditional requests with 304.
+Run: python mock_api.py [-r RECORDINGS] [--from-cache PATH] [--latency MS] [--error-rate P]
+then point the validator at the printed --api-base URLs.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import ctr_validator
+
+# Each provider is served on its own port so request paths are exactly those
+# of the public API; 'web' serves the pages cited by website references
+PROVIDERS = ('crossref', 'openalex', 'openlibrary', 'web')
+# Query parameters that decide an answer; paging and field lists do not, so
+# recordings survive changes to the search limits
+_KEY_PARAMS = {
+    ('crossref', '/works'): ('filter', 'query'),
+    ('openalex', '/works'): ('search', 'filter'),
+    ('openlibrary', '/search.json'): ('q',),
+}
+ERROR_STATUSES = (500, 503)
+# Recorded headers that no longer describe the replayed body
+_DROPPED_HEADERS = frozenset(['content-length', 'content-encoding', 'transfer-encoding', 'connection', 'date', 'server'])
+
+Response = Tuple[int, Dict[str, str], str]
+
+
+def _json_response(data: Any, status: int = 200) -> Response:
+    return status, {'Content-Type': 'application/json'}, json.dumps(data)
+
+
+def _title_key(title: str) -> str:
+    return ' '.join(title.casefold().split())
+
+
+def replay_key(provider: str, path: str) -> str:
+    # path is the request path with its query string
+    parts = urlsplit(path)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    keep = _KEY_PARAMS.get((provider, parts.path))
+    if keep is not None:
+        params = [(k, v) for k, v in params if k in keep]
+    base = ctr_validator.API_BASES.get(provider, 'http://web')
+    return ctr_validator.normalize_cache_key(base + parts.path + ('?' + urlencode(params) if params else ''))
+
+
+def _not_modified(response: Response, request_headers: Any) -> Optional[Response]:
+    # The 304 a server sends when the client's validators still match
+    status, headers, _ = response
+    if status != 200 or not request_headers:
+        return None
+    etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+    if_none_match, if_modified_since = request_headers.get('If-None-Match'), request_headers.get('If-Modified-Since')
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if etag is None or etag not in [tag.strip() for tag in if_none_match.split(',')] + ['*']:
+            return None
+    elif if_modified_since is None or last_modified is None:
+        return None
+    else:
+        try:
+            if parsedate_to_datetime(last_modified) > parsedate_to_datetime(if_modified_since):
+                return None
+        except (TypeError, ValueError):
+            return None
+    return 304, {name: value for name, value in (('ETag', etag), ('Last-Modified', last_modified)) if value}, ''
+
+
+def provider_of(url: str) -> str:
+    host = urlsplit(url).netloc.lower()
+    return next((name for name, public in ctr_validator.PROVIDER_HOSTS.items() if public == host), 'web')
+
+
+class MockApi:
+    # What the stand-in answers: recorded responses keyed on replay_key(),
+    # plus a title catalogue so searches find the works registered for them.
+    # latency is the fixed part of each answer's delay in seconds and tail the
+    # mean of an exponential extra on top; error_rate and drop_rate are the
+    # fractions of requests answered with one of ERROR_STATUSES or with a
+    # dropped connection. Each request's delay and fate come from a generator
+    # seeded with the request and the number of times it has been seen, so a
+    # run repeats exactly whatever order the threads serve it in.
+    def __init__(self, latency: float = 0.0, tail: float = 0.0, error_rate: float = 0.0, drop_rate: float = 0.0,
+                 seed: int = 0):
+        self.latency = latency
+        self.tail = tail
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.seed = seed
+        self.responses: Dict[str, Response] = {}
+        self.calls: Dict[str, int] = dict.fromkeys(PROVIDERS, 0)
+        self.injected = 0
+        self._titles: Dict[str, Dict[str, List[Dict[str, Any]]]] = {'openalex': {}, 'openlibrary': {}}
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, provider: str, path: str, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        if not isinstance(body, str):
+            body = json.dumps(body)
+            headers = headers or {'Content-Type': 'application/json'}
+        self.responses[replay_key(provider, path)] = (status, dict(headers or {'Content-Type': 'text/plain'}), body)
+
+    def add_url(self, url: str, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        parts = urlsplit(url)
+        self.add(provider_of(url), parts.path + (f"?{parts.query}" if parts.query else ''), status, body, headers)
+
+    def add_search_result(self, provider: str, title: str, result: Dict[str, Any]) -> None:
+        # An OpenAlex work or OpenLibrary search doc returned for searches starting with title
+        self._titles[provider].setdefault(_title_key(title), []).append(result)
+
+    def load(self, path: str) -> int:
+        # JSONL recordings: {"url": ..., "status": ..., "headers": {...}, "body": "..."}
+        count = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.add_url(entry['url'], entry.get('status', 200), entry.get('body', ''), entry.get('headers'))
+                    count += 1
+        return count
+
+    def load_cache(self, cache: ctr_validator.MetadataCache) -> int:
+        # Responses stored in the metadata cache by runs against the real APIs
+        count = 0
+        for base in ctr_validator.API_BASES.values():
+            for key, response in cache.items(base + '/'):
+                self.add_url(key.partition('#')[0], response.status_code, response.text, dict(response.headers))
+                count += 1
+        return count
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.calls = dict.fromkeys(PROVIDERS, 0)
+            self.injected = 0
+
+    def answer(self, provider: str, method: str, path: str,
+               headers: Any = None) -> Tuple[float, Optional[Response]]:
+        # (delay, response); a None response means the connection is dropped.
+        # headers are the request's, for conditional requests
+        key = replay_key(provider, path)
+        with self._lock:
+            self.calls[provider] += 1
+            seen = self._seen[f"{method} {key}"] = self._seen.get(f"{method} {key}", 0) + 1
+        rng = random.Random(f"{self.seed}:{method}:{key}:{seen}")
+        delay = self.latency + (rng.expovariate(1 / self.tail) if self.tail > 0 else 0.0)
+        fate = rng.random()
+        if fate < self.drop_rate + self.error_rate:
+            with self._lock:
+                self.injected += 1
+            if fate < self.drop_rate:
+                return delay, None
+            return delay, (rng.choice(ERROR_STATUSES), {'Content-Type': 'text/plain'}, 'Injected error')
+        response = self._lookup(provider, key, path)
+        return delay, _not_modified(response, headers) or response
+
+    def _lookup(self, provider: str, key: str, path: str) -> Response:
+        found = self.responses.get(key)
+        if found is not None:
+            return found
+        parts = urlsplit(path)
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        if provider == 'crossref' and parts.path == '/works' and params.get('filter', '').startswith('doi:'):
+            # Batched DOI lookups are answered from the recorded single works
+            items = []
+            for doi in params['filter'].split(','):
+                work = self.responses.get(replay_key('crossref', '/works/' + doi[len('doi:'):]))
+                if work is not None and work[0] == 200:
+                    items.append(json.loads(work[2]).get('message', {}))
+            return _json_response({'status': 'ok', 'message': {'total-results': len(items), 'items': items}})
+        if provider == 'crossref' and parts.path.startswith('/works/'):
+            return 404, {'Content-Type': 'text/plain'}, 'Resource not found.'
+        if provider == 'openalex' and parts.path == '/works':
+            results = self._search('openalex', params.get('search', ''))
+            return _json_response({'meta': {'count': len(results)}, 'results': results})
+        if provider == 'openlibrary' and parts.path == '/search.json':
+            docs = self._search('openlibrary', params.get('q', ''))
+            return _json_response({'numFound': len(docs), 'docs': docs})
+        return 404, {'Content-Type': 'text/plain'}, 'Not Found'
+
+    def _search(self, provider: str, query: str) -> List[Dict[str, Any]]:
+        # Results registered for the longest title the query starts with
+        titles = self._titles[provider]
+        words = query.casefold().split()
+        for end in range(len(words), 0, -1):
+            found = titles.get(' '.join(words[:end]))
+            if found:
+                return list(found)
+        return []
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many workers open connections at once
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockApi/1.0'
+    # Headers and body go out in separate writes; with Nagle on, keep-alive
+    # clients wait out the delayed ACK before seeing the body
+    disable_nagle_algorithm = True
+
+    def _serve(self, head: bool) -> None:
+        delay, response = self.server.api.answer(self.server.provider, self.command, self.path, self.headers)
+        if delay > 0:
+            time.sleep(delay)
+        if response is None:
+            self.close_connection = True
+            return
+        status, headers, body = response
+        data = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in _DROPPED_HEADERS:
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self._serve(head=False)
+
+    def do_HEAD(self) -> None:
+        self._serve(head=True)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class MockApiServer:
+    # Serves api on one local port per provider. install() points the
+    # validator's API bases at it; close() restores the public APIs.
+    def __init__(self, api: MockApi, host: str = '127.0.0.1', ports: Optional[Dict[str, int]] = None):
+        self.api = api
+        self.host = host
+        self.ports = dict(ports or {})
+        self._servers: Dict[str, _Server] = {}
+
+    def start(self) -> 'MockApiServer':
+        for provider in PROVIDERS:
+            server = _Server((self.host, self.ports.get(provider, 0)), _Handler)
+            server.api = self.api
+            server.provider = provider
+            self.ports[provider] = server.server_address[1]
+            self._servers[provider] = server
+            threading.Thread(target=server.serve_forever, name=f"mock-{provider}", daemon=True).start()
+        return self
+
+    def base(self, provider: str) -> str:
+        return f"http://{self.host}:{self.ports[provider]}"
+
+    def install(self) -> None:
+        for name in ctr_validator.API_BASES:
+            ctr_validator.set_api_base(name, self.base(name))
+
+    def close(self) -> None:
+        for name in ctr_validator.API_BASES:
+            ctr_validator.set_api_base(name, None)
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+    def __enter__(self) -> 'MockApiServer':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# --- Synthetic Bibliographies ---
+# Reference kinds and their weights: every verification path, including
+# lookups that fail and lines that are not references at all
+SYNTHETIC_MIX = (
+    ('journal_doi', 35),
+    ('journal_search', 20),
+    ('book_isbn', 15),
+    ('book_search', 10),
+    ('website', 10),
+    ('unresolved', 5),
+    ('malformed', 5),
+)
+_SURNAMES = ('Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Evans', 'Thomas', 'Roberts', 'Walker')
+_TOPICS = ('learning', 'sport', 'networks', 'climate', 'health', 'markets', 'software', 'language')
+
+
+def _isbn13(n: int) -> str:
+    return ctr_validator.isbn_forms(f"{n % 10 ** 9:09d}0")[1]
+
+
+def _synthetic_reference(api: MockApi, kind: str, n: int, web_base: str) -> str:
+    surname = _SURNAMES[n % len(_SURNAMES)]
+    topic = _TOPICS[n % len(_TOPICS)]
+    year = 1990 + n % 35
+    volume, issue, first = 1 + n % 40, 1 + n % 4, 1 + n % 300
+    pages = f"{first}-{first + 14}"
+    if kind in ('journal_doi', 'journal_search', 'unresolved'):
+        title = f"Synthetic study {n} of {topic}"
+        journal = f"Journal of {topic.title()} Studies"
+        doi = f"10.5555/bench.{n}"
+        work = {'DOI': doi, 'title': [title], 'author': [{'family': surname, 'given': 'Alex'}],
+                'container-title': [journal], 'volume': str(volume), 'issue': str(issue), 'page': pages}
+        if kind != 'unresolved':
+            api.add('crossref', f"/works/{doi}", 200, {'status': 'ok', 'message': work})
+        if kind == 'journal_search':
+            api.add_search_result('openalex', title, {
+                'doi': f"https://doi.org/{doi}", 'title': title,
+                'authorships': [{'author': {'display_name': f"Alex {surname}"}}],
+                'primary_location': {'source': {'display_name': journal}}, 'publication_year': year})
+        ref = f"{surname}, A.J., ({year}) '{title}', {journal}, {volume}({issue}), pp. {pages}."
+        if kind == 'journal_search':
+            return ref
+        return f"{ref} doi:{doi if kind == 'journal_doi' else f'10.5555/missing.{n}'}."
+    if kind in ('book_isbn', 'book_search'):
+        title = f"Synthetic handbook {n} of {topic}"
+        publisher = f"{topic.title()} Press"
+        ref = f"{surname}, A., ({year}) {title}. London: {publisher}."
+        if kind == 'book_search':
+            api.add_search_result('openlibrary', title, {
+                'key': f"/works/OL{n}W", 'title': title, 'author_name': [f"Alex {surname}"],
+                'first_publish_year': year, 'publish_year': [year], 'publisher': [publisher]})
+            return ref
+        isbn = _isbn13(n)
+        api.add('openlibrary', f"/isbn/{isbn}.json", 200, {
+            'key': f"/books/OL{n}M", 'title': title, 'authors': [{'key': f"/authors/OL{n}A"}],
+            'publishers': [publisher], 'publish_date': str(year)})
+        return f"{ref} ISBN {isbn}"
+    if kind == 'website':
+        title = f"Synthetic report {n} on {topic}"
+        api.add('web', f"/page/{n}", 200,
+                f"<html><head><title>{title}</title></head><body><h1>{title}</h1><p>About {topic}.</p></body></html>",
+                {'Content-Type': 'text/html; charset=utf-8'})
+        return f"{surname}, A. ({year}) {title}. Available at: {web_base}/page/{n} (Accessed: 15 July 2025)."
+    return f"{surname} {year} notes on {topic} {n}"
+
+
+def synthetic_references(api: MockApi, web_base: str, count: int, seed: int = 0,
+                         duplicates: float = 0.0) -> List[str]:
+    # count reference lines drawn from SYNTHETIC_MIX, with every response
+    # their verification needs added to api. A fraction (duplicates) repeat
+    # an earlier line, as merged bibliographies do.
+    rng = random.Random(seed)
+    kinds, weights = zip(*SYNTHETIC_MIX)
+    refs: List[str] = []
+    for n in range(count):
+        if refs and rng.random() < duplicates:
+            refs.append(rng.choice(refs))
+        else:
+            refs.append(_synthetic_reference(api, rng.choices(kinds, weights)[0], n, web_base))
+    return refs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded CrossRef/OpenAlex/OpenLibrary responses locally")
+    parser.add_argument('-r', '--recordings', metavar='PATH', action='append', default=[], help='JSONL file of recorded responses ({"url", "status", "headers", "body"}). May be repeated')
+    parser.add_argument('--from-cache', metavar='PATH', help="Also replay the responses in a validator metadata cache")
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=0, help='First of four consecutive ports (crossref, openalex, openlibrary, web); 0 picks free ports')
+    parser.add_argument('--latency', metavar='MS', type=float, default=0.0, help='Fixed delay before every answer (default: %(default)s)')
+    parser.add_argument('--tail', metavar='MS', type=float, default=0.0, help='Mean of an exponentially distributed extra delay (default: %(default)s)')
+    parser.add_argument('--error-rate', metavar='P', type=float, default=0.0, help=f'Fraction of requests answered with HTTP {"/".join(map(str, ERROR_STATUSES))}')
+    parser.add_argument('--drop-rate', metavar='P', type=float, default=0.0, help='Fraction of requests whose connection is dropped unanswered')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for latency and error injection (default: %(default)s)')
+    args = parser.parse_args()
+    api = MockApi(args.latency / 1000, args.tail / 1000, args.error_rate, args.drop_rate, args.seed)
+    loaded = sum(api.load(path) for path in args.recordings)
+    if args.from_cache:
+        cache = ctr_validator.MetadataCache(args.from_cache)
+        loaded += api.load_cache(cache)
+        cache.close()
+    ports = {provider: args.port + i for i, provider in enumerate(PROVIDERS)} if args.port else None
+    server = MockApiServer(api, args.host, ports).start()
+    print(f"Replaying {loaded} recorded responses. Run the validator with:")
+    print(' '.join(f"--api-base {name}={server.base(name)}" for name in ctr_validator.API_BASES), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Tests for the persistent metadata cache: TTLs and size-capped LRU eviction.
+"""
+import json
+
+import ctr_validator
+
+WORK = 'https://api.crossref.org/works/10.1000/abc'
+MISSING = 'https://api.crossref.org/works/10.1000/missing'
+EMPTY_SEARCH = 'https://api.openalex.org/works?search=nothing'
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs):
+    clock = _Clock()
+    monkeypatch.setattr(ctr_validator.time, 'time', clock)
+    return ctr_validator.MetadataCache(':memory:', **kwargs), clock
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=100, negative_ttl=10)
+    cache.put(WORK, ctr_validator.FetchResponse(200, {}, '{"message": {}}'))
+    clock.now += 99
+    assert cache.get(WORK).text == '{"message": {}}'
+    clock.now += 2
+    assert cache.get(WORK) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Failures other than "not found" are never stored
+    cache.put(MISSING, ctr_validator.FetchResponse(503, {}, 'busy'))
+    assert cache.get(MISSING) is None
+
+
+def test_negative_results_expire_sooner(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl=100, negative_ttl=10)
+    cache.put(WORK, ctr_validator.FetchResponse(200, {}, '{"message": {}}'))
+    cache.put(MISSING, ctr_validator.FetchResponse(404, {}, 'Resource not found.'))
+    cache.put(EMPTY_SEARCH, ctr_validator.FetchResponse(200, {}, json.dumps({'meta': {'count': 0}, 'results': []})))
+    clock.now += 9
+    assert all(cache.get(url) is not None for url in (WORK, MISSING, EMPTY_SEARCH))
+    clock.now += 2
+    assert cache.get(MISSING) is None and cache.get(EMPTY_SEARCH) is None
+    assert cache.get(WORK) is not None
+
+
+def test_least_recently_used_entries_are_evicted_at_the_cap(monkeypatch):
+    body = 'x' * 1000
+    # Each entry is 1002 bytes with its headers; four exceed the cap, and
+    # eviction trims to 90% of it, so exactly one has to go
+    cache, clock = _cache(monkeypatch, max_bytes=3500)
+    urls = [f"https://api.crossref.org/works/10.1000/{name}" for name in 'abcd']
+    for url in urls[:3]:
+        cache.put(url, ctr_validator.FetchResponse(200, {}, body))
+        clock.now += 1
+    assert cache.get(urls[0]) is not None
+    clock.now += 1
+    cache.put(urls[3], ctr_validator.FetchResponse(200, {}, body))
+    cache.evict()
+    assert [cache.get(url) is not None for url in urls] == [True, False, True, True]
+
+
+def test_batch_prefetch_counts_each_lookup_once(monkeypatch):
+    cache, clock = _cache(monkeypatch)
+    dois = ['10.1000/cached', '10.1000/a', '10.1000/b']
+    cache.put(ctr_validator.crossref_work_url(dois[0]), ctr_validator.FetchResponse(
+        200, {}, json.dumps({'message': {'DOI': dois[0]}})))
+    batch = {'message': {'items': [{'DOI': doi} for doi in dois[1:]]}}
+    requested = []
+
+    def fetch(request):
+        requested.append(request)
+        return ctr_validator.FetchResponse(200, {}, json.dumps(batch))
+
+    ctr_validator.set_metadata_cache(cache)
+    try:
+        found = ctr_validator._drive(ctr_validator._prefetch_doi_steps(dois), fetch)
+    finally:
+        ctr_validator.set_metadata_cache(None)
+    assert sorted(found) == sorted(dois)
+    assert len(requested) == 1 and not requested[0].cache
+    assert (cache.hits, cache.misses) == (1, 0)
+    # Only the per-DOI entries are stored, never the batch response
+    assert sorted(key for key, _ in cache.items()) == sorted(ctr_validator.crossref_work_url(doi) for doi in dois)
@@ -0,0 +1,118 @@
+"""
+Tests for checkpointed batch jobs and --resume.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import ctr_validator
+import mock_api
+
+
+def _lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_interrupted_job_resumes_where_it_stopped():
+    api = mock_api.MockApi(latency=0.002)
+    with mock_api.MockApiServer(api) as server, tempfile.TemporaryDirectory() as folder:
+        server.install()
+        path = os.path.join(folder, 'job.ndjson')
+        refs = mock_api.synthetic_references(api, server.base('web'), 120, seed=7, duplicates=0)
+        checkpoint = ctr_validator.Checkpoint(path)
+        outcomes = ctr_validator.stream_references(refs, workers=4, checkpoint=checkpoint)
+        seen = [next(outcomes) for _ in range(30)]
+        # Interrupted: the queued verifications are dropped, and everything
+        # yielded is recorded
+        outcomes.close()
+        checkpoint.close()
+        saved = _lines(path)
+        assert len(saved) >= len(seen)
+        assert {entry['reference'] for entry in saved} >= {outcome[1] for outcome in seen}
+        with open(path, 'ab') as f:
+            f.write(b'{"fingerprint": "torn')
+
+        api.reset_counts()
+        checkpoint = ctr_validator.Checkpoint(path, resume=True)
+        resumed = list(ctr_validator.stream_references(refs, workers=4, checkpoint=checkpoint))
+        checkpoint.close()
+        assert checkpoint.resumed == len(saved)
+        assert [outcome[1] for outcome in resumed] == refs
+        assert [outcome[1:] for outcome in resumed[:30]] == [outcome[1:] for outcome in seen]
+        # Only the references missing from the checkpoint were fetched
+        assert sum(api.calls.values()) <= 2 * (len(refs) - len(saved))
+        assert sorted(entry['reference'] for entry in _lines(path)) == sorted(refs)
+
+
+def test_fsync_is_batched():
+    ref = "Smith, J.A., (2020) 'Good Paper', J Good, 1(2), pp. 3-4. doi:10.1000/abc."
+    parsed = ctr_validator.parse_reference(ref)
+    ctr_result = ctr_validator.validate_ctr_format(parsed)
+    ver_result = ctr_validator.VerificationResult([], [], None, 'No')
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'job.ndjson')
+        checkpoint = ctr_validator.Checkpoint(path, sync_every=10, sync_interval=3600)
+        syncs = []
+        sync = checkpoint._sync
+        checkpoint._sync = lambda: (syncs.append(1), sync())
+        for i in range(25):
+            checkpoint.record(f"{ref} {i}", parsed, ctr_result, ver_result)
+        checkpoint.record(f"{ref} 0", parsed, ctr_result, ver_result)
+        # Written lines are readable before any fsync
+        assert len(_lines(path)) == 25 and len(syncs) == 2
+        checkpoint.close()
+        assert len(syncs) == 3
+        assert ctr_validator.Checkpoint(path).completed == {}
+        assert os.path.getsize(path) == 0
+
+
+def test_timed_out_references_are_verified_again():
+    refs = [f"Smith, J.A., (2020) 'Paper {n}', J Good, 1(2), pp. 3-4. doi:10.1000/{n}." for n in range(3)]
+    verdicts = {refs[0]: 'Yes', refs[1]: ctr_validator.TIMED_OUT, refs[2]: 'No'}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'job.ndjson')
+        checkpoint = ctr_validator.Checkpoint(path)
+        for ref in refs:
+            parsed = ctr_validator.parse_reference(ref)
+            checkpoint.record(ref, parsed, ctr_validator.validate_ctr_format(parsed),
+                              ctr_validator.VerificationResult([], [], None, verdicts[ref]))
+        checkpoint.close()
+        assert [entry['reference'] for entry in _lines(path)] == [refs[0], refs[2]]
+        # An older checkpoint may still hold one
+        with open(path, 'ab') as f:
+            entry = dict(_lines(path)[0], fingerprint=ctr_validator.reference_fingerprint(refs[1]), reference=refs[1])
+            entry['verification'] = dict(entry['verification'], verified=ctr_validator.TIMED_OUT)
+            f.write((json.dumps(entry) + '\n').encode('utf-8'))
+        checkpoint = ctr_validator.Checkpoint(path, resume=True)
+        try:
+            assert all(isinstance(offset, int) for offset in checkpoint.completed.values())
+            assert checkpoint.lookup(refs[0])[2]['verified'] == 'Yes'
+            assert checkpoint.lookup(refs[1]) is None
+            assert checkpoint.lookup(refs[2])[2]['verified'] == 'No'
+        finally:
+            checkpoint.close()
+
+
+def test_closing_the_stream_drops_queued_verifications(monkeypatch):
+    started = []
+    release = threading.Event()
+
+    def verify_source(parsed, debug=False, prefetched=None):
+        started.append(parsed['doi'])
+        if len(started) > 1:
+            release.wait(2)
+        return ctr_validator.VerificationResult([], [], None, 'Yes')
+
+    monkeypatch.setattr(ctr_validator, 'verify_source', verify_source)
+    refs = [f"Smith, J.A., (2020) 'Paper {n}', J Good, 1(2), pp. 3-4. doi:10.1000/{n}." for n in range(40)]
+    outcomes = ctr_validator.stream_references(refs, workers=1, batch_dois=False, dedupe=False)
+    assert next(outcomes)[1] == refs[0]
+    start = time.monotonic()
+    outcomes.close()
+    # Waiting on the queue would take 2 s per reference
+    assert time.monotonic() - start < 1.0
+    release.set()
+    assert len(started) <= 2
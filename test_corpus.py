@@ -0,0 +1,86 @@
+"""
+Tests for the multi-process corpus format audit.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+import ctr_validator
+import mock_api
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _write_corpus(folder):
+    refs = mock_api.synthetic_references(mock_api.MockApi(), 'http://web', 300, seed=11)
+    os.makedirs(os.path.join(folder, 'theses', 'nested'))
+    paths = []
+    for i in range(4):
+        path = os.path.join(folder, 'theses', 'nested' if i % 2 else '', f"thesis{i}.txt")
+        # CRLF line ends, blank lines and multi-byte characters around chunk boundaries
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write('\r\n\r\n'.join(ref.replace('Smith', 'Smîth') if j % 7 == 0 else ref
+                                    for j, ref in enumerate(refs[i * 75:(i + 1) * 75])) + '\r\n')
+        paths.append(path)
+    with open(os.path.join(folder, 'theses', 'notes.md'), 'w', encoding='utf-8') as f:
+        f.write('not a reference list\n')
+    return sorted(paths)
+
+
+def _expected(path):
+    counts = Counter()
+    reasons = Counter()
+    for _, parsed, ctr_result in ctr_validator.validate_references(ctr_validator.iter_references_from_file(path)):
+        counts['references'] += 1
+        counts['valid'] += ctr_result.valid
+        reasons.update(ctr_result.reasons)
+    return counts['references'], counts['valid'], reasons
+
+
+def test_tasks_cover_files_on_line_boundaries():
+    with tempfile.TemporaryDirectory() as folder:
+        paths = _write_corpus(folder)
+        assert ctr_validator.corpus_files([os.path.join(folder, 'theses')]) == paths
+        segments = [segment for task in ctr_validator.corpus_tasks(paths, 1000) for segment in task]
+        for path in paths:
+            ranges = [(start, stop) for name, start, stop in segments if name == path]
+            assert ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(path)
+            assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+            with open(path, 'rb') as f:
+                data = f.read()
+            assert all(data[stop - 1:stop] == b'\n' for _, stop in ranges)
+        assert len(segments) > len(paths)
+
+
+def test_parallel_counts_match_a_sequential_pass():
+    with tempfile.TemporaryDirectory() as folder:
+        paths = _write_corpus(folder)
+        audit = ctr_validator.audit_corpus([os.path.join(folder, 'theses')], workers=2, chunk_bytes=2048)
+        assert sorted(audit['files']) == paths
+        expected_total = Counter()
+        for path in paths:
+            references, valid, reasons = _expected(path)
+            counts = audit['files'][path]
+            assert (counts['references'], counts['valid'], counts['reasons']) == (references, valid, reasons)
+            expected_total.update(reasons)
+        assert audit['total']['reasons'] == expected_total
+        assert audit['total']['references'] == 300 and audit['total']['types']['journal'] > 0
+        assert audit['throughput']['workers'] == 2 and audit['throughput']['tasks'] > 4
+        single = ctr_validator.audit_corpus(paths, workers=1)
+        assert single['total'] == audit['total']
+
+
+def test_cli_ndjson():
+    with tempfile.TemporaryDirectory() as folder:
+        paths = _write_corpus(folder)
+        result = subprocess.run([sys.executable, os.path.join(HERE, 'ctr_validator.py'), 'corpus', '-j', '2',
+                                 '--format', 'ndjson', os.path.join(folder, 'theses')],
+                                capture_output=True, text=True, encoding='utf-8', timeout=60)
+    assert result.returncode == 0, result.stderr
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [line['file'] for line in lines[:-1]] == paths
+    assert lines[-1]['total']['files'] == 4 and lines[-1]['total']['references'] == 300
+    assert lines[-1]['throughput']['references_per_second'] > 0
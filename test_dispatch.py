@@ -0,0 +1,174 @@
+"""
+Tests for the verifier provider registry and the sequential/race dispatcher.
+"""
+import asyncio
+import threading
+import time
+
+import ctr_validator
+
+BOOK = ctr_validator.parse_reference(
+    "Sommerville, I., (2011) Software engineering. America: Pearson Education Inc. ISBN 0137035151")
+# 'slow' is far beyond the others so the elapsed-time checks hold on a loaded machine
+DELAYS = {'slow': 1.0, 'fast': 0.05, 'miss': 0.01}
+
+
+def _steps(url, verdict):
+    def steps(parsed, debug, record):
+        r = yield url
+        return ctr_validator.VerificationResult([f"Checked {url}."], [f"HTTP {r.status_code}"], None, verdict)
+    return steps
+
+
+def _fetch(request):
+    time.sleep(DELAYS[getattr(request, 'url', request)])
+    return ctr_validator.FetchResponse(200, {}, '')
+
+
+async def _async_fetch(request):
+    await asyncio.sleep(DELAYS[getattr(request, 'url', request)])
+    return ctr_validator.FetchResponse(200, {}, '')
+
+
+def _with_providers(*providers):
+    saved = dict(ctr_validator._PROVIDERS)
+    ctr_validator._PROVIDERS.clear()
+    for provider in providers:
+        ctr_validator.register_provider(provider)
+    return saved
+
+
+def _restore(saved):
+    ctr_validator._PROVIDERS.clear()
+    ctr_validator._PROVIDERS.update(saved)
+
+
+def test_builtin_providers_follow_reference_shape():
+    names = [p.name for p in ctr_validator.providers_for(BOOK)]
+    assert names == ['openlibrary_isbn', 'openlibrary_search']
+    no_doi = ctr_validator.parse_reference(
+        "Smith, J.A., (2020) 'The Future of AI', Journal of Advanced Robotics, 15(2), pp. 123-145.")
+    assert [p.name for p in ctr_validator.providers_for(no_doi)] == ['openalex_search']
+
+
+def test_sequential_stops_at_first_yes():
+    saved = _with_providers(
+        ctr_validator.VerifierProvider('a', ['book'], _steps('miss', 'No'), priority=1),
+        ctr_validator.VerifierProvider('b', ['book'], _steps('fast', 'Yes'), priority=2),
+        ctr_validator.VerifierProvider('c', ['book'], _steps('slow', 'Yes'), priority=3))
+    try:
+        result = ctr_validator._drive(ctr_validator._verify_steps(BOOK, dispatch='sequential'), _fetch)
+    finally:
+        _restore(saved)
+    assert result['verified'] == 'Yes'
+    assert result['checks'] == ["Identified reference type: Book.", "Checked miss.", "Checked fast."]
+
+
+def test_race_takes_first_conclusive_answer():
+    saved = _with_providers(
+        ctr_validator.VerifierProvider('slow', ['book'], _steps('slow', 'Yes'), priority=1),
+        ctr_validator.VerifierProvider('miss', ['book'], _steps('miss', 'No'), priority=2),
+        ctr_validator.VerifierProvider('fast', ['book'], _steps('fast', 'Yes'), priority=3))
+    try:
+        start = time.perf_counter()
+        result = ctr_validator._drive(ctr_validator._verify_steps(BOOK, dispatch='race'), _fetch)
+        sync_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        async_result = asyncio.run(ctr_validator._drive_async(
+            ctr_validator._verify_steps(BOOK, dispatch='race'), _async_fetch))
+        async_elapsed = time.perf_counter() - start
+    finally:
+        _restore(saved)
+    for res, elapsed in ((result, sync_elapsed), (async_result, async_elapsed)):
+        assert res['verified'] == 'Yes'
+        assert elapsed < DELAYS['slow']
+        # The abandoned slow provider reports nothing; the rest keep provider order
+        assert res['checks'] == ["Identified reference type: Book.", "Checked miss.", "Checked fast."]
+
+
+def test_reference_budget_reports_timeout():
+    saved = _with_providers(
+        ctr_validator.VerifierProvider('slow', ['book'], _steps('slow', 'Yes'), priority=1),
+        ctr_validator.VerifierProvider('fast', ['book'], _steps('fast', 'Yes'), priority=2))
+    ctr_validator.set_latency_budgets(reference=0.15)
+    try:
+        start = time.perf_counter()
+        result = ctr_validator._drive(ctr_validator._verify_steps(BOOK, dispatch='sequential'), _fetch)
+        elapsed = time.perf_counter() - start
+        async_result = asyncio.run(ctr_validator._drive_async(
+            ctr_validator._verify_steps(BOOK, dispatch='sequential'), _async_fetch))
+    finally:
+        ctr_validator.set_latency_budgets()
+        _restore(saved)
+    assert elapsed < DELAYS['slow']
+    for res in (result, async_result):
+        assert res['verified'] == ctr_validator.TIMED_OUT
+        assert any('time budget' in d for d in res['details'])
+
+
+def test_provider_budget_moves_on_to_next_provider():
+    saved = _with_providers(
+        ctr_validator.VerifierProvider('slow', ['book'], _steps('slow', 'Yes'), priority=1, budget=0.1),
+        ctr_validator.VerifierProvider('fast', ['book'], _steps('fast', 'Yes'), priority=2))
+    try:
+        result = ctr_validator._drive(ctr_validator._verify_steps(BOOK, dispatch='sequential'), _fetch)
+    finally:
+        _restore(saved)
+    assert result['verified'] == 'Yes'
+    assert result['checks'][-1] == "Checked fast."
+
+
+def test_hedged_request_beats_slow_primary():
+    url = 'http://hedge.test/x'
+    calls = []
+
+    def fetch(request):
+        calls.append(request)
+        time.sleep(1.0 if len(calls) == 1 else 0.01)
+        return ctr_validator.FetchResponse(200, {}, 'ok')
+
+    saved_tracker = ctr_validator._latency
+    ctr_validator._latency = ctr_validator.LatencyTracker()
+    for _ in range(ctr_validator.HEDGE_MIN_SAMPLES):
+        ctr_validator._latency.record(url, 0.02)
+    metrics = ctr_validator.Metrics()
+    ctr_validator.set_metrics(metrics)
+    ctr_validator.set_hedging(True)
+    try:
+        start = time.perf_counter()
+        response = ctr_validator._fetch_timed(fetch, url)
+        elapsed = time.perf_counter() - start
+    finally:
+        ctr_validator.set_hedging(False)
+        ctr_validator.set_metrics(None)
+        ctr_validator._latency = saved_tracker
+    assert response.text == 'ok'
+    assert len(calls) == 2
+    assert elapsed < 0.5
+    assert metrics.snapshot()['counters'] == {'hedged_requests': 1}
+
+
+def test_fetch_pool_holds_every_worker_under_a_deadline():
+    # With more concurrent requests than FETCH_POOL_SIZE threads, the queued
+    # ones would spend their budget waiting for a thread
+    workers = 3 * ctr_validator.FETCH_POOL_SIZE
+
+    def fetch(request):
+        time.sleep(0.5)
+        return ctr_validator.FetchResponse(200, {}, 'ok')
+
+    def verify(results):
+        request = ctr_validator.FetchRequest('http://slow.test/x', deadline=time.monotonic() + 1.2)
+        results.append(ctr_validator._fetch_timed(fetch, request))
+
+    ctr_validator.set_fetch_pool_size(workers)
+    try:
+        results = []
+        threads = [threading.Thread(target=verify, args=(results,)) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        ctr_validator.set_fetch_pool_size(ctr_validator.FETCH_POOL_SIZE)
+    assert [getattr(result, 'text', result) for result in results] == ['ok'] * workers
@@ -0,0 +1,134 @@
+"""
+Tests for the local DOI/ISBN metadata index.
+"""
+import gzip
+import json
+import os
+import tempfile
+
+import ctr_validator
+
+CROSSREF_WORK = {'DOI': '10.1000/ABC', 'title': ['Good Paper'], 'author': [{'family': 'Smith', 'given': 'John'}],
+                 'container-title': ['J Good'], 'volume': '1', 'issue': '2', 'page': '3-4',
+                 'reference': [{'key': 'r1'}]}
+OPENALEX_WORK = {'doi': 'https://doi.org/10.1000/abc', 'title': 'Good Paper (OpenAlex)',
+                 'authorships': [{'author': {'display_name': 'John Smith'}}]}
+OPENALEX_ONLY = {'doi': 'https://doi.org/10.2000/xyz', 'title': 'Only In OpenAlex',
+                 'authorships': [{'author': {'display_name': 'Ann Lee'}}],
+                 'primary_location': {'source': {'display_name': 'J Other'}},
+                 'biblio': {'volume': '7', 'issue': '1', 'first_page': '10', 'last_page': '20'},
+                 'abstract_inverted_index': {'Hello': [0], 'world': [1]}}
+EDITION = {'key': '/books/OL1M', 'title': 'Software engineering', 'authors': [{'key': '/authors/OL1A'}],
+           'publishers': ['Pearson'], 'publish_date': '2011', 'isbn_10': ['0-13-703515-1']}
+BOOK = ctr_validator.parse_reference(
+    "Sommerville, I., (2011) Software engineering. America: Pearson Education Inc. ISBN 0137035151")
+JOURNAL = ctr_validator.parse_reference(
+    "Smith, J.A., (2020) 'Good Paper', J Good, 1(2), pp. 3-4. doi:10.1000/abc.")
+
+
+def _offline(request):
+    raise AssertionError(f"unexpected request for {getattr(request, 'url', request)}")
+
+
+def _write_snapshots(folder):
+    folder = os.path.join(folder, 'snapshots')
+    os.mkdir(folder)
+    with gzip.open(os.path.join(folder, 'crossref.jsonl.gz'), 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(CROSSREF_WORK) + '\n')
+    with open(os.path.join(folder, 'openalex.jsonl'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(OPENALEX_WORK) + '\n' + 'not json\n' + json.dumps(OPENALEX_ONLY) + '\n')
+    with open(os.path.join(folder, 'ol_dump_editions.txt'), 'w', encoding='utf-8') as f:
+        f.write('\t'.join(['/type/edition', '/books/OL1M', '3', '2020-01-01', json.dumps(EDITION)]) + '\n')
+    return folder
+
+
+def test_isbn_forms_pair_isbn10_and_isbn13():
+    assert ctr_validator.isbn_forms('0-13-703515-1') == ['0137035151', '9780137035151']
+    assert ctr_validator.isbn_forms('9780804429573') == ['9780804429573', '080442957X']
+    assert ctr_validator.isbn_forms('9791234567896') == ['9791234567896']
+
+
+def test_snapshots_load_into_index():
+    with tempfile.TemporaryDirectory() as folder:
+        snapshots = _write_snapshots(folder)
+        index = ctr_validator.MetadataIndex(os.path.join(folder, 'index.sqlite3'))
+        loaded = dict(index.load(snapshots))
+        assert sorted(os.path.basename(path) for path in loaded) == [
+            'crossref.jsonl.gz', 'ol_dump_editions.txt', 'openalex.jsonl']
+        # CrossRef outranks OpenAlex for the same DOI whatever the load order
+        work = index.crossref_work('10.1000/Abc')
+        assert work['title'] == ['Good Paper']
+        assert 'reference' not in work
+        other = index.crossref_work('10.2000/XYZ')
+        assert other['author'] == [{'family': 'Lee', 'given': 'Ann'}]
+        assert other['page'] == '10-20'
+        assert other['abstract'] == 'Hello world'
+        assert index.edition('0137035151')['title'] == 'Software engineering'
+        assert index.edition('978-0-13-703515-1')['publishers'] == ['Pearson']
+        assert index.stats() == {'dois': 2, 'isbns': 2, 'sources': 3}
+        index.close()
+
+
+def test_verification_reads_index_without_network():
+    with tempfile.TemporaryDirectory() as folder:
+        index = ctr_validator.MetadataIndex(os.path.join(folder, 'index.sqlite3'))
+        index.load(_write_snapshots(folder))
+        ctr_validator.set_metadata_index(index)
+        try:
+            book = ctr_validator._drive(ctr_validator._verify_steps(BOOK), _offline)
+            journal = ctr_validator._drive(ctr_validator._verify_steps(JOURNAL), _offline)
+            prefetched = ctr_validator._drive(ctr_validator._prefetch_doi_steps(['10.1000/abc', '10.2000/xyz']),
+                                              _offline)
+        finally:
+            ctr_validator.set_metadata_index(None)
+            index.close()
+    assert book['verified'] == 'Yes'
+    assert book['details'][0] == "ISBN verified: 'Software engineering' by [{'key': '/authors/OL1A'}]."
+    assert journal['verified'] == 'Yes'
+    assert journal['details'][0] == "DOI resolved successfully to 'Good Paper' by Smith, J.."
+    assert sorted(prefetched) == ['10.1000/abc', '10.2000/xyz']
+
+
+def test_refresh_reloads_changed_files_and_cache():
+    with tempfile.TemporaryDirectory() as folder:
+        snapshot = os.path.join(folder, 'works.jsonl')
+        with open(snapshot, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(CROSSREF_WORK) + '\n')
+        index = ctr_validator.MetadataIndex(os.path.join(folder, 'index.sqlite3'))
+        index.load(snapshot)
+        assert index.refresh() == []
+        with open(snapshot, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(CROSSREF_WORK, DOI='10.1000/new')) + '\n')
+        assert index.refresh() == [(os.path.abspath(snapshot), 2)]
+        assert index.crossref_work('10.1000/new') is not None
+        # Responses cached by earlier verification runs
+        cache = ctr_validator.MetadataCache(':memory:')
+        cache.put('https://openlibrary.org/books/OL1M.json',
+                  ctr_validator.FetchResponse(200, {}, json.dumps(EDITION)))
+        cache.put('https://api.crossref.org/works/10.3000/c', ctr_validator.FetchResponse(
+            200, {}, json.dumps({'message': dict(CROSSREF_WORK, DOI='10.3000/C')})))
+        cache.put('https://example.com/page', ctr_validator.FetchResponse(200, {}, json.dumps(EDITION)),
+                  ttl=3600)
+        assert index.load_cache(cache) == 3
+        assert index.crossref_work('10.3000/c')['DOI'] == '10.3000/C'
+        assert index.edition('0137035151') is not None
+        cache.close()
+        index.close()
+
+
+def test_cache_load_covers_configured_api_bases():
+    mirror = 'http://127.0.0.1:8001'
+    cache = ctr_validator.MetadataCache(':memory:')
+    cache.put(mirror + '/works/10.3000/m', ctr_validator.FetchResponse(
+        200, {}, json.dumps({'message': dict(CROSSREF_WORK, DOI='10.3000/M')})))
+    with tempfile.TemporaryDirectory() as folder:
+        index = ctr_validator.MetadataIndex(os.path.join(folder, 'index.sqlite3'))
+        assert index.load_cache(cache) == 0
+        ctr_validator.set_api_base('crossref', mirror)
+        try:
+            assert index.load_cache(cache) == 1
+        finally:
+            ctr_validator.set_api_base('crossref', None)
+        assert index.crossref_work('10.3000/m')['DOI'] == '10.3000/M'
+        index.close()
+    cache.close()
@@ -0,0 +1,73 @@
+"""
+Tests for incremental runs against a run manifest.
+"""
+import json
+import os
+import tempfile
+
+import ctr_validator
+import mock_api
+
+
+def _check(refs, path, api):
+    manifest = ctr_validator.RunManifest(path)
+    api.reset_counts()
+    outcomes = list(ctr_validator.stream_references(refs, workers=4, manifest=manifest))
+    manifest.save()
+    return manifest, outcomes, sum(api.calls.values())
+
+
+def test_resubmission_only_checks_changed_lines():
+    api = mock_api.MockApi()
+    with mock_api.MockApiServer(api) as server, tempfile.TemporaryDirectory() as folder:
+        server.install()
+        path = os.path.join(folder, 'run.manifest.json')
+        refs = mock_api.synthetic_references(api, server.base('web'), 60, seed=5, duplicates=0)
+        manifest, first, calls = _check(refs, path, api)
+        assert manifest.reused == 0 and calls > 0
+
+        # Unchanged resubmission: nothing is fetched and the report is identical
+        manifest, again, calls = _check(refs, path, api)
+        assert manifest.reused == 60 and calls == 0
+        assert [outcome[1:] for outcome in again] == [outcome[1:] for outcome in first]
+
+        # Two lines edited, one only re-spaced, one removed, one added
+        edited = list(refs)
+        edited[3] = edited[3].replace('(20', '(19', 1)
+        edited[10] = edited[10].replace(',', ' ,', 1)
+        edited[11] = ' ' + edited[11] + ' '
+        del edited[20]
+        edited.append(mock_api.synthetic_references(api, server.base('web'), 1, seed=6)[0])
+        manifest, revised, calls = _check(edited, path, api)
+        assert manifest.reused == 58
+        assert [outcome[1] for outcome in revised] == edited
+        with open(path, encoding='utf-8') as f:
+            assert len(json.load(f)['entries']) == len(set(edited))
+
+
+def test_timeouts_and_other_versions_are_not_reused():
+    ref = "Smith, J.A., (2020) 'Good Paper', J Good, 1(2), pp. 3-4. doi:10.1000/abc."
+    parsed = ctr_validator.parse_reference(ref)
+    ctr_result = ctr_validator.validate_ctr_format(parsed)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'manifest.json')
+        manifest = ctr_validator.RunManifest(path)
+        manifest.record(ref, parsed, ctr_result,
+                        ctr_validator.VerificationResult([], [], None, ctr_validator.TIMED_OUT))
+        manifest.save()
+        assert ctr_validator.RunManifest(path).lookup(ref) is None
+
+        manifest = ctr_validator.RunManifest(path)
+        manifest.record(ref, parsed, ctr_result, ctr_validator.VerificationResult(['c'], ['d'], 'link', 'Yes', 1.0))
+        manifest.save()
+        reused = ctr_validator.RunManifest(path).lookup(' ' + ref + '\n')
+        assert reused == (parsed, ctr_result, {'checks': ['c'], 'details': ['d'], 'clickable_link': 'link',
+                                               'verified': 'Yes', 'match_score': 1.0})
+        assert ctr_validator.RunManifest(path, max_age=0).lookup(ref) is None
+
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        data['version'] = ctr_validator.MANIFEST_VERSION + 1
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        assert ctr_validator.RunManifest(path).lookup(ref) is None
@@ -0,0 +1,93 @@
+"""
+Tests for ranking search candidates against a parsed reference.
+"""
+import json
+import time
+
+import ctr_validator
+
+RUGBY = ctr_validator.parse_reference(
+    "Browne, T.B., Carlson, T.B. and Hastie, P.A., (2004) 'A comparison of rugby seasons presented in "
+    "traditional and sport education formats', European Physical Education Review, 10(2), pp.199-214.")
+
+
+def _openalex(title, author, year):
+    return {'title': title, 'authorships': [{'author': {'display_name': author}}], 'publication_year': year}
+
+
+def test_exact_match_scores_full_marks():
+    profile = ctr_validator.MatchProfile(RUGBY)
+    score = profile.score("A Comparison of Rugby Seasons Presented in Traditional and Sport Education Formats",
+                          ["Tristan B. Browne"], [2004])
+    assert score == 1.0
+
+
+def test_cosmetic_differences_still_match():
+    profile = ctr_validator.MatchProfile(RUGBY)
+    # Typographic punctuation, a dropped article and a subtitle on the candidate
+    score = profile.score("Comparison of rugby seasons presented in traditional and sport-education formats: a study",
+                          ["T. Browne", "P. Hastie"], [2004])
+    assert score >= ctr_validator.MATCH_THRESHOLD
+
+
+def test_wrong_author_or_title_falls_below_threshold():
+    profile = ctr_validator.MatchProfile(RUGBY)
+    assert profile.score("Rugby union injury rates in schools", ["T. Browne"], [2004]) < ctr_validator.MATCH_THRESHOLD
+    assert profile.score(RUGBY['title'], ["J. Smith"], [2015]) < ctr_validator.MATCH_THRESHOLD
+
+
+def test_right_title_and_year_with_wrong_author_is_not_a_match():
+    profile = ctr_validator.MatchProfile(RUGBY)
+    assert profile.score(RUGBY['title'], ["J. Smith"], [2004]) < ctr_validator.MATCH_THRESHOLD
+    assert profile.score(RUGBY['title'], [], [2004]) < ctr_validator.MATCH_THRESHOLD
+    # Through the search provider: the best candidate is only a partial match
+    results = [_openalex(RUGBY['title'], "J. Smith", 2004)]
+    steps = ctr_validator._openalex_search_steps(RUGBY, False, ctr_validator.MetadataRecord())
+    response = ctr_validator.FetchResponse(200, {}, json.dumps({'meta': {'count': 1}, 'results': results}))
+    verdict = ctr_validator._drive(steps, lambda request: response)
+    assert verdict['verified'] == 'Partial'
+
+
+def test_search_match_leaves_the_parsed_reference_alone():
+    match = dict(_openalex(RUGBY['title'], "T. Browne", 2004), doi='https://doi.org/10.1000/Rugby')
+    search = ctr_validator.FetchResponse(200, {}, json.dumps({'meta': {'count': 1}, 'results': [match]}))
+    work = ctr_validator.FetchResponse(200, {}, json.dumps({'message': {'title': [RUGBY['title']]}}))
+    requested = []
+
+    def fetch(request):
+        requested.append(request)
+        return search if len(requested) == 1 else work
+
+    steps = ctr_validator._openalex_search_steps(RUGBY, False, ctr_validator.MetadataRecord())
+    verdict = ctr_validator._drive(steps, fetch)
+    assert verdict['verified'] == 'Yes' and verdict['clickable_link'] == match['doi']
+    # The found DOI is looked up for its abstract, but duplicate lines share RUGBY
+    assert requested[1].endswith('/works/10.1000/Rugby')
+    assert verdict['details'][-1] == "Abstract not available for this DOI."
+    assert not RUGBY.get('doi')
+
+
+def test_rank_puts_best_candidate_first():
+    results = [_openalex("Something else", "A B", 2020),
+               _openalex(None, "Nobody", None),
+               _openalex(RUGBY['title'], "T. Browne", 2004)]
+    ranked = ctr_validator.rank_openalex(ctr_validator.MatchProfile(RUGBY), results)
+    assert ranked[0][1] is results[2]
+    assert [score for score, _ in ranked] == sorted((score for score, _ in ranked), reverse=True)
+
+
+def test_book_candidates_use_any_edition_year():
+    book = ctr_validator.parse_reference(
+        "Sommerville, I., (2011) Software engineering. America: Pearson Education Inc. ISBN 0137035151")
+    docs = [{'title': 'Software Engineering', 'author_name': ['Ian Sommerville'], 'publish_year': [1982, 2011, 2015]}]
+    score, doc = ctr_validator.rank_openlibrary(ctr_validator.MatchProfile(book), docs)[0]
+    assert score == 1.0 and doc is docs[0]
+
+
+def test_hundreds_of_candidates_rank_quickly():
+    results = [_openalex(f"A study of rugby {i}", "A B", 2000 + i % 20) for i in range(500)]
+    profile = ctr_validator.MatchProfile(RUGBY)
+    start = time.perf_counter()
+    ctr_validator.rank_openalex(profile, results)
+    # About 10 ms; a quadratic ranking would take seconds
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,97 @@
+"""
+Tests for run instrumentation: stage/provider timers, HTTP accounting and exports.
+"""
+import json
+import os
+import re
+import tempfile
+
+import ctr_validator
+import mock_api
+
+PROMETHEUS_LINE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [0-9.e+-]+$')
+
+
+def _run(count, metrics, dispatch='sequential'):
+    api = mock_api.MockApi()
+    ctr_validator.set_metrics(metrics)
+    ctr_validator.set_dispatch_mode(dispatch)
+    try:
+        with mock_api.MockApiServer(api) as server:
+            server.install()
+            refs = mock_api.synthetic_references(api, server.base('web'), count, seed=3)
+            outcomes = list(ctr_validator.stream_references(refs, workers=4))
+    finally:
+        ctr_validator.set_metrics(None)
+        ctr_validator.set_dispatch_mode('sequential')
+    return api, outcomes
+
+
+def test_stages_providers_and_hosts_are_counted():
+    metrics = ctr_validator.Metrics()
+    api, outcomes = _run(80, metrics)
+    data = metrics.snapshot()
+    assert data['stages']['parse']['count'] == 80
+    assert data['stages']['validate']['count'] == 80
+    # Deduplicated references share one verification result object
+    verified = list({id(ver): ver for *_, ver in outcomes}.values())
+    assert data['stages']['verify']['count'] == len(verified)
+    provider_yes = sum(timer['verdicts'].get('Yes', 0) for timer in data['providers'].values())
+    assert provider_yes == sum(1 for ver in verified if ver['verified'] == 'Yes')
+    # Every request the mock saw was accounted to its host
+    assert sum(timer['count'] for timer in data['http'].values()) == sum(api.calls.values())
+    assert all(timer['bytes'] > 0 for timer in data['http'].values())
+    # Cited pages share one series however many sites they are on
+    assert ctr_validator.OTHER_HOSTS in data['http'] and len(data['http']) <= len(ctr_validator.API_BASES) + 1
+    statuses = {status for timer in data['http'].values() for status in timer['statuses']}
+    assert statuses <= {'200', '404'}
+    # Nothing is hedged unless --hedge is given
+    assert data['cache'] is None and 'hedged_requests' not in data['counters']
+
+
+def test_race_reports_cancelled_providers():
+    metrics = ctr_validator.Metrics()
+    _run(40, metrics, dispatch='race')
+    verdicts = {verdict for timer in metrics.snapshot()['providers'].values() for verdict in timer['verdicts']}
+    assert 'Yes' in verdicts
+    assert verdicts <= {'Yes', 'No', 'Partial', 'cancelled'}
+
+
+def test_exports_and_profile():
+    metrics = ctr_validator.Metrics()
+    _run(30, metrics)
+    metrics.count('references', 30)
+    text = metrics.prometheus()
+    samples = [line for line in text.splitlines() if not line.startswith('#')]
+    assert samples and all(PROMETHEUS_LINE.match(line) for line in samples), text
+    assert 'ctr_events_total{event="references"} 30' in samples
+    parse_buckets = [line for line in samples if line.startswith('ctr_stage_seconds_bucket{stage="parse"')]
+    assert parse_buckets[-1].endswith(' 30')
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'metrics.json')
+        metrics.write(path)
+        with open(path, encoding='utf-8') as f:
+            assert json.load(f)['stages']['parse']['count'] == 30
+    profile = metrics.format_profile()
+    assert '--- Profile ---' in profile and 'Providers:' in profile and 'HTTP:' in profile
+
+
+def test_fetches_are_recorded_only_while_metrics_are_installed():
+    api = mock_api.MockApi()
+    metrics = ctr_validator.Metrics()
+    with mock_api.MockApiServer(api) as server:
+        base = server.base('web')
+        for path in ('/before', '/during', '/after'):
+            api.add_url(base + path, 200, 'page')
+        ctr_validator.fetch_url(base + '/before')
+        ctr_validator.set_metrics(metrics)
+        try:
+            ctr_validator.fetch_url(base + '/during')
+        finally:
+            ctr_validator.set_metrics(None)
+        ctr_validator.fetch_url(base + '/after')
+    assert api.calls['web'] == 3
+    data = metrics.snapshot()
+    assert data['http'][ctr_validator.OTHER_HOSTS]['count'] == 1
+    assert data['http'][ctr_validator.OTHER_HOSTS]['bytes'] == len('page')
+    assert data['http'][ctr_validator.OTHER_HOSTS]['statuses'] == {'200': 1}
@@ -0,0 +1,159 @@
+"""
+Tests for the recorded-response mock API and the verification it drives.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+import ctr_validator
+import mock_api
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_synthetic_bibliography_verifies_offline():
+    api = mock_api.MockApi()
+    with mock_api.MockApiServer(api) as server:
+        server.install()
+        refs = mock_api.synthetic_references(api, server.base('web'), 60, seed=1, duplicates=0.2)
+        outcomes = list(ctr_validator.stream_references(refs, workers=4))
+    assert [idx for idx, *_ in outcomes] == list(range(60))
+    for _, ref, parsed, _, ver_result in outcomes:
+        expected = 'No' if parsed['type'] == 'unknown' or 'missing' in ref else 'Yes'
+        assert ver_result['verified'] == expected, ref
+    # Batched DOI lookups and deduplication keep this well under one call per line
+    assert 0 < sum(api.calls.values()) < len(refs) * 2
+    assert ctr_validator.crossref_work_url('10.1/x') == 'https://api.crossref.org/works/10.1/x'
+
+
+def test_dedupe_remembers_a_bounded_window(monkeypatch):
+    verified = []
+
+    def verify_source(parsed, debug=False, prefetched=None):
+        verified.append(parsed['doi'])
+        return ctr_validator.VerificationResult([], [], '', 'Yes')
+
+    monkeypatch.setattr(ctr_validator, 'verify_source', verify_source)
+    monkeypatch.setattr(ctr_validator, 'DEDUPE_WINDOW', 3)
+    refs = [f"Smith, J.A., (2020) 'Paper {n}', J Good, 1(2), pp. 3-4. doi:10.1000/{n}." for n in range(5)]
+    # 0 is cited again within the window and again after 1-4 pushed it out
+    order = [0, 1, 0, 2, 3, 4, 0]
+    outcomes = list(ctr_validator.stream_references([refs[n] for n in order], batch_dois=False))
+    assert [ver['verified'] for *_, ver in outcomes] == ['Yes'] * len(order)
+    assert verified == ['10.1000/0', '10.1000/1', '10.1000/2', '10.1000/3', '10.1000/4', '10.1000/0']
+
+
+def test_injected_faults_repeat_for_a_seed():
+    def fates(seed):
+        api = mock_api.MockApi(latency=0.01, tail=0.02, error_rate=0.2, drop_rate=0.1, seed=seed)
+        return [api.answer('crossref', 'GET', f"/works/10.1/{i % 50}")[1] is None or
+                api.answer('openalex', 'GET', f"/works?search=t{i}")[0] for i in range(500)]
+    assert fates(1) == fates(1)
+    assert fates(1) != fates(2)
+    api = mock_api.MockApi(error_rate=0.2, drop_rate=0.1)
+    statuses = [api.answer('crossref', 'GET', f"/works/10.1/{i}")[1] for i in range(1000)]
+    dropped = statuses.count(None)
+    errors = sum(1 for response in statuses if response is not None and response[0] in mock_api.ERROR_STATUSES)
+    assert 60 < dropped < 140 and 150 < errors < 250
+    assert api.injected == dropped + errors
+
+
+def test_expired_entries_are_revalidated():
+    api = mock_api.MockApi()
+    with mock_api.MockApiServer(api) as server:
+        url = server.base('web') + '/page'
+        dated = server.base('web') + '/dated'
+        api.add_url(url, 200, 'first', {'Content-Type': 'text/html', 'ETag': '"v1"'})
+        api.add_url(dated, 200, 'dated', {'Content-Type': 'text/html', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        # Every entry expires as soon as it is stored
+        cache = ctr_validator.MetadataCache(':memory:', ttl=0)
+        ctr_validator.set_metadata_cache(cache)
+        try:
+            assert ctr_validator.fetch_url(url).text == 'first'
+            # Unchanged: the server answers 304 and the stored body is used
+            response = ctr_validator.fetch_url(url)
+            assert response.status_code == 200 and response.text == 'first'
+            assert cache.revalidations == 1
+            ctr_validator.fetch_url(dated)
+            assert ctr_validator.fetch_url(dated).text == 'dated' and cache.revalidations == 2
+            # Changed: the new 200 replaces the entry and its validator
+            api.add_url(url, 200, 'second', {'Content-Type': 'text/html', 'ETag': '"v2"'})
+            assert ctr_validator.fetch_url(url).text == 'second'
+            assert cache.revalidations == 2
+            stale, conditional = cache.get_stale(url)
+            assert stale.text == 'second' and conditional == {'If-None-Match': '"v2"'}
+            assert api.calls['web'] == 5
+        finally:
+            ctr_validator.set_metadata_cache(None)
+            cache.close()
+
+
+def test_recordings_replay_through_cli():
+    work = {'DOI': '10.1000/Rec', 'title': ['Recorded Paper'], 'author': [{'family': 'Smith', 'given': 'John'}],
+            'container-title': ['J Rec'], 'volume': '1', 'issue': '2', 'page': '3-4'}
+    api = mock_api.MockApi()
+    with tempfile.TemporaryDirectory() as folder:
+        recordings = os.path.join(folder, 'recordings.jsonl')
+        with open(recordings, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'url': 'https://api.crossref.org/works/10.1000/rec', 'status': 200,
+                                'headers': {'Content-Type': 'application/json', 'Content-Length': '1'},
+                                'body': json.dumps({'status': 'ok', 'message': work})}) + '\n')
+        assert api.load(recordings) == 1
+        with mock_api.MockApiServer(api) as server:
+            bases = [arg for name in ctr_validator.API_BASES for arg in ('--api-base', f"{name}={server.base(name)}")]
+            result = subprocess.run(
+                [sys.executable, os.path.join(HERE, 'ctr_validator.py'), '--no-cache', '--no-index', '--format', 'ndjson',
+                 '-s', "Smith, J.A., (2020) 'Recorded Paper', J Rec, 1(2), pp. 3-4. doi:10.1000/REC."] + bases,
+                capture_output=True, text=True, encoding='utf-8', timeout=60)
+    assert result.returncode == 0, result.stderr
+    verification = json.loads(result.stdout)['verification']
+    assert verification['verified'] == 'Yes'
+    assert verification['details'][0] == "DOI resolved successfully to 'Recorded Paper' by Smith, J.."
+    assert api.calls['crossref'] == 1
+
+
+class _CountingApi(mock_api.MockApi):
+    # Holds each answer for hold seconds and records the most requests in
+    # flight at once to each provider
+    def __init__(self, hold):
+        super().__init__()
+        self.hold = hold
+        self.in_flight = dict.fromkeys(mock_api.PROVIDERS, 0)
+        self.peak = dict.fromkeys(mock_api.PROVIDERS, 0)
+        self._gauge = threading.Lock()
+
+    def answer(self, provider, method, path, headers=None):
+        with self._gauge:
+            self.in_flight[provider] += 1
+            self.peak[provider] = max(self.peak[provider], self.in_flight[provider])
+        time.sleep(self.hold)
+        with self._gauge:
+            self.in_flight[provider] -= 1
+        return super().answer(provider, method, path, headers)
+
+
+def test_async_verifier_caps_requests_per_host():
+    pytest.importorskip('aiohttp')
+    api = _CountingApi(hold=0.05)
+    with mock_api.MockApiServer(api) as server:
+        server.install()
+        refs = mock_api.synthetic_references(api, server.base('web'), 40, seed=2)
+        journals = [parsed for parsed in map(ctr_validator.parse_reference, refs)
+                    if parsed.get('doi') and 'missing' not in parsed['doi']]
+        results = asyncio.run(ctr_validator.async_verify_references(journals, per_host_limit=2, batch_dois=False))
+    assert len(journals) > 4
+    assert [result['verified'] for result in results] == ['Yes'] * len(journals)
+    assert api.calls['crossref'] == len(journals) and api.peak['crossref'] == 2
+
+
+def test_async_verifier_needs_aiohttp(monkeypatch):
+    monkeypatch.setattr(ctr_validator, '_optional', lambda name: None)
+    with pytest.raises(ImportError, match='aiohttp'):
+        asyncio.run(ctr_validator.async_verify_references([]))
@@ -0,0 +1,90 @@
+"""
+Stress tests for the reference parser: adversarial lines must be rejected (or
+parsed) quickly and never stall a worker.
+"""
+import time
+
+import ctr_validator
+
+# Per-reference wall-clock limit for lines up to MAX_REFERENCE_LENGTH. The
+# parser takes well under a millisecond on such lines; a backtracking pattern
+# would take seconds, so the limit can be loose enough for a loaded machine.
+TIME_LIMIT = 0.5
+
+
+def _fill(unit, prefix='', suffix=''):
+    # Repeat unit so the whole line is just under MAX_REFERENCE_LENGTH
+    room = ctr_validator.MAX_REFERENCE_LENGTH - len(prefix) - len(suffix)
+    return prefix + unit * (room // len(unit)) + suffix
+
+
+ADVERSARIAL_REFERENCES = {
+    # Author lists pasted from PDFs with no usable year or tail
+    'authors_no_year': _fill("Smith, J., ", suffix="'x', pp. 1-2 ("),
+    'authors_initials': _fill("Smith, J.B., ", suffix="(2004) 'x', pp. 1-2. : "),
+    'authors_bad_and': _fill("Smith, J.B., ", suffix="and Doe (2004) 'x' pp. 1-2. : "),
+    'authors_mixed_initials': _fill("Smith, J.B., Smith, J, ", suffix="(2004) 'x' pp. 1: a. b"),
+    # Many candidate title/journal splits with no complete tail
+    'journal_title_splits': _fill("a', 1(2), pp. 1-x", prefix="Smith, J.B., (2004) '"),
+    'journal_volume_runs': _fill("a', 1(2), ", prefix="Smith, J.B., (2004) '", suffix="pp."),
+    'journal_long_doi': _fill("x", prefix="Smith, J.B., (2004) 'a', J, 1(2), pp. 1-2. doi:"),
+    # Book and website delimiters repeated without a valid end
+    'book_delimiters': _fill("a. b: ", prefix="Smith, J., (2004) ", suffix="x"),
+    'website_links': _fill("t. Available at: http://x (Accessed: ", prefix="Brown, C. (2021) ", suffix=". : "),
+    'quotes_and_parens': _fill("'(2004) pp. ", prefix="Smith, J.B., "),
+}
+
+
+def _timed_parse(ref):
+    start = time.perf_counter()
+    parsed = ctr_validator.parse_reference(ref)
+    return parsed, time.perf_counter() - start
+
+
+def test_adversarial_references_parse_within_limit():
+    for name, ref in ADVERSARIAL_REFERENCES.items():
+        assert len(ref) <= ctr_validator.MAX_REFERENCE_LENGTH, name
+        _, elapsed = _timed_parse(ref)
+        assert elapsed < TIME_LIMIT, f"{name}: {elapsed * 1000:.1f} ms"
+
+
+def test_parse_time_grows_linearly():
+    # Ten times the input should cost roughly ten times as much, not a hundred
+    unit, prefix = "a', 1(2), pp. 1-x", "Smith, J.B., (2004) '"
+    short_ref = prefix + unit * 100
+    long_ref = prefix + unit * 1000
+    saved = ctr_validator.MAX_REFERENCE_LENGTH
+    ctr_validator.MAX_REFERENCE_LENGTH = len(long_ref)
+    try:
+        short_time = min(_timed_parse(short_ref)[1] for _ in range(5))
+        long_time = min(_timed_parse(long_ref)[1] for _ in range(5))
+    finally:
+        ctr_validator.MAX_REFERENCE_LENGTH = saved
+    assert long_time < max(short_time, 1e-5) * 40
+
+
+def test_overlong_reference_is_rejected():
+    ref = "Smith, J.B., " * 1000
+    parsed, elapsed = _timed_parse(ref)
+    assert parsed['type'] == 'unknown'
+    assert 'too long' in parsed['parse_error']
+    assert elapsed < TIME_LIMIT
+    reasons = ctr_validator.validate_ctr_format(parsed)['reasons']
+    assert reasons == [parsed['parse_error']]
+
+
+def test_valid_references_still_parse():
+    journal = ctr_validator.parse_reference(
+        "Browne, T.B., Carlson, T.B. and Hastie, P.A., (2004) 'A comparison of rugby seasons presented in "
+        "traditional and sport education formats', European Physical Education Review, 10(2), pp.199-214.")
+    assert journal['type'] == 'journal'
+    assert journal['journal'] == 'European Physical Education Review'
+    assert journal['pages'] == '199-214'
+    book = ctr_validator.parse_reference(
+        "Sommerville, I., (2011) Software engineering. America: Pearson Education Inc. ISBN 0137035151")
+    assert book['type'] == 'book'
+    assert book['isbn'] == '0137035151'
+    website = ctr_validator.parse_reference(
+        "Brown, C. (2021) Digital Transformation. Available at: https://www.example.com/report (Accessed: 15 July 2025).")
+    assert website['type'] == 'website'
+    assert website['accessed'] == '15 July 2025'
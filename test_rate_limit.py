@@ -0,0 +1,115 @@
+"""
+Tests for per-host rate limiting and backoff on throttled responses.
+"""
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+import ctr_validator
+
+URL = 'https://cited.example.org/paper'
+
+
+def _throttled(monkeypatch, statuses, headers=None):
+    # Serve the statuses in turn and record sleeps instead of sleeping
+    sent, slept = [], []
+
+    def fetch_once(request):
+        sent.append(request.url)
+        return ctr_validator.FetchResponse(statuses[len(sent) - 1], dict(headers or {}), '')
+
+    async def async_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(ctr_validator, '_fetch_once', fetch_once)
+    monkeypatch.setattr(ctr_validator.time, 'sleep', slept.append)
+    monkeypatch.setattr(asyncio, 'sleep', async_sleep)
+    return sent, slept
+
+
+def test_bucket_spaces_reservations_and_pauses():
+    bucket = ctr_validator.TokenBucket(10, burst=1)
+    assert bucket.reserve() == 0.0
+    assert 0 < bucket.reserve() <= 0.1
+    bucket.pause(5)
+    assert 4 < bucket.reserve() <= 5
+
+
+def test_observe_returns_a_delay_only_for_retryable_statuses():
+    limiter = ctr_validator.RateLimiter({}, max_retries=2, backoff_base=1, backoff_cap=3)
+    assert limiter.observe(URL, 200, {}, 0) is None
+    assert limiter.observe(URL, 404, {'Retry-After': '1'}, 0) is None
+    assert limiter.observe(URL, 503, {'Retry-After': '2'}, 0) == 2.0
+    assert limiter.observe(URL, 429, {'Retry-After': '60'}, 1) == 3
+    assert 0 <= limiter.observe(URL, 503, {}, 1) <= 2
+    assert limiter.observe(URL, 503, {'Retry-After': '2'}, 2) is None
+    # Unbucketed hosts still get their delay; the caller sleeps it
+    assert limiter.reserve(URL) == 0.0
+
+
+def test_advertised_rate_lowers_the_configured_one():
+    limiter = ctr_validator.RateLimiter({'api.crossref.org': 50})
+    url = 'https://api.crossref.org/works/10.1/x'
+    limiter.observe(url, 200, {'X-Rate-Limit-Limit': '5', 'X-Rate-Limit-Interval': '1s'}, 0)
+    assert limiter._bucket('api.crossref.org').rate == 5
+    assert ctr_validator.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert ctr_validator.parse_retry_after('soon') is None
+
+
+def test_unbucketed_host_backs_off_before_each_retry(monkeypatch):
+    monkeypatch.setattr(ctr_validator, '_rate_limiter', ctr_validator.RateLimiter({}))
+    sent, slept = _throttled(monkeypatch, [503, 429, 503, 200], {'Retry-After': '2'})
+    response = ctr_validator._fetch_network(ctr_validator.FetchRequest(URL))
+    assert response.status_code == 200 and len(sent) == 4
+    assert slept == [2.0, 2.0, 2.0]
+
+
+def test_backoff_gives_up_after_max_retries(monkeypatch):
+    limiter = ctr_validator.RateLimiter({}, max_retries=2, backoff_base=0.5)
+    monkeypatch.setattr(ctr_validator, '_rate_limiter', limiter)
+    sent, slept = _throttled(monkeypatch, [503] * 5)
+    assert ctr_validator._fetch_network(ctr_validator.FetchRequest(URL)).status_code == 503
+    assert len(sent) == 3 and len(slept) == 2
+    assert 0 <= slept[0] <= 0.5 and 0 <= slept[1] <= 1.0
+
+
+def test_async_fetcher_backs_off_too(monkeypatch):
+    pytest.importorskip('aiohttp')
+    monkeypatch.setattr(ctr_validator, '_rate_limiter', ctr_validator.RateLimiter({}))
+    sent, slept = _throttled(monkeypatch, [429, 200], {'Retry-After': '1'})
+
+    async def fetch_once(fetcher, request):
+        return ctr_validator._fetch_once(request)
+
+    monkeypatch.setattr(ctr_validator.AsyncFetcher, '_fetch_once', fetch_once)
+    response = asyncio.run(ctr_validator.AsyncFetcher()._fetch_network(ctr_validator.FetchRequest(URL)))
+    assert response.status_code == 200 and len(sent) == 2
+    assert slept == [1.0]
+
+
+def test_http_client_leaves_throttled_responses_to_the_limiter():
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = ctr_validator.HttpClient(retries=2)
+        url = f"http://127.0.0.1:{server.server_address[1]}/busy"
+        assert client.get(url).status_code == 503
+        assert hits == ['/busy']
+    finally:
+        server.shutdown()
+        server.server_close()
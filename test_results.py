@@ -0,0 +1,52 @@
+"""
+Tests for the slotted result types and their machine-readable records.
+"""
+import json
+
+import ctr_validator
+
+JOURNAL = "Smith, J.A., (2020) 'The Future of AI', Journal of Advanced Robotics, 15(2), pp. 123-145."
+
+
+def test_parsed_reference_reads_like_a_dict():
+    parsed = ctr_validator.parse_reference(JOURNAL)
+    assert isinstance(parsed, ctr_validator.ParsedReference)
+    assert parsed['type'] == 'journal' and parsed.type == 'journal'
+    assert parsed.get('journal') == 'Journal of Advanced Robotics'
+    # A journal without a DOI has doi present but None; books never have it
+    assert 'doi' in parsed and parsed['doi'] is None
+    assert 'isbn' not in parsed and parsed.get('isbn', 'none') == 'none'
+    try:
+        parsed['isbn']
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("absent field should raise KeyError")
+    parsed['doi'] = '10.1000/x'
+    assert parsed.doi == '10.1000/x'
+
+
+def test_results_have_no_instance_dict():
+    parsed = ctr_validator.parse_reference(JOURNAL)
+    for result in (parsed, ctr_validator.validate_ctr_format(parsed)):
+        assert not hasattr(result, '__dict__')
+
+
+def test_to_dict_matches_the_old_shape():
+    parsed = ctr_validator.parse_reference(JOURNAL)
+    assert parsed.to_dict() == {'type': 'journal', 'author': 'Smith, J.A., ', 'year': '2020', 'title': 'The Future of AI',
+                                'journal': 'Journal of Advanced Robotics', 'volume': '15', 'issue': '2',
+                                'pages': '123-145', 'doi': None}
+    result = ctr_validator.validate_ctr_format(parsed)
+    assert result == {'valid': True, 'reasons': ["No DOI found (not required, but preferred)"]}
+
+
+def test_reference_record_is_json():
+    ref = "Jones, A., (2019) Understanding Climate Change. London: Green Press."
+    parsed = ctr_validator.parse_reference(ref)
+    ver_result = ctr_validator.VerificationResult(["Checked."], [], "No direct link found.", "No")
+    record = ctr_validator.reference_record(ref, parsed, ctr_validator.validate_ctr_format(parsed), ver_result, 0)
+    data = json.loads(ctr_validator.to_json(record))
+    assert data['index'] == 1
+    assert data['parsed']['publisher'] == 'Green Press'
+    assert data['verification']['verified'] == 'No' and data['verification']['match_score'] is None
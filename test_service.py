@@ -0,0 +1,142 @@
+"""
+Tests for the long-running checking service.
+"""
+import http.client
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import ctr_service
+import ctr_validator
+import mock_api
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def _start(service, **kwargs):
+    server = ctr_service.make_server(service, port=0, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _post(conn, body, content_type='text/plain', query=''):
+    conn.request('POST', '/check' + query, body=body.encode('utf-8'), headers={'Content-Type': content_type})
+    response = conn.getresponse()
+    return response.status, [json.loads(line) for line in response.read().decode('utf-8').splitlines()]
+
+
+def test_check_streams_records_and_summary():
+    api = mock_api.MockApi()
+    metrics = ctr_validator.Metrics()
+    ctr_validator.set_metrics(metrics)
+    with mock_api.MockApiServer(api) as mock:
+        mock.install()
+        refs = mock_api.synthetic_references(api, mock.base('web'), 40, seed=9)
+        server = _start(ctr_service.ValidationService(metrics=metrics))
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=30)
+            status, lines = _post(conn, '\n'.join(refs))
+            assert status == 200
+            assert [line['reference'] for line in lines[:-1]] == refs
+            expected = list(ctr_validator.stream_references(refs))
+            assert [line['verification'] for line in lines[:-1]] == [ver.to_dict() for *_, ver in expected]
+            verified = sum(1 for *_, ver in expected if ver['verified'] == 'Yes')
+            assert lines[-1] == {'summary': {'total': 40, 'valid_ctr': lines[-1]['summary']['valid_ctr'],
+                                             'verified': verified}}
+
+            # The same keep-alive connection takes the next job; JSON input, unordered
+            status, lines = _post(conn, json.dumps({'references': refs[:5]}), 'application/json', '?unordered=1')
+            assert status == 200 and sorted(line['index'] for line in lines[:-1]) == [1, 2, 3, 4, 5]
+            status, lines = _post(conn, json.dumps({'references': 'not a list'}), 'application/json')
+            assert status == 400 and 'error' in lines[0]
+
+            conn.request('GET', '/health')
+            health = json.loads(conn.getresponse().read())
+            assert health['jobs'] == {'running': 0, 'waiting': 0, 'completed': 2, 'rejected': 0}
+            conn.request('GET', '/metrics')
+            assert 'ctr_events_total{event="references"} 45' in conn.getresponse().read().decode('utf-8')
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            ctr_validator.set_metrics(None)
+
+
+def test_job_queue_runs_in_arrival_order_and_rejects_when_full():
+    jobs = ctr_service.JobQueue(max_running=1, max_waiting=2)
+    assert jobs.enter()
+    order = []
+
+    def job(n):
+        jobs.enter()
+        order.append(n)
+        jobs.leave()
+
+    threads = []
+    for n in range(2):
+        threads.append(threading.Thread(target=job, args=(n,)))
+        threads[-1].start()
+        assert jobs.wait_for(lambda queue: queue.waiting > n, timeout=5)
+    assert not jobs.enter()
+    jobs.leave()
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1]
+    assert jobs.stats() == {'running': 0, 'waiting': 0, 'completed': 3, 'rejected': 1}
+
+
+def test_disconnect_frees_the_job_slot(monkeypatch):
+    def verify_source(parsed, debug=False, prefetched=None):
+        time.sleep(0.2)
+        return ctr_validator.VerificationResult([], [], None, 'Yes')
+
+    monkeypatch.setattr(ctr_validator, 'verify_source', verify_source)
+    refs = [f"Smith, J.A., (2020) 'Paper {n}', J Good, 1(2), pp. 3-4. doi:10.1000/{n}." for n in range(40)]
+    body = '\n'.join(refs).encode('utf-8')
+    jobs = ctr_service.JobQueue(max_running=1)
+    server = _start(ctr_service.ValidationService(jobs, workers=1, batch_dois=False))
+    try:
+        client = socket.create_connection(('127.0.0.1', server.server_address[1]), timeout=10)
+        client.sendall(b'POST /check HTTP/1.1\r\nHost: localhost\r\nContent-Type: text/plain\r\n'
+                       b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+        received = b''
+        while refs[0].encode('utf-8') not in received:
+            received += client.recv(65536)
+        # Reset rather than close, so the next write fails at once
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        client.close()
+        # The other 38 queued verifications would take 7.6 s
+        assert jobs.wait_for(lambda queue: queue.running == 0, timeout=3)
+        assert jobs.stats()['completed'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unix_socket():
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'ctr.sock')
+        server = _start(ctr_service.ValidationService(), socket_path=path)
+        try:
+            # Malformed lines never reach the network
+            status, lines = _post(_UnixConnection(path), 'not a reference\nneither is this')
+        finally:
+            server.shutdown()
+            server.server_close()
+    assert status == 200
+    assert [line['verification']['verified'] for line in lines[:-1]] == ['No', 'No']
+    assert lines[-1]['summary']['total'] == 2
@@ -0,0 +1,65 @@
+"""
+Import-time regression tests: format checks must not load the network stack.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import ctr_validator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Loaded only once a source is verified or a cache is opened
+HEAVY_MODULES = ('requests', 'urllib3', 'bs4', 'aiohttp', 'asyncio', 'http.client', 'ssl', 'sqlite3')
+# Cumulative import time of the module itself, best of three runs. Only a
+# coarse guard against slow machines or CI load: which modules get loaded is
+# checked exactly by test_format_checks_load_no_network_modules
+IMPORT_BUDGET = 0.5
+REF = "Smith, J.A., (2020) 'Good Paper', J Good, 1(2), pp. 3-4. doi:10.1000/abc."
+
+
+def _python(code, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', code], capture_output=True, text=True, cwd=HERE,
+                          timeout=60)
+
+
+def _heavy_loaded_after(code):
+    result = _python(code + f"\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_format_checks_load_no_network_modules():
+    assert _heavy_loaded_after(f"""
+import json, sys, ctr_validator
+parsed = ctr_validator.parse_reference({REF!r})
+assert ctr_validator.validate_ctr_format(parsed)['valid']
+assert [ctr.valid for _, _, ctr in ctr_validator.validate_references([{REF!r}, 'junk'])] == [True, False]
+""") == []
+    assert _heavy_loaded_after(f"""
+import contextlib, io, json, sys, ctr_validator
+sys.argv = ['ctr_validator.py', '--format-only', '--format', 'ndjson', '-s', {REF + chr(10) + 'junk'!r}]
+out = io.StringIO()
+with contextlib.redirect_stdout(out):
+    status = ctr_validator.main()
+lines = [json.loads(line) for line in out.getvalue().splitlines()]
+assert status == 1 and [line['format']['valid'] for line in lines] == [True, False]
+assert 'verification' not in lines[0]
+""") == []
+
+
+def test_import_time_within_budget():
+    timings = []
+    for _ in range(3):
+        result = _python('import ctr_validator', '-X', 'importtime')
+        line = next(line for line in result.stderr.splitlines() if line.endswith('| ctr_validator'))
+        timings.append(int(line.split('|')[1]) / 1e6)
+    assert min(timings) < IMPORT_BUDGET, timings
+
+
+def test_lazy_module_attributes():
+    assert isinstance(ctr_validator.HAS_BS4, bool)
+    assert isinstance(ctr_validator.HAS_AIOHTTP, bool)
+    assert ctr_validator.requests.Session is not None
+    assert ctr_validator.Retry.__name__ == 'Retry'
+    assert not hasattr(ctr_validator, 'no_such_attribute')
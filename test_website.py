@@ -0,0 +1,120 @@
+"""
+Tests for website references: the HEAD probe and bounded page reads.
+"""
+import http.server
+import threading
+
+import ctr_validator
+
+TITLE = 'Digital Transformation'
+FILLER = '<p>' + 'Nothing relevant here. ' * 40 + '</p>\n'
+
+
+class _Site:
+    # Serves pages as {path: (head_status, get_status, content_type, body)}
+    # and records each request's method and path
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def _serve(self, head):
+                site.requests.append((self.command, self.path))
+                head_status, get_status, content_type, body = site.pages[self.path]
+                data = body.encode('utf-8')
+                self.send_response(head_status if head else get_status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if not head:
+                    try:
+                        self.wfile.write(data)
+                    except ConnectionError:
+                        pass
+
+            def do_GET(self):
+                self._serve(head=False)
+
+            def do_HEAD(self):
+                self._serve(head=True)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _check(site, path):
+    parsed = ctr_validator.parse_reference(
+        f"Brown, C. (2021) {TITLE}. Available at: {site.url(path)} (Accessed: 15 July 2025).")
+    assert parsed['type'] == 'website'
+    return ctr_validator.verify_source(parsed)
+
+
+def test_head_probe_decides_without_a_page_read():
+    pages = {'/report.pdf': (200, 200, 'application/pdf', '%PDF-1.4'),
+             '/gone': (404, 404, 'text/html', 'Not here')}
+    with _Site(pages) as site:
+        pdf = _check(site, '/report.pdf')
+        gone = _check(site, '/gone')
+    assert pdf['verified'] == 'Partial' and 'Page content is application/pdf, keywords not checked.' in pdf['details']
+    assert gone['verified'] == 'No' and 'URL is not accessible (HTTP 404).' in gone['details']
+    assert site.requests == [('HEAD', '/report.pdf'), ('HEAD', '/gone')]
+
+
+def test_servers_without_head_fall_back_to_get():
+    page = f"<html><head><title>{TITLE}</title></head><body>{FILLER}</body></html>"
+    pages = {'/405': (405, 200, 'text/html', page), '/501': (501, 200, 'text/html', page)}
+    with _Site(pages) as site:
+        results = [_check(site, path) for path in pages]
+    assert [result['verified'] for result in results] == ['Yes', 'Yes']
+    assert site.requests == [('HEAD', '/405'), ('GET', '/405'), ('HEAD', '/501'), ('GET', '/501')]
+
+
+def test_page_read_stops_at_the_cap_or_the_title():
+    limit = 64 * 1024
+    oversize = FILLER * (4 * limit // len(FILLER))
+    early = f"<html><head><title>{TITLE}</title></head><body>{oversize}</body></html>"
+    pages = {'/big': (200, 200, 'text/html', oversize), '/early': (200, 200, 'text/html', early)}
+    ctr_validator.set_max_page_bytes(limit)
+    try:
+        with _Site(pages) as site:
+            big = _check(site, '/big')
+            found = _check(site, '/early')
+            stop_at = [ctr_validator._normalize_page_text(TITLE)]
+            big_read = ctr_validator._fetch_once(ctr_validator.FetchRequest(site.url('/big'), max_bytes=limit,
+                                                                             stop_at=stop_at))
+            early_read = ctr_validator._fetch_once(ctr_validator.FetchRequest(site.url('/early'), max_bytes=limit,
+                                                                               stop_at=stop_at))
+    finally:
+        ctr_validator.set_max_page_bytes(ctr_validator.DEFAULT_MAX_PAGE_BYTES)
+    assert big['verified'] == 'Partial' and f"Keywords '{TITLE}' not found on the webpage." in big['details']
+    assert found['verified'] == 'Yes'
+    assert big_read.size == len(big_read.text) == limit
+    # The title is in the first chunk, so the rest is never read
+    assert early_read.size <= ctr_validator.BODY_CHUNK_SIZE < len(early)
+
+
+def test_title_found_without_beautifulsoup(monkeypatch):
+    monkeypatch.setattr(ctr_validator, '_optional', lambda name: None)
+    markup = ("<html><head><script>var title = 'Analog Transformation';</script></head>"
+              "<body><h1>Digital\n  <em>Transformation</em> &amp; beyond</h1></body></html>")
+    text = ctr_validator.page_text(markup)
+    assert 'var title' not in text and '& beyond' in text
+    assert ctr_validator.page_mentions(markup, TITLE)
+    # Split by tags, so only found in the extracted text
+    assert ctr_validator.page_mentions(markup, 'Transformation & Beyond')
+    assert not ctr_validator.page_mentions(markup, 'Digital Transformation and beyond')